@@ -0,0 +1,131 @@
+# Import libraries
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+# Words that do not change what a dashboard question asks for
+STOPWORDS = frozenset("""
+a an the and or of for to in on at by with about from our my me we us you your
+is are was were be been being do does did what which who how show tell give get
+please can could would should this that these those it its all any some me
+""".split())
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+# Function for normalizing a query: lowercase, punctuation and stopwords dropped, whitespace collapsed
+# "What are our TOP products?" and "top products" normalize to the same text
+def normalize_query(query: str) -> str:
+    return " ".join(word for word in _WORD_RE.findall(query.lower()) if word not in STOPWORDS)
+
+# Function for fingerprinting the fetched data payload, so cached answers expire when the data changes
+def data_fingerprint(data: Dict[str, Any]) -> str:
+    payload = json.dumps(data, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+# Function for building the cache key: normalized query + query plan + selected datasets + data fingerprint
+# (the plan keeps questions that normalize alike but ask for different things apart)
+def analysis_cache_key(query: str, data: Dict[str, Any], plan: Optional[Dict[str, Any]] = None) -> str:
+    plan_part = json.dumps(plan or {}, sort_keys=True, default=str, separators=(",", ":"))
+    parts = [normalize_query(query), plan_part, ",".join(sorted(data)), data_fingerprint(data)]
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+# Define AnalysisCache: TTL + LRU cache of finished analyses with an optional SQLite backing store
+# The in-memory layer answers repeated questions in microseconds, the on-disk layer
+# survives restarts and is shared by every process pointing at the same file
+class AnalysisCache:
+    def __init__(self, ttl: float = 900, max_entries: int = 512, path: Optional[str] = None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.path = path
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict() # key -> (stored_at, value)
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS analysis_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)"
+            )
+
+    # Build a cache from ANALYSIS_CACHE_* environment variables, None when disabled
+    @classmethod
+    def from_env(cls) -> Optional["AnalysisCache"]:
+        if os.getenv('ANALYSIS_CACHE_ENABLED', 'true').lower() in ('0', 'false', 'no'):
+            return None
+        return cls(
+            ttl=float(os.getenv('ANALYSIS_CACHE_TTL', '900')),
+            max_entries=int(os.getenv('ANALYSIS_CACHE_MAX_ENTRIES', '512')),
+            path=os.getenv('ANALYSIS_CACHE_PATH') or None,
+        )
+
+    # Return the cached analysis for key, or None
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now - entry[0] < self.ttl:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return dict(entry[1])
+                del self._entries[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, stored_at FROM analysis_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and now - row[1] < self.ttl:
+                    value = json.loads(row[0])
+                    self._remember_locked(key, value, row[1])
+                    self._stats["disk_hits"] += 1
+                    return dict(value)
+
+            self._stats["misses"] += 1
+            return None
+
+    # Store a finished analysis under key
+    def set(self, key: str, value: Dict[str, Any]):
+        now = time.time()
+        with self._lock:
+            self._remember_locked(key, value, now)
+            self._stats["stores"] += 1
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO analysis_cache (key, value, stored_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value, default=str), now),
+                )
+                # Keep the file bounded too: drop expired rows and anything past max_entries
+                self._db.execute("DELETE FROM analysis_cache WHERE stored_at < ?", (now - self.ttl,))
+                self._db.execute(
+                    "DELETE FROM analysis_cache WHERE key NOT IN "
+                    "(SELECT key FROM analysis_cache ORDER BY stored_at DESC LIMIT ?)",
+                    (self.max_entries,),
+                )
+
+    # Drop everything, in memory and on disk
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM analysis_cache")
+
+    # Return cache counters, safe to serialize as JSON
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._entries), "max_entries": self.max_entries, "ttl": self.ttl, "persistent": self._db is not None, **self._stats}
+
+    # Private method: insert into the in-memory LRU, caller holds the lock
+    def _remember_locked(self, key: str, value: Dict[str, Any], stored_at: float):
+        self._entries[key] = (stored_at, dict(value))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
@@ -0,0 +1,73 @@
+# Benchmark: two-stage (analyst + consultant) vs fused (one structured call) analysis
+# against a fake chat model with per-call latency and a token rate, reports wall time,
+# LLM calls and input/output tokens per analysis
+# Usage: python backend/benchmarks/bench_analysis_modes.py [--llm-latency 0.5] [--token-rate 50] [--output-tokens 120] [--runs 5]
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, "tests"))
+
+from fakes import FakeChatModel, FakeConnector, warehouse_responder
+from langgraph_agents import ANALYSIS_MODES, EcommerceAgents
+from metric_cache import MetricCache
+from telemetry import start_trace
+from tool_snowflake import SnowflakeConnectionPool, SnowflakeTools
+
+QUERY = "How are sales, products and customers doing?"
+
+
+def measure(mode, args):
+    pool = SnowflakeConnectionPool(connect=FakeConnector(warehouse_responder), max_size=4)
+    tools = SnowflakeTools(pool=pool, cache=MetricCache())
+    # Fused replies carry both fields, so each gets the same length as one two-stage reply
+    llm = FakeChatModel(
+        prompts=[], latency=args.llm_latency, token_delay=1.0 / args.token_rate if args.token_rate else 0.0,
+        output_tokens=args.output_tokens, json_reply=mode == "fused",
+    )
+    agents = EcommerceAgents(tools=tools, llm=llm, analysis_cache=None, analysis_mode=mode)
+    agents.analyze(QUERY + " warm-up")
+    llm.prompts.clear()
+
+    durations, tokens = [], {"input": 0, "output": 0}
+    for run in range(args.runs):
+        with start_trace() as trace:
+            started = time.perf_counter()
+            asyncio.run(agents.aanalyze(f"{QUERY} run {run}"))
+            durations.append(time.perf_counter() - started)
+        tokens["input"] += trace.llm_tokens["input"]
+        tokens["output"] += trace.llm_tokens["output"]
+    return {
+        "seconds": sum(durations) / args.runs,
+        "calls": len(llm.prompts) / args.runs,
+        "input": tokens["input"] / args.runs,
+        "output": tokens["output"] / args.runs,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds before the fake LLM answers")
+    parser.add_argument("--token-rate", type=float, default=50.0, help="fake LLM output tokens/second, 0 = instant")
+    parser.add_argument("--output-tokens", type=int, default=120, help="words per two-stage reply")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    results = {mode: measure(mode, args) for mode in ANALYSIS_MODES}
+    print(f"fake LLM: {args.llm_latency * 1000:.0f} ms per call, {args.token_rate:.0f} tokens/s, runs: {args.runs}")
+    print(f"{'mode':<12}{'ms/analysis':>13}{'LLM calls':>11}{'input tok':>11}{'output tok':>12}")
+    for mode, result in results.items():
+        print(f"{mode:<12}{result['seconds'] * 1000:>13.1f}{result['calls']:>11.1f}{result['input']:>11.0f}{result['output']:>12.0f}")
+    two_stage, fused = results["two_stage"], results["fused"]
+    print(
+        f"fused: {100 * (1 - fused['seconds'] / two_stage['seconds']):.0f}% less latency, "
+        f"{100 * (1 - fused['input'] / two_stage['input']):.0f}% fewer input tokens"
+    )
+
+
+if __name__ == "__main__":
+    main()
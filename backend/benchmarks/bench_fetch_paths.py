@@ -0,0 +1,110 @@
+# Micro-benchmark: tuple loop vs Arrow/pandas result paths on a synthetic top-products result
+# Rows look like what the connector returns for get_top_products: (str, int, Decimal, int)
+# Time is measured on its own; peak memory (tracemalloc: Python and numpy allocations) in a second run
+# Usage: python backend/benchmarks/bench_fetch_paths.py [--rows 1000000] [--batch-size 100000]
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+from decimal import Decimal
+
+import pyarrow as pa
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from tool_snowflake import SnowflakeTools
+
+COLUMNS = ["PRODUCT_NAME", "TOTAL_SOLD", "TOTAL_REVENUE", "ORDERS_COUNT"]
+
+
+def synthetic_tuples(rows):
+    return [(f"Product {i}", i % 500, Decimal(i % 100000) / 100, i % 300) for i in range(rows)]
+
+
+def synthetic_arrow(rows):
+    # fetch_pandas_all hands NUMBER(38,2) over as float64 unless arrow_number_to_decimal is set
+    return pa.table({
+        "PRODUCT_NAME": pa.array([f"Product {i}" for i in range(rows)]),
+        "TOTAL_SOLD": pa.array([i % 500 for i in range(rows)], pa.int64()),
+        "TOTAL_REVENUE": pa.array([(i % 100000) / 100 for i in range(rows)], pa.float64()),
+        "ORDERS_COUNT": pa.array([i % 300 for i in range(rows)], pa.int64()),
+    })
+
+
+# Current path: cursor.fetchall() tuples, one dict per row with float(row[2])
+def tuple_loop(rows):
+    products = []
+    for row in rows:
+        products.append({"product_name": row[0], "total_sold": row[1], "total_revenue": float(row[2]), "orders_count": row[3]})
+    return products
+
+
+# Current path including row materialization: the connector turns its Arrow result into
+# Python tuples before fetchall returns (pyarrow's to_pylist stands in for its row converter)
+def arrow_tuple_loop(table):
+    return tuple_loop(zip(*(column.to_pylist() for column in table.columns)))
+
+
+# fetch_pandas_all equivalent: Arrow table -> DataFrame, vectorized coercion, same dict rows as get_top_products
+def arrow_records(table):
+    frame = table.to_pandas()
+    frame.columns = [column.lower() for column in frame.columns]
+    columns = ("product_name", "total_sold", "total_revenue", "orders_count")
+    names, sold, revenue, orders = SnowflakeTools._frame_columns(frame, columns, float_columns=("total_revenue",), int_columns=("total_sold", "orders_count"))
+    return [{"product_name": n, "total_sold": s, "total_revenue": r, "orders_count": o} for n, s, r, o in zip(names, sold, revenue, orders)]
+
+
+# fetch_pandas_all, but the consumer only needs an aggregate (no per-row Python objects at all)
+def arrow_summary(table):
+    frame = table.to_pandas()
+    revenue = frame["TOTAL_REVENUE"].astype("float64")
+    return {"rows": len(frame), "total_revenue": float(revenue.sum()), "total_sold": int(frame["TOTAL_SOLD"].sum())}
+
+
+# fetch_pandas_batches equivalent: fixed-size batches, only one batch is materialized at a time
+def arrow_batches_summary(table, batch_size):
+    rows, revenue, sold = 0, 0.0, 0
+    for batch in table.to_batches(max_chunksize=batch_size):
+        frame = batch.to_pandas()
+        rows += len(frame)
+        revenue += float(frame["TOTAL_REVENUE"].astype("float64").sum())
+        sold += int(frame["TOTAL_SOLD"].sum())
+    return {"rows": rows, "total_revenue": revenue, "total_sold": sold}
+
+
+def measure(label, fn, *args):
+    gc.collect()
+    start = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - start
+    del result
+    gc.collect()
+    tracemalloc.start()
+    fn(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<38} {elapsed * 1000:>9.0f} ms {peak / 2 ** 20:>9.1f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--batch-size", type=int, default=100_000)
+    args = parser.parse_args()
+
+    rows = synthetic_tuples(args.rows)
+    table = synthetic_arrow(args.rows)
+    print(f"{args.rows:,} rows; result buffers are built up front, only post-processing is measured")
+    print(f"{'path':<38} {'time':>12} {'peak':>13}")
+    measure("tuples -> dicts (current, post only)", tuple_loop, rows)
+    measure("arrow -> tuples -> dicts (current)", arrow_tuple_loop, table)
+    measure("arrow -> pandas -> dicts", arrow_records, table)
+    measure("arrow -> pandas -> aggregate", arrow_summary, table)
+    measure(f"arrow batches ({args.batch_size:,}) -> aggregate", arrow_batches_summary, table, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+# Load test: drives main.app in-process (httpx ASGI transport, real lifespan, job queue and graph)
+# with a fake chat model and a fake or local warehouse, and reports latency percentiles,
+# requests/second, peak threads and peak RSS per endpoint and concurrency level.
+# Results can be saved as a JSON baseline and later runs compared against it.
+# Usage:
+#   python backend/benchmarks/bench_load.py --concurrency 1,8,32 --requests 200 --save baseline.json
+#   python backend/benchmarks/bench_load.py --compare baseline.json [--tolerance 0.25]
+#   python backend/benchmarks/bench_load.py --warehouse local --warehouse-path warehouse.sqlite
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import resource
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, "tests"))
+
+ENDPOINTS = ("health", "quick-insights", "analyze")
+
+
+# Function for the current resident set size in MiB (Linux /proc, falls back to the peak)
+def rss_mib():
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# Function for the nearest-rank percentile of a sorted list
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, math.ceil(round(fraction * len(sorted_values), 9)) - 1)) # round: 0.07 * 100 is 7.000000000000001
+    return sorted_values[index]
+
+
+# Function for wiring the app to the fakes, mirrors tests/test_api.py
+def install_backends(main, args):
+    from analysis_cache import AnalysisCache
+    from fakes import FakeChatModel, FakeConnector, warehouse_responder
+    from langgraph_agents import EcommerceAgents
+    from metric_cache import MetricCache
+    from tool_snowflake import SnowflakeConnectionPool, SnowflakeTools
+
+    if args.warehouse == "local":
+        from local_warehouse import connect_local
+        connect = lambda: connect_local(args.warehouse_path)
+    else:
+        connect = FakeConnector(warehouse_responder, latency=args.query_latency)
+    pool = SnowflakeConnectionPool(connect=connect, max_size=args.pool_size)
+    main._tools = SnowflakeTools(pool=pool, cache=MetricCache())
+    if not args.metric_cache:
+        main._tools.cache = None # None in the constructor means "shared cache"
+    llm = FakeChatModel(prompts=[], latency=args.llm_latency, token_delay=1.0 / args.token_rate if args.token_rate else 0.0, output_tokens=args.output_tokens)
+    main._agents = EcommerceAgents(tools=main._tools, llm=llm, analysis_cache=AnalysisCache())
+    if not args.analysis_cache:
+        main._agents.analysis_cache = None
+    return llm
+
+
+# Function for issuing one request of a scenario, returns the status code
+async def request(client, endpoint, index, args):
+    if endpoint == "health":
+        response = await client.get("/health")
+    elif endpoint == "quick-insights":
+        response = await client.get("/quick-insights")
+    else:
+        # Unique questions by default, so every request runs the graph and both LLM calls
+        query = "How are sales, products and customers doing?" + ("" if args.repeat_queries else f" run {index}")
+        response = await client.post("/analyze?wait=true", json={"query": query})
+    return response.status_code
+
+
+# Function for running one (endpoint, concurrency) scenario as a closed loop of `concurrency` clients
+async def run_scenario(client, endpoint, concurrency, total, args):
+    latencies, statuses = [], {}
+    counter = iter(range(total))
+    peaks = {"threads": threading.active_count(), "rss_mib": rss_mib()}
+    sampling = True
+
+    async def sampler():
+        while sampling:
+            peaks["threads"] = max(peaks["threads"], threading.active_count())
+            peaks["rss_mib"] = max(peaks["rss_mib"], rss_mib())
+            await asyncio.sleep(0.02)
+
+    async def worker():
+        for index in counter:
+            started = time.perf_counter()
+            try:
+                status = await request(client, endpoint, index, args)
+            except Exception as exc:
+                status = type(exc).__name__
+            latencies.append(time.perf_counter() - started)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    sampler_task = asyncio.create_task(sampler())
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    sampling = False
+    await sampler_task
+
+    latencies.sort()
+    ms = lambda value: round(value * 1000, 2) if value is not None else None
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": total - statuses.get("200", 0),
+        "statuses": statuses,
+        "rps": round(total / elapsed, 2),
+        "p50_ms": ms(percentile(latencies, 0.50)),
+        "p95_ms": ms(percentile(latencies, 0.95)),
+        "p99_ms": ms(percentile(latencies, 0.99)),
+        "max_ms": ms(latencies[-1] if latencies else None),
+        "threads_peak": peaks["threads"],
+        "rss_peak_mib": round(peaks["rss_mib"], 1),
+    }
+
+
+async def run(args):
+    import httpx
+    import main
+
+    llm = install_backends(main, args)
+    results = []
+    async with main.lifespan(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            # Warm up: clients, pool connection, first graph compile paths
+            for endpoint in args.endpoints:
+                await request(client, endpoint, -1, args)
+            for endpoint in args.endpoints:
+                for concurrency in args.concurrency:
+                    llm.prompts.clear()
+                    result = await run_scenario(client, endpoint, concurrency, args.requests, args)
+                    results.append(result)
+                    print_result(result)
+    return results
+
+
+def print_result(result):
+    print(
+        f"{result['endpoint']:<15}{result['concurrency']:>5}{result['rps']:>10.1f}"
+        f"{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}{result['p99_ms']:>10.1f}"
+        f"{result['errors']:>8}{result['threads_peak']:>9}{result['rss_peak_mib']:>10.1f}"
+    )
+
+
+# Function for comparing results with a saved baseline, returns the list of regressions
+def compare(results, baseline, tolerance):
+    previous = {(item["endpoint"], item["concurrency"]): item for item in baseline["scenarios"]}
+    regressions = []
+    print(f"\ncompared with baseline from {baseline['meta']['created_at']} (tolerance {tolerance:.0%})")
+    print(f"{'endpoint':<15}{'conc':>5}{'rps':>18}{'p95 ms':>22}")
+    for result in results:
+        base = previous.get((result["endpoint"], result["concurrency"]))
+        if base is None:
+            continue
+        rps_change = result["rps"] / base["rps"] - 1 if base["rps"] else 0.0
+        p95_change = result["p95_ms"] / base["p95_ms"] - 1 if base["p95_ms"] else 0.0
+        flag = ""
+        if rps_change < -tolerance or p95_change > tolerance:
+            regressions.append(result)
+            flag = "  REGRESSION"
+        print(
+            f"{result['endpoint']:<15}{result['concurrency']:>5}"
+            f"{base['rps']:>9.1f} {rps_change:>+7.0%}{base['p95_ms']:>13.1f} {p95_change:>+7.0%}{flag}"
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help="comma-separated: " + ", ".join(ENDPOINTS))
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="seconds before the fake LLM answers")
+    parser.add_argument("--token-rate", type=float, default=0.0, help="fake LLM output tokens/second, 0 = instant")
+    parser.add_argument("--output-tokens", type=int, default=0, help="fake LLM reply length in tokens")
+    parser.add_argument("--warehouse", choices=("fake", "local"), default="fake")
+    parser.add_argument("--warehouse-path", default=os.getenv('LOCAL_WAREHOUSE_PATH', 'warehouse.sqlite'))
+    parser.add_argument("--query-latency", type=float, default=0.05, help="seconds per fake warehouse query")
+    parser.add_argument("--pool-size", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=None, help="ANALYSIS_WORKERS for the job queue")
+    parser.add_argument("--no-metric-cache", dest="metric_cache", action="store_false")
+    parser.add_argument("--analysis-cache", action="store_true", help="enable the analysis cache (off: every analysis calls the LLM)")
+    parser.add_argument("--repeat-queries", action="store_true", help="send the same /analyze question every time")
+    parser.add_argument("--save", help="write results as a JSON baseline")
+    parser.add_argument("--compare", help="baseline JSON to compare against, exits 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative drop in rps / rise in p95")
+    args = parser.parse_args()
+    args.endpoints = [endpoint for endpoint in args.endpoints.split(",") if endpoint]
+    args.concurrency = [int(level) for level in args.concurrency.split(",")]
+
+    # The app reads these at import time
+    os.environ["WARMUP_ON_STARTUP"] = "false"
+    os.environ["LLM_CACHE"] = "off"
+    os.environ["ANALYSIS_QUEUE_SIZE"] = str(max(100, max(args.concurrency) * 2))
+    if args.workers:
+        os.environ["ANALYSIS_WORKERS"] = str(args.workers)
+
+    print(f"{'endpoint':<15}{'conc':>5}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}{'threads':>9}{'rss MiB':>10}")
+    results = asyncio.run(run(args))
+
+    config = {key: value for key, value in vars(args).items() if key not in ("save", "compare", "tolerance")}
+    report = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "config": config,
+        },
+        "scenarios": results,
+    }
+    if args.save:
+        with open(args.save, "w") as handle:
+            json.dump(report, handle, indent=2)
+        print(f"\nsaved baseline to {args.save}")
+    if args.compare:
+        with open(args.compare) as handle:
+            baseline = json.load(handle)
+        if baseline["meta"].get("config") != config:
+            print("warning: baseline was recorded with a different configuration")
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
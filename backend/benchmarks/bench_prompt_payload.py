@@ -0,0 +1,62 @@
+# Benchmark: prompt payload size of indented JSON vs the compact table encoder
+# Uses a synthetic get_top_products(100) result plus sales metrics and customer segments
+# Usage: python backend/benchmarks/bench_prompt_payload.py [--products 100]
+import argparse
+import json
+import os
+import random
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, "tests"))
+
+from fakes import FakeConnector, warehouse_responder
+from metric_cache import MetricCache
+from prompt_encoder import encode_prompt_data, estimate_tokens
+from tool_snowflake import SnowflakeConnectionPool, SnowflakeTools
+
+
+def synthetic_responder(products):
+    rng = random.Random(7)
+    rows = [
+        (f"Product {i:04d} {rng.choice(['Deluxe', 'Basic', 'Pro', 'Mini'])}", rng.randint(1, 5000), rng.uniform(100, 250000), rng.randint(1, 3000))
+        for i in range(products)
+    ]
+    rows.sort(key=lambda row: row[2], reverse=True)
+
+    def responder(query, params):
+        if "FROM order_items" in query:
+            return rows[:params[0]]
+        return warehouse_responder(query, params)
+
+    return responder
+
+
+def report(label, text):
+    print(f"{label:<28} {len(text.encode('utf-8')):>8} bytes {estimate_tokens(text):>7} tokens (est.)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=100)
+    args = parser.parse_args()
+
+    pool = SnowflakeConnectionPool(connect=FakeConnector(synthetic_responder(args.products)))
+    tools = SnowflakeTools(pool=pool, cache=MetricCache())
+    data = {
+        "sales_metrics": tools.get_sales_metrics(30),
+        "top_products": tools.get_top_products(args.products),
+        "customer_segments": tools.get_customer_segments(),
+    }
+
+    before = json.dumps(data, indent=2)
+    report("json.dumps(indent=2)", before)
+    report("compact, all rows", encode_prompt_data(data, max_rows=args.products, token_budget=10 ** 9))
+    after = encode_prompt_data(data)
+    report("compact, default budget", after)
+    print(f"reduction: {100 * (1 - estimate_tokens(after) / estimate_tokens(before)):.0f}% fewer tokens")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+# Benchmark: sequential vs batched quick-insights fetch against a local stub warehouse
+# Usage: python backend/benchmarks/bench_quick_insights.py [--latency 0.2] [--runs 5]
+import argparse
+import os
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, "tests"))
+
+from fakes import FakeConnector, warehouse_responder
+from tool_snowflake import SnowflakeConnectionPool, SnowflakeTools
+
+
+def sequential(tools):
+    tools.get_sales_metrics(30)
+    tools.get_top_products(3)
+    tools.get_customer_segments()
+
+
+def batched(tools):
+    tools.get_quick_insights_data(days=30, no_products=3)
+
+
+def timed(fn, tools, runs):
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn(tools)
+        durations.append(time.perf_counter() - start)
+    return sum(durations) / len(durations)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per stub query")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    pool = SnowflakeConnectionPool(connect=FakeConnector(warehouse_responder, latency=args.latency), max_size=4)
+    tools = SnowflakeTools(pool=pool)
+    tools.cache = None # Measure warehouse round trips, not cache hits
+
+    seq = timed(sequential, tools, args.runs)
+    bat = timed(batched, tools, args.runs)
+    print(f"stub latency per query: {args.latency * 1000:.0f} ms, runs: {args.runs}")
+    print(f"sequential: {seq * 1000:8.1f} ms")
+    print(f"batched:    {bat * 1000:8.1f} ms  ({seq / bat:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
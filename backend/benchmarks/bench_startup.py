@@ -0,0 +1,85 @@
+# Benchmark: cold start of the API process, lazy (current) vs eager client construction
+# Each measurement runs in a fresh interpreter; Snowflake login is simulated with a stub
+# connector that sleeps --login-latency seconds, the Anthropic client is built but never called
+# Usage: python backend/benchmarks/bench_startup.py [--login-latency 2.0] [--runs 3]
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PRELUDE = """
+import sys, time
+started = time.perf_counter()
+sys.path[:0] = [{backend!r}, {tests!r}]
+"""
+
+STUB_LOGIN = """
+import time as _time
+from fakes import FakeConnector, warehouse_responder
+_connector = FakeConnector(warehouse_responder)
+def slow_connect():
+    _time.sleep({latency})
+    return _connector()
+"""
+
+# Lazy: import the app, start the lifespan, time the first /health and the moment /ready flips
+LAZY = PRELUDE + """
+import main
+imported = time.perf_counter() - started
+import asyncio, httpx
+""" + STUB_LOGIN + """
+main.get_tools().pool._connect = slow_connect
+
+async def run():
+    async with main.lifespan(main.app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench") as client:
+            await client.get("/health")
+            health = time.perf_counter() - started
+            while (await client.get("/ready")).status_code != 200:
+                await asyncio.sleep(0.01)
+            return health, time.perf_counter() - started
+
+health, ready = asyncio.run(run())
+print(json.dumps({{"import": imported, "health": health, "ready": ready}}))
+"""
+
+# Eager: what importing main used to do, build every client and log in before serving anything
+EAGER = PRELUDE + """
+import main
+""" + STUB_LOGIN + """
+main.get_tools().pool._connect = slow_connect
+main.get_agents()
+with main.get_tools().pool.connection():
+    pass
+ready = time.perf_counter() - started
+print(json.dumps({{"import": ready, "health": ready, "ready": ready}}))
+"""
+
+
+def run(script, latency):
+    code = "import json\n" + script.format(backend=BACKEND_DIR, tests=os.path.join(BACKEND_DIR, "tests"), latency=latency)
+    env = {**os.environ, "ANTHROPIC_API_KEY": os.getenv("ANTHROPIC_API_KEY", "bench-placeholder")}
+    output = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--login-latency", type=float, default=2.0, help="simulated Snowflake login seconds")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"simulated login: {args.login_latency:.1f} s, median of {args.runs} runs (seconds since interpreter start)")
+    print(f"{'mode':<8} {'import main':>12} {'first /health':>14} {'ready':>8}")
+    for mode, script in (("eager", EAGER), ("lazy", LAZY)):
+        samples = [run(script, args.login_latency) for _ in range(args.runs)]
+        median = {key: statistics.median(sample[key] for sample in samples) for key in samples[0]}
+        print(f"{mode:<8} {median['import']:>12.3f} {median['health']:>14.3f} {median['ready']:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
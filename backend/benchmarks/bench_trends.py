@@ -0,0 +1,73 @@
+# Benchmark: period-over-period trends as one query per window and previous period (the
+# get_sales_metrics approach) vs one daily-series query plus trend_engine, on a local SQLite warehouse
+# SQLite has no network round trip; --round-trip adds a per-query latency (Snowflake is ~100 ms+)
+# to the measured times to show the effect on a remote warehouse
+# Usage: python backend/benchmarks/bench_trends.py [--orders 500000] [--windows 7,30,90] [--runs 3] [--round-trip 0.1]
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from local_warehouse import connect_local, generate_synthetic_data
+from tool_snowflake import SnowflakeConnectionPool, SnowflakeTools
+
+RANGE_QUERY = """
+SELECT COUNT(*), SUM(total_amount)
+FROM orders
+WHERE order_date >= %s AND order_date < %s
+"""
+
+
+# One scan per window and one per previous period, over complete days like trend_engine
+def per_window(tools, windows):
+    now = datetime.combine(datetime.now().date(), datetime.min.time())
+    for days in windows:
+        tools._fetch(RANGE_QUERY, (now - timedelta(days=days), now))
+        tools._fetch(RANGE_QUERY, (now - timedelta(days=2 * days), now - timedelta(days=days)))
+
+
+def timed(fn, runs):
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - start)
+    return min(durations)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=500_000)
+    parser.add_argument("--windows", default="7,30,90", help="comma-separated window lengths in days")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--round-trip", type=float, default=0.1, help="seconds of per-query latency to add")
+    args = parser.parse_args()
+    windows = tuple(int(days) for days in args.windows.split(","))
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "warehouse.sqlite")
+        generate_synthetic_data(path, orders=args.orders, customers=max(1000, args.orders // 10), days=2 * max(windows) + 30)
+        tools = SnowflakeTools(pool=SnowflakeConnectionPool(connect=lambda: connect_local(path)), cache=None)
+        tools.cache = None # None in the constructor means "shared cache"
+
+        separate = timed(lambda: per_window(tools, windows), args.runs)
+        combined = timed(lambda: tools.get_sales_trends(windows), args.runs)
+        tools.pool.close()
+
+    queries = 2 * len(windows)
+    remote_separate = separate + queries * args.round_trip
+    remote_combined = combined + args.round_trip
+    print(f"orders: {args.orders:,}, windows: {list(windows)}, best of {args.runs}")
+    print(f"{'':<26}{'local ms':>10}{f'+{args.round_trip * 1000:.0f} ms/query':>18}")
+    print(f"{f'{queries} range queries':<26}{separate * 1000:>10.1f}{remote_separate * 1000:>18.1f}")
+    print(f"{'1 daily series + engine':<26}{combined * 1000:>10.1f}{remote_combined * 1000:>18.1f}")
+    print(f"with round trips: {remote_separate / remote_combined:.1f}x faster, plus rolling averages and anomaly flags")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+# Benchmark: requests/second of the real server (uvicorn subprocess) at 1, 2, 4 ... workers
+# against a generated local SQLite warehouse, no Snowflake or Anthropic access needed
+# - cache=off: every request queries the warehouse, shows CPU scaling (needs as many cores as workers)
+# - cache=shared: METRIC_CACHE_SHARED_PATH, one warehouse load per key across all workers
+# Usage: python backend/benchmarks/bench_workers.py [--workers 1,2,4] [--orders 200000] [--concurrency 32]
+#        [--requests 400] [--path /quick-insights] [--cache off,shared]
+import argparse
+import asyncio
+import math
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from local_warehouse import generate_synthetic_data
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# Start `uvicorn main:app --workers N` and wait until every worker answers /health
+def start_server(workers, port, env):
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    deadline = time.time() + 60
+    pids = set()
+    while time.time() < deadline and len(pids) < workers:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited: {process.stderr.read().decode()[-2000:]}")
+        try:
+            pids.add(httpx.get(f"http://127.0.0.1:{port}/health", timeout=1).json()["worker"])
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    return process
+
+
+async def drive(port, path, total, concurrency):
+    latencies = []
+    pending = iter(range(total))
+
+    async def client_loop(client):
+        for _ in pending:
+            start = time.perf_counter()
+            if path == "/analyze":
+                # Submit and poll like the frontend: polls land on any worker
+                response = await client.post("/analyze", json={"query": f"top {1 + len(latencies) % 20} products"})
+                response.raise_for_status()
+                while response.json()["status"] not in ("completed", "failed"):
+                    await asyncio.sleep(0.02)
+                    response = await client.get(f"/analyze/{response.json()['analysis_id']}")
+                    response.raise_for_status()
+            else:
+                response = await client.get(path)
+                response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=120) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    latencies.sort()
+    return total / elapsed, statistics.median(latencies), latencies[math.ceil(0.95 * len(latencies)) - 1]
+
+
+def run(workers, cache, args, warehouse, directory):
+    env = dict(
+        os.environ,
+        WAREHOUSE_BACKEND="local",
+        LOCAL_WAREHOUSE_PATH=warehouse,
+        ANTHROPIC_API_KEY=os.getenv("ANTHROPIC_API_KEY", "bench"),
+        WARMUP_ON_STARTUP="false",
+        INSIGHTS_REFRESH_INTERVAL="0", # Measure the query path, not a precomputed snapshot
+        ANALYSIS_CACHE_ENABLED="false",
+        LLM_CACHE="off",
+        WEB_CONCURRENCY=str(workers),
+        ANALYSIS_JOB_DB=os.path.join(directory, f"jobs-{workers}-{cache}.sqlite"),
+        TELEMETRY_ENABLED="false",
+    )
+    if cache == "off":
+        env["METRIC_CACHE_ENABLED"] = "false"
+    else:
+        env["METRIC_CACHE_SHARED_PATH"] = os.path.join(directory, f"shared-{workers}.sqlite")
+    port = free_port()
+    process = start_server(workers, port, env)
+    try:
+        asyncio.run(drive(port, args.path, min(args.requests, 2 * args.concurrency), args.concurrency)) # Warm-up
+        return asyncio.run(drive(port, args.path, args.requests, args.concurrency))
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated worker counts")
+    parser.add_argument("--cache", default="off,shared", help="comma-separated: off, shared")
+    parser.add_argument("--orders", type=int, default=200_000)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--path", default="/quick-insights", help="/quick-insights, /analyze (top-N lookups, submitted then polled) or any GET route")
+    args = parser.parse_args()
+
+    print(f"cpus: {os.cpu_count()}, orders: {args.orders:,}, {args.requests} x {args.path} at concurrency {args.concurrency}")
+    if max(int(count) for count in args.workers.split(",")) > (os.cpu_count() or 1):
+        print("warning: more workers than CPU cores, the extra workers only add contention")
+    print(f"{'cache':<8}{'workers':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'speedup':>9}")
+    with tempfile.TemporaryDirectory() as directory:
+        warehouse = os.path.join(directory, "warehouse.sqlite")
+        generate_synthetic_data(warehouse, orders=args.orders, customers=max(1000, args.orders // 10))
+        for cache in args.cache.split(","):
+            base = None
+            for workers in (int(count) for count in args.workers.split(",")):
+                rps, p50, p95 = run(workers, cache, args, warehouse, directory)
+                base = base or rps
+                print(f"{cache:<8}{workers:>8}{rps:>10.1f}{p50 * 1000:>10.1f}{p95 * 1000:>10.1f}{rps / base:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
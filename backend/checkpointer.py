@@ -0,0 +1,345 @@
+# Import libraries
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from langgraph.checkpoint.memory import InMemorySaver
+
+# Define BoundedMemorySaver: LangGraph's in-memory checkpointer with size and age limits
+# Every analysis runs on its own thread id, so without eviction each request leaves its
+# checkpoints behind for the life of the process. Threads are kept in LRU order and dropped
+# when there are more than max_threads or they have not been written for ttl seconds.
+# The base class finds a thread's writes and blobs by scanning every key, so the keys
+# are indexed per thread here to keep eviction O(size of the thread).
+class BoundedMemorySaver(InMemorySaver):
+    def __init__(self, max_threads: int = 1000, ttl: Optional[float] = 3600, **kwargs):
+        super().__init__(**kwargs)
+        self.max_threads = max_threads
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._threads: "OrderedDict[str, float]" = OrderedDict() # thread id -> last write (monotonic)
+        self._thread_keys: Dict[str, Tuple[set, set]] = {} # thread id -> (writes keys, blobs keys)
+        self._stats = {"evicted_threads": 0, "expired_threads": 0}
+
+    def get_tuple(self, config):
+        thread_id = config["configurable"]["thread_id"]
+        with self._lock:
+            result = super().get_tuple(config)
+            if thread_id not in self._threads:
+                self.storage.pop(thread_id, None) # defaultdict lookup created an empty entry
+            return result
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        with self._lock:
+            result = super().put(config, checkpoint, metadata, new_versions)
+            blob_keys = self._keys(thread_id)[1]
+            for channel, version in new_versions.items():
+                blob_keys.add((thread_id, checkpoint_ns, channel, version))
+            self._touch(thread_id)
+            return result
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        thread_id = config["configurable"]["thread_id"]
+        with self._lock:
+            super().put_writes(config, writes, task_id, task_path)
+            self._keys(thread_id)[0].add((thread_id, config["configurable"].get("checkpoint_ns", ""), config["configurable"]["checkpoint_id"]))
+            self._touch(thread_id)
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        with self._lock:
+            items = list(super().list(config, filter=filter, before=before, limit=limit))
+        yield from items
+
+    # Drop a thread from memory (and from disk in subclasses that persist)
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self._drop(thread_id)
+
+    # Return counters, safe to serialize as JSON
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "threads": len(self._threads),
+                "max_threads": self.max_threads,
+                "ttl": self.ttl,
+                "blobs": len(self.blobs),
+                **self._stats,
+            }
+
+    # Private method: per-thread key index, created on first write
+    def _keys(self, thread_id: str) -> Tuple[set, set]:
+        keys = self._thread_keys.get(thread_id)
+        if keys is None:
+            keys = self._thread_keys[thread_id] = (set(), set())
+        return keys
+
+    # Private method: mark a thread as just written and evict what no longer fits, caller holds the lock
+    def _touch(self, thread_id: str):
+        now = time.monotonic()
+        self._threads[thread_id] = now
+        self._threads.move_to_end(thread_id)
+        if self.ttl is not None:
+            while self._threads:
+                oldest, written = next(iter(self._threads.items()))
+                if now - written < self.ttl:
+                    break
+                self._drop_from_memory(oldest)
+                self._stats["expired_threads"] += 1
+        while len(self._threads) > self.max_threads:
+            self._drop_from_memory(next(iter(self._threads)))
+            self._stats["evicted_threads"] += 1
+
+    # Private method: remove a thread's checkpoints, writes and blobs from memory
+    def _drop_from_memory(self, thread_id: str):
+        self._threads.pop(thread_id, None)
+        self.storage.pop(thread_id, None)
+        writes_keys, blob_keys = self._thread_keys.pop(thread_id, (set(), set()))
+        for key in writes_keys:
+            self.writes.pop(key, None)
+        for key in blob_keys:
+            self.blobs.pop(key, None)
+
+    def _drop(self, thread_id: str):
+        self._drop_from_memory(thread_id)
+
+# Define SQLiteCheckpointSaver: bounded in-memory saver backed by a SQLite file for resumability
+# Reads are served from memory; a thread evicted from memory (or written by a previous process)
+# is loaded back from disk on its next read. Writes are queued and flushed in one transaction
+# every batch_size rows or flush_interval seconds, so a run costs a few commits instead of one
+# per checkpoint; a crash can lose at most the last flush_interval of writes.
+# The graph calls the async methods; they run the sync ones on a small thread pool, because a read
+# may load a thread from disk and a write may flush, which must not block the event loop.
+class SQLiteCheckpointSaver(BoundedMemorySaver):
+    def __init__(
+        self,
+        path: str = "checkpoints.sqlite",
+        max_threads: int = 1000,
+        ttl: Optional[float] = 3600, # In-memory age limit
+        retention: Optional[float] = 7 * 86400, # Seconds a thread is kept on disk
+        batch_size: int = 64,
+        flush_interval: float = 0.5,
+        **kwargs,
+    ):
+        super().__init__(max_threads=max_threads, ttl=ttl, **kwargs)
+        self.path = path
+        self.retention = retention
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending: Dict[str, List[tuple]] = {"checkpoints": [], "writes": [], "blobs": [], "threads": []}
+        self._pending_rows = 0
+        self._db_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="checkpoint")
+        self._stats.update({"flushes": 0, "rows_written": 0, "threads_loaded": 0})
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.executescript("""
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, checkpoint_id TEXT NOT NULL,
+                checkpoint_type TEXT NOT NULL, checkpoint BLOB NOT NULL, metadata_type TEXT NOT NULL, metadata BLOB NOT NULL,
+                parent_id TEXT, PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+            );
+            CREATE TABLE IF NOT EXISTS writes (
+                thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, checkpoint_id TEXT NOT NULL,
+                task_id TEXT NOT NULL, idx INTEGER NOT NULL, channel TEXT NOT NULL,
+                value_type TEXT NOT NULL, value BLOB NOT NULL, task_path TEXT NOT NULL,
+                PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+            );
+            CREATE TABLE IF NOT EXISTS blobs (
+                thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, channel TEXT NOT NULL, version TEXT NOT NULL,
+                value_type TEXT NOT NULL, value BLOB NOT NULL, PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+            );
+            CREATE TABLE IF NOT EXISTS threads (thread_id TEXT PRIMARY KEY, updated_at REAL NOT NULL);
+        """)
+        if retention is not None:
+            self.prune(time.time() - retention)
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_periodically, name="checkpoint-flusher", daemon=True)
+        self._flusher.start()
+
+    def get_tuple(self, config):
+        self._load(config["configurable"]["thread_id"])
+        return super().get_tuple(config)
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        if config:
+            self._load(config["configurable"]["thread_id"])
+        yield from super().list(config, filter=filter, before=before, limit=limit)
+
+    async def aget_tuple(self, config):
+        return await self._run(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        items = await self._run(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await self._run(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return await self._run(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id):
+        return await self._run(self.delete_thread, thread_id)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        with self._lock:
+            result = super().put(config, checkpoint, metadata, new_versions)
+            saved_checkpoint, saved_metadata, parent_id = self.storage[thread_id][checkpoint_ns][checkpoint["id"]]
+            rows = [("checkpoints", (thread_id, checkpoint_ns, checkpoint["id"], *saved_checkpoint, *saved_metadata, parent_id))]
+            for channel, version in new_versions.items():
+                value_type, value = self.blobs[(thread_id, checkpoint_ns, channel, version)]
+                rows.append(("blobs", (thread_id, checkpoint_ns, channel, str(version), value_type, value)))
+            self._queue(thread_id, rows)
+            return result
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        with self._lock:
+            super().put_writes(config, writes, task_id, task_path)
+            rows = [
+                ("writes", (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, value[0], value[1], path))
+                for (task, idx), (_, channel, value, path) in self.writes[(thread_id, checkpoint_ns, checkpoint_id)].items()
+                if task == task_id
+            ]
+            self._queue(thread_id, rows)
+
+    # Write every queued row now, in one transaction
+    # The db lock is taken before the saver lock is released, so batches reach the file in the
+    # order they were queued while puts carry on during the disk write
+    def flush(self):
+        with self._lock:
+            if not self._pending_rows:
+                return
+            pending, rows_written = self._pending, self._pending_rows
+            self._pending = {table: [] for table in pending}
+            self._pending_rows = 0
+            self._db_lock.acquire()
+        try:
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany("INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)", pending["checkpoints"])
+                self._db.executemany("INSERT OR REPLACE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", pending["writes"])
+                self._db.executemany("INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?)", pending["blobs"])
+                self._db.executemany("INSERT OR REPLACE INTO threads VALUES (?, ?)", pending["threads"])
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._stats["flushes"] += 1
+            self._stats["rows_written"] += rows_written
+        finally:
+            self._db_lock.release()
+
+    # Delete threads not written since `before` (unix time) from disk, returns how many
+    def prune(self, before: float) -> int:
+        with self._db_lock:
+            stale = [row[0] for row in self._db.execute("SELECT thread_id FROM threads WHERE updated_at < ?", (before,))]
+            for thread_id in stale:
+                self._delete_from_disk(thread_id)
+        return len(stale)
+
+    # Flush and stop the background flusher
+    def close(self):
+        self._closed.set()
+        self._executor.shutdown(wait=True)
+        self.flush()
+        with self._db_lock:
+            self._db.close()
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        with self._db_lock:
+            stats["threads_on_disk"] = self._db.execute("SELECT COUNT(*) FROM threads").fetchone()[0]
+        with self._lock:
+            stats["pending_rows"] = self._pending_rows
+        return {**stats, "backend": "sqlite", "path": self.path}
+
+    def _drop(self, thread_id: str):
+        super()._drop(thread_id)
+        self.flush()
+        with self._db_lock:
+            self._delete_from_disk(thread_id)
+
+    # Private method: delete one thread's rows, caller holds the db lock
+    def _delete_from_disk(self, thread_id: str):
+        for table in ("checkpoints", "writes", "blobs", "threads"):
+            self._db.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+
+    # Private method: queue rows for the next flush, caller holds the lock
+    def _queue(self, thread_id: str, rows: List[tuple]):
+        for table, row in rows:
+            self._pending[table].append(row)
+        self._pending["threads"].append((thread_id, time.time()))
+        self._pending_rows += len(rows) + 1
+        if self._pending_rows >= self.batch_size:
+            self.flush()
+
+    # Private method: run a sync method on the saver's threads
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    # Private method: bring a thread that is not in memory back from disk
+    def _load(self, thread_id: str):
+        with self._lock:
+            if thread_id in self._threads:
+                return
+            # Rows of a recently evicted thread may still be queued; a new thread id has none, no flush needed
+            if any(row[0] == thread_id for row in self._pending["threads"]):
+                self.flush()
+            with self._db_lock:
+                checkpoints = self._db.execute("SELECT checkpoint_ns, checkpoint_id, checkpoint_type, checkpoint, metadata_type, metadata, parent_id FROM checkpoints WHERE thread_id = ?", (thread_id,)).fetchall()
+                if not checkpoints:
+                    return
+                writes = self._db.execute("SELECT checkpoint_ns, checkpoint_id, task_id, idx, channel, value_type, value, task_path FROM writes WHERE thread_id = ?", (thread_id,)).fetchall()
+                blobs = self._db.execute("SELECT checkpoint_ns, channel, version, value_type, value FROM blobs WHERE thread_id = ?", (thread_id,)).fetchall()
+            writes_keys, blob_keys = self._keys(thread_id)
+            for checkpoint_ns, checkpoint_id, checkpoint_type, checkpoint, metadata_type, metadata, parent_id in checkpoints:
+                self.storage[thread_id][checkpoint_ns][checkpoint_id] = ((checkpoint_type, checkpoint), (metadata_type, metadata), parent_id)
+            for checkpoint_ns, checkpoint_id, task_id, idx, channel, value_type, value, task_path in writes:
+                key = (thread_id, checkpoint_ns, checkpoint_id)
+                self.writes[key][(task_id, idx)] = (task_id, channel, (value_type, value), task_path)
+                writes_keys.add(key)
+            for checkpoint_ns, channel, version, value_type, value in blobs:
+                key = (thread_id, checkpoint_ns, channel, version)
+                self.blobs[key] = (value_type, value)
+                blob_keys.add(key)
+            self._stats["threads_loaded"] += 1
+            self._touch(thread_id)
+
+    # Private method: background flush so queued rows never wait longer than flush_interval
+    def _flush_periodically(self):
+        while not self._closed.wait(self.flush_interval):
+            try:
+                self.flush()
+            except sqlite3.ProgrammingError:
+                return # Closed underneath us
+
+# Function for building the checkpointer from CHECKPOINT_* environment variables
+# CHECKPOINTER=memory (default) | sqlite
+def checkpointer_from_env() -> BoundedMemorySaver:
+    max_threads = int(os.getenv('CHECKPOINT_MAX_THREADS', '1000'))
+    ttl = float(os.getenv('CHECKPOINT_TTL', '3600'))
+    if os.getenv('CHECKPOINTER', 'memory').lower() == 'sqlite':
+        return SQLiteCheckpointSaver(
+            path=os.getenv('CHECKPOINT_DB', 'checkpoints.sqlite'),
+            max_threads=max_threads,
+            ttl=ttl,
+            retention=float(os.getenv('CHECKPOINT_RETENTION', str(7 * 86400))),
+            batch_size=int(os.getenv('CHECKPOINT_BATCH_SIZE', '64')),
+            flush_interval=float(os.getenv('CHECKPOINT_FLUSH_INTERVAL', '0.5')),
+        )
+    return BoundedMemorySaver(max_threads=max_threads, ttl=ttl)
@@ -1,8 +1,8 @@
-from IPython.display import Image, display
 from langgraph_agents import EcommerceAgents
 import os
 
 def show_graph():
+    from IPython.display import Image, display # Only needed in notebooks
     agents = EcommerceAgents()
     display(Image(agents.graph.get_graph().draw_mermaid_png()))
 
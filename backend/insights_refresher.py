@@ -0,0 +1,162 @@
+# Import libraries
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Keys every snapshot carries, a persisted file without them is ignored
+SNAPSHOT_KEYS = ("insights", "as_of", "created_at", "refresh_seconds")
+
+# Define InsightsRefresher: keeps a precomputed /quick-insights snapshot fresh in the background
+# - a task started from the app lifespan recomputes every `interval` seconds (+/- jitter, so several
+#   processes do not hit the warehouse in lockstep)
+# - the snapshot is a dict replaced in one assignment, readers never see a half-built one and never wait
+# - a failed refresh keeps the previous snapshot and retries with exponential backoff up to max_backoff
+# - refresh() can also be called on demand; concurrent calls share one computation
+# - with path set, the snapshot is written to a JSON file (atomic rename) and loaded on start,
+#   so a restarted process serves the last insights before its first refresh
+class InsightsRefresher:
+    def __init__(
+        self,
+        compute: Callable[[], Awaitable[Any]], # async () -> insights payload (JSON-serializable)
+        interval: float = 300,
+        jitter: float = 0.1, # Fraction of the interval
+        path: Optional[str] = None,
+        retry_delay: float = 5, # First retry after a failure, doubled per consecutive failure
+        max_backoff: float = 600,
+    ):
+        self.compute = compute
+        self.interval = interval
+        self.jitter = jitter
+        self.path = path
+        self.retry_delay = retry_delay
+        self.max_backoff = max_backoff
+        self.snapshot: Optional[Dict[str, Any]] = None # {"insights", "as_of", "refresh_seconds"}
+        self._task: Optional[asyncio.Task] = None
+        self._refreshing: Optional[asyncio.Task] = None
+        self._failures = 0
+        self._stats = {"refreshes": 0, "failures": 0, "on_demand": 0, "last_error": None, "last_refresh_seconds": None}
+
+    # Build a refresher from INSIGHTS_* environment variables, None when INSIGHTS_REFRESH_INTERVAL is 0
+    @classmethod
+    def from_env(cls, compute) -> Optional["InsightsRefresher"]:
+        interval = float(os.getenv('INSIGHTS_REFRESH_INTERVAL', '300'))
+        if interval <= 0:
+            return None
+        return cls(
+            compute,
+            interval=interval,
+            jitter=float(os.getenv('INSIGHTS_REFRESH_JITTER', '0.1')),
+            path=os.getenv('INSIGHTS_SNAPSHOT_PATH') or None,
+            retry_delay=float(os.getenv('INSIGHTS_RETRY_DELAY', '5')),
+            max_backoff=float(os.getenv('INSIGHTS_MAX_BACKOFF', '600')),
+        )
+
+    # Load the persisted snapshot and start the refresh loop, call from the app lifespan
+    async def start(self):
+        if self.snapshot is None:
+            self.snapshot = self._load()
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        for task in (self._task, self._refreshing):
+            if task is not None:
+                task.cancel()
+        await asyncio.gather(*(task for task in (self._task, self._refreshing) if task is not None), return_exceptions=True)
+        self._task = self._refreshing = None
+
+    # Recompute now and return the new snapshot; raises if the computation fails (the old snapshot stays)
+    async def refresh(self, on_demand: bool = True) -> Dict[str, Any]:
+        if on_demand:
+            self._stats["on_demand"] += 1
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.create_task(self._refresh())
+        return await asyncio.shield(self._refreshing)
+
+    # Return counters and the snapshot age, safe to serialize as JSON
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self.snapshot
+        return {
+            "interval": self.interval,
+            "as_of": snapshot["as_of"] if snapshot else None,
+            "age_seconds": round(time.time() - snapshot["created_at"], 3) if snapshot else None,
+            "consecutive_failures": self._failures,
+            "persisted": bool(self.path),
+            **self._stats,
+        }
+
+    # Private method: one refresh, swaps the snapshot only when the computation succeeded
+    async def _refresh(self) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            insights = await self.compute()
+        except Exception as exc:
+            self._failures += 1
+            self._stats["failures"] += 1
+            self._stats["last_error"] = str(exc)
+            raise
+        now = time.time()
+        snapshot = {
+            "insights": insights,
+            "as_of": datetime.fromtimestamp(now, timezone.utc).isoformat(timespec="seconds"),
+            "created_at": now,
+            "refresh_seconds": round(time.perf_counter() - started, 3),
+        }
+        self.snapshot = snapshot # Atomic swap: readers hold either the old or the new dict
+        self._failures = 0
+        self._stats["refreshes"] += 1
+        self._stats["last_error"] = None
+        self._stats["last_refresh_seconds"] = snapshot["refresh_seconds"]
+        if self.path:
+            await asyncio.get_running_loop().run_in_executor(None, self._save, snapshot)
+        return snapshot
+
+    # Private method: refresh forever, on the interval while healthy and with backoff after failures
+    async def _loop(self):
+        # A persisted snapshot that is still fresh postpones the first refresh
+        delay = 0.0
+        if self.snapshot is not None:
+            delay = max(0.0, self.interval - (time.time() - self.snapshot["created_at"]))
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                await self.refresh(on_demand=False)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                delay = min(self.max_backoff, self.retry_delay * 2 ** (self._failures - 1))
+            else:
+                delay = self.interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    # Private method: write the snapshot next to its final path, then rename over it
+    def _save(self, snapshot: Dict[str, Any]):
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as handle:
+            json.dump(snapshot, handle, default=str)
+        os.replace(temp_path, self.path)
+
+    # Private method: the persisted snapshot, or None if there is none
+    # A file that cannot be read, is truncated or has an older format is logged and treated as missing,
+    # so the first refresh rebuilds it from the warehouse
+    def _load(self) -> Optional[Dict[str, Any]]:
+        if not self.path or not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path) as handle:
+                snapshot = json.load(handle)
+        except (OSError, ValueError) as exc:
+            logger.warning("Ignoring insights snapshot %s: %s", self.path, exc)
+            return None
+        if not isinstance(snapshot, dict) or any(key not in snapshot for key in SNAPSHOT_KEYS):
+            logger.warning("Ignoring insights snapshot %s: expected the keys %s", self.path, ", ".join(SNAPSHOT_KEYS))
+            return None
+        if not isinstance(snapshot["created_at"], (int, float)):
+            logger.warning("Ignoring insights snapshot %s: created_at is not a timestamp", self.path)
+            return None
+        return snapshot
@@ -0,0 +1,351 @@
+# Import libraries
+import asyncio
+import json
+import os
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from query_planner import request_key
+from telemetry import JOB_WAIT_SECONDS
+
+# Function for the dedup key: questions with the same plan and normalized text share a job
+def _dedup_key(query: str) -> str:
+    return request_key(query)
+
+# Raised by submit() when the queue is at capacity, mapped to HTTP 429 by the API
+class QueueFullError(Exception):
+    pass
+
+# Define AnalysisJobQueue: job queue for /analyze
+# - submit() returns immediately with a job record, a fixed number of asyncio workers run the jobs
+# - identical queries (after normalization) that are still queued or running share one job
+# - in memory by default; with store_path set, the SQLite file is the queue itself, so it survives
+#   restarts and can be shared by several worker processes (WEB_CONCURRENCY > 1):
+#   - submit() inserts the job and get() reads it from the file, any process can answer a poll
+#   - one claim task per process takes the oldest queued job atomically (BEGIN IMMEDIATE) whenever
+#     a worker is free and hands it over, each job runs in exactly one process
+#   - a running job holds a lease the process renews; if that process dies, the lease runs out and
+#     another process picks the job up again
+#   - every SQLite call runs on one store thread, so a busy file never stalls the event loop
+class AnalysisJobQueue:
+    def __init__(
+        self,
+        runner: Callable[[str, str], Awaitable[Dict[str, Any]]], # async (query, job_id) -> result
+        concurrency: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        store_path: Optional[str] = None,
+        result_ttl: Optional[float] = None, # Seconds finished jobs stay pollable
+        lease_seconds: Optional[float] = None, # Store mode: a job whose process stopped renewing is re-run after this
+        poll_interval: float = 0.1, # Store mode: how often the claim task looks for jobs submitted by other processes
+        prune_interval: float = 60, # Seconds between sweeps of finished jobs older than result_ttl
+    ):
+        self.runner = runner
+        self.concurrency = concurrency or int(os.getenv('ANALYSIS_WORKERS', '8'))
+        self.max_queue = max_queue or int(os.getenv('ANALYSIS_QUEUE_SIZE', '100'))
+        self.store_path = store_path if store_path is not None else (os.getenv('ANALYSIS_JOB_DB') or None)
+        self.result_ttl = result_ttl if result_ttl is not None else float(os.getenv('ANALYSIS_RESULT_TTL', '3600'))
+        self.lease_seconds = lease_seconds if lease_seconds is not None else float(os.getenv('ANALYSIS_JOB_LEASE', '60'))
+        self.poll_interval = poll_interval
+        self.prune_interval = prune_interval
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}" # Lease holder id of this process
+
+        self._jobs: Dict[str, Dict[str, Any]] = {} # Memory mode: every job; store mode: jobs handed to this process's workers
+        self._inflight: Dict[str, str] = {} # normalized query -> job id
+        self._queue: Optional[asyncio.Queue] = None
+        self._submitted: Optional[asyncio.Event] = None # Store mode: wakes the claim task on a submit in this process
+        self._free_workers: Optional[asyncio.Semaphore] = None # Store mode: the claim task only takes jobs a worker can start
+        self._tasks = []
+        self._db = None
+        self._store: Optional[ThreadPoolExecutor] = None
+        self._stats = {"submitted": 0, "deduplicated": 0, "rejected": 0, "completed": 0, "failed": 0}
+
+    # Start the worker tasks (and open the store in durable mode), call from the app lifespan
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        if self.store_path:
+            # One thread: the connection is only ever used from it, and store calls run in order
+            self._store = ThreadPoolExecutor(max_workers=1, thread_name_prefix="jobs-store")
+            await self._in_store(self._open_store)
+            self._submitted = asyncio.Event()
+            self._free_workers = asyncio.Semaphore(self.concurrency)
+            self._tasks = [asyncio.create_task(self._claimer()), asyncio.create_task(self._renew_leases())]
+        self._tasks += [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._pruner()))
+
+    # Cancel the workers; in durable mode their jobs go back to queued and resume in any process
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._db is not None:
+            # Claimed but not started yet: give them back now rather than when their lease runs out
+            while not self._queue.empty():
+                job = self._jobs.pop(self._queue.get_nowait(), None)
+                if job is not None:
+                    job["status"], job["started_at"] = "queued", None
+                    await self._in_store(self._save_claimed, job)
+            await self._in_store(self._db.close)
+            self._db = None
+        if self._store is not None:
+            self._store.shutdown(wait=True)
+            self._store = None
+
+    # Queue a query, returns (job, created) where created is False for a deduplicated submission
+    async def submit(self, query: str):
+        key = _dedup_key(query)
+        if self._db is not None:
+            job, created = await self._in_store(self._submit_to_store, query, key)
+            if created:
+                self._submitted.set()
+            return job, created
+        job_id = self._inflight.get(key)
+        if job_id is not None:
+            self._stats["deduplicated"] += 1
+            return self._jobs[job_id], False
+
+        job = self._new_job(query)
+        try:
+            self._queue.put_nowait(job["id"])
+        except asyncio.QueueFull:
+            self._stats["rejected"] += 1
+            raise QueueFullError(f"Analysis queue is full ({self.max_queue} jobs waiting)")
+        self._jobs[job["id"]] = job
+        self._inflight[key] = job["id"]
+        self._stats["submitted"] += 1
+        return job, True
+
+    # Return the job record for job_id, or None
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        if self._db is not None:
+            return await self._in_store(self._load_job, job_id)
+        return self._jobs.get(job_id)
+
+    # Wait until a job has finished and return it
+    async def wait(self, job_id: str, poll_interval: float = 0.05) -> Dict[str, Any]:
+        while True:
+            job = await self.get(job_id)
+            if job is None or job["status"] in ("completed", "failed"):
+                return job
+            await asyncio.sleep(poll_interval)
+
+    # Return queue counters, safe to serialize as JSON
+    # In durable mode queued and running count every process sharing the store
+    async def stats(self) -> Dict[str, Any]:
+        if self._db is not None:
+            queued, running = await self._in_store(self._count_unfinished)
+        else:
+            queued = self._queue.qsize() if self._queue is not None else 0
+            running = sum(1 for job in self._jobs.values() if job["status"] == "running")
+        return {
+            "concurrency": self.concurrency,
+            "max_queue": self.max_queue,
+            "queued": queued,
+            "running": running,
+            "durable": bool(self.store_path),
+            **self._stats,
+        }
+
+    # Private method: a new job record
+    def _new_job(self, query: str) -> Dict[str, Any]:
+        return {
+            "id": uuid.uuid4().hex,
+            "query": query,
+            "status": "queued",
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None,
+        }
+
+    # Private method: run a sync store method on the store thread
+    async def _in_store(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._store, fn, *args)
+
+    # Private method: submit in durable mode; dedup, capacity check and insert are one transaction
+    def _submit_to_store(self, query: str, key: str):
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._db.execute(
+                "SELECT payload FROM jobs WHERE dedup_key = ? AND status IN ('queued', 'running') ORDER BY created_at LIMIT 1", (key,)
+            ).fetchone()
+            if row is not None:
+                self._db.execute("COMMIT")
+                self._stats["deduplicated"] += 1
+                return json.loads(row[0]), False
+            queued = self._db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            if queued >= self.max_queue:
+                self._db.execute("COMMIT")
+                self._stats["rejected"] += 1
+                raise QueueFullError(f"Analysis queue is full ({self.max_queue} jobs waiting)")
+            job = self._new_job(query)
+            self._save(job)
+            self._db.execute("COMMIT")
+        except BaseException:
+            if self._db.in_transaction:
+                self._db.execute("ROLLBACK")
+            raise
+        self._stats["submitted"] += 1
+        return job, True
+
+    # Private method: worker loop, runs one job at a time
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            job = self._jobs.get(job_id)
+            try:
+                if job is not None:
+                    await self._run(job)
+            finally:
+                self._queue.task_done()
+                if self._free_workers is not None:
+                    self._jobs.pop(job_id, None) # The store keeps the record
+                    self._free_workers.release()
+
+    # Private method: store mode, claim a job whenever a worker is free and hand it over
+    async def _claimer(self):
+        while True:
+            await self._free_workers.acquire()
+            while True:
+                self._submitted.clear()
+                job = await self._in_store(self._claim)
+                if job is not None:
+                    break
+                # Wake on a submit in this process, or poll for jobs submitted by the others
+                try:
+                    await asyncio.wait_for(self._submitted.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._jobs[job["id"]] = job
+            self._queue.put_nowait(job["id"])
+
+    # Private method: take the oldest queued job (or a running one whose lease ran out) for this process
+    def _claim(self) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        claimable = "status = 'queued' OR (status = 'running' AND lease_expires < ?)"
+        # Plain read first: polling an empty queue never takes the write lock
+        if self._db.execute(f"SELECT 1 FROM jobs WHERE {claimable} LIMIT 1", (now,)).fetchone() is None:
+            return None
+        self._db.execute("BEGIN IMMEDIATE") # Takes the write lock, so two processes never claim the same row
+        try:
+            row = self._db.execute(f"SELECT payload FROM jobs WHERE {claimable} ORDER BY created_at LIMIT 1", (now,)).fetchone()
+            job = None
+            if row is not None:
+                job = json.loads(row[0])
+                job["status"] = "running"
+                job["started_at"] = now
+                self._save(job)
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        return job
+
+    # Private method: run a job and record its outcome
+    async def _run(self, job: Dict[str, Any]):
+        job["status"] = "running"
+        job["started_at"] = job["started_at"] or time.time()
+        JOB_WAIT_SECONDS.observe(job["started_at"] - job["created_at"])
+        try:
+            job["result"] = await self.runner(job["query"], job["id"])
+            job["status"] = "completed"
+            self._stats["completed"] += 1
+        except asyncio.CancelledError:
+            # Shutdown: leave it queued so a durable queue picks it up again
+            job["status"] = "queued"
+            job["started_at"] = None
+            if self._db is not None:
+                await self._in_store(self._save_claimed, job)
+            raise
+        except Exception as exc:
+            job["status"] = "failed"
+            job["error"] = str(exc)
+            self._stats["failed"] += 1
+        job["finished_at"] = time.time()
+        self._inflight.pop(_dedup_key(job["query"]), None)
+        if self._db is not None:
+            await self._in_store(self._save_claimed, job)
+
+    # Private method: store mode, keep extending the leases of every job this process is running
+    async def _renew_leases(self):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            await self._in_store(self._extend_leases)
+
+    # Private method: one lease renewal for all jobs this process holds
+    def _extend_leases(self):
+        self._db.execute(
+            "UPDATE jobs SET lease_expires = ? WHERE owner = ? AND status = 'running'", (time.time() + self.lease_seconds, self.owner)
+        )
+
+    # Private method: forget finished jobs older than result_ttl, on a timer instead of on every submit
+    async def _pruner(self):
+        while True:
+            await asyncio.sleep(self.prune_interval)
+            if self._db is not None:
+                await self._in_store(self._prune_store)
+            else:
+                self._prune()
+
+    # Private method: memory mode sweep of finished jobs
+    def _prune(self):
+        cutoff = time.time() - self.result_ttl
+        expired = [job_id for job_id, job in self._jobs.items() if job["finished_at"] is not None and job["finished_at"] < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    # Private method: store mode sweep of finished jobs
+    def _prune_store(self):
+        self._db.execute("DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?", (time.time() - self.result_ttl,))
+
+    # Private method: open the SQLite store; unfinished jobs need no reloading, the claim task takes them from the file
+    def _open_store(self):
+        self._db = sqlite3.connect(self.store_path, isolation_level=None, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, status TEXT NOT NULL, created_at REAL NOT NULL, "
+            "finished_at REAL, payload TEXT NOT NULL)"
+        )
+        # Files written before jobs were shared between processes lack these columns; a NULL lease counts as expired
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        for column, kind in (("dedup_key", "TEXT"), ("owner", "TEXT"), ("lease_expires", "REAL")):
+            if column not in columns:
+                self._db.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+        self._db.execute("UPDATE jobs SET lease_expires = 0 WHERE status = 'running' AND lease_expires IS NULL")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_dedup ON jobs (dedup_key, status)")
+
+    # Private method: one job record from the store, or None
+    def _load_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._db.execute("SELECT payload FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    # Private method: (queued, running) across every process sharing the store
+    def _count_unfinished(self) -> tuple:
+        counts = dict(self._db.execute("SELECT status, COUNT(*) FROM jobs WHERE status IN ('queued', 'running') GROUP BY status").fetchall())
+        return counts.get("queued", 0), counts.get("running", 0)
+
+    # Private method: persist a job record in durable mode, a running job is leased to this process
+    def _save(self, job: Dict[str, Any]):
+        self._db.execute(
+            "INSERT OR REPLACE INTO jobs (id, status, created_at, finished_at, payload, dedup_key, owner, lease_expires) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (job["id"], job["status"], job["created_at"], job["finished_at"], json.dumps(job, default=str), _dedup_key(job["query"]), *self._lease(job)),
+        )
+
+    # Private method: persist a job this process claimed; dropped if its lease ran out and another process took it over
+    def _save_claimed(self, job: Dict[str, Any]):
+        self._db.execute(
+            "UPDATE jobs SET status = ?, finished_at = ?, payload = ?, owner = ?, lease_expires = ? WHERE id = ? AND owner = ?",
+            (job["status"], job["finished_at"], json.dumps(job, default=str), *self._lease(job), job["id"], self.owner),
+        )
+
+    # Private method: (owner, lease_expires) columns for a job record, only running jobs hold a lease
+    def _lease(self, job: Dict[str, Any]) -> tuple:
+        if job["status"] != "running":
+            return None, None
+        return self.owner, time.time() + self.lease_seconds
@@ -1,69 +1,150 @@
 # Import libraries
-from typing import TypedDict, Dict, Any
+from typing import TypedDict, Dict, Any, AsyncIterator, List, Annotated, Optional
 from langchain_anthropic import ChatAnthropic
 from langgraph.graph import StateGraph, END
-from langgraph.checkpoint.memory import MemorySaver
+from langgraph.types import Send
 from tool_snowflake import SnowflakeTools
+from analysis_cache import AnalysisCache, analysis_cache_key
+from checkpointer import checkpointer_from_env
+from llm_cache import llm_cache_from_env
+from prompt_encoder import encode_prompt_data
+from query_planner import DEFAULT_DAYS, DEFAULT_NO_PRODUCTS, direct_answer, plan_query
+from telemetry import GRAPH_NODE_SECONDS, LLM_CALL_SECONDS, record_llm_usage, span, timed
+import asyncio
 import json
 import os
+import uuid
 from dotenv import load_dotenv
 
 # Load .env
 load_dotenv(override=True)
 
+# Reducer for AnalysisState.data: tool nodes run in parallel and each returns only its own
+# dataset, LangGraph merges them into one dict when the branches join
+def merge_data(left: Dict[str, Any], right: Dict[str, Any]) -> Dict[str, Any]:
+    return {**(left or {}), **(right or {})}
+
+# Tool node name -> key of the dataset it writes into AnalysisState.data
+DATASET_TOOLS = {
+    "get_sales_metrics": "sales_metrics",
+    "get_top_products": "top_products",
+    "get_customer_segments": "customer_segments",
+    "get_sales_trends": "sales_trends",
+}
+
 # Define the structure for storing input query, retrieved data, and AI-generated insights
 class AnalysisState(TypedDict):
     query: str
-    data: Dict[str, Any]
+    data: Annotated[Dict[str, Any], merge_data]
+    datasets: List[str] # Tool nodes planned by the extractor, fetched in parallel
+    plan: Dict[str, Any] # QueryPlan from query_planner: datasets, params, needs_llm
     analysis: str
     recommendations: str
     next_action: str
     step_count: int
     finished: bool
 
+# Function for pulling plain text out of a streamed LLM chunk (Anthropic may send content blocks)
+def _chunk_text(chunk) -> str:
+    content = chunk.content
+    if isinstance(content, str):
+        return content
+    return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+
+# ANALYSIS_MODE=two_stage: analyst and consultant are two LLM calls, the second re-reads the first's output
+# ANALYSIS_MODE=fused: one LLM call returns both as JSON matching FUSED_SCHEMA
+ANALYSIS_MODES = ("two_stage", "fused")
+
+FUSED_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "analysis": {"type": "array", "items": {"type": "string"}, "description": "3 factual analysis bullet points"},
+        "recommendations": {"type": "array", "items": {"type": "string"}, "description": "3 actionable business recommendations"},
+    },
+    "required": ["analysis", "recommendations"],
+}
+
+# Function for turning one field of the fused reply into the bullet text the two-stage mode produces
+def _bullets(value) -> str:
+    if isinstance(value, list):
+        return "\n".join(f"- {str(item).lstrip('- ').strip()}" for item in value)
+    return str(value or "").strip()
+
+# Function for parsing the fused reply: the outermost JSON object in the text (models sometimes
+# wrap it in prose or a code fence). Unparseable replies become the analysis, with no recommendations
+def parse_fused_reply(text: str) -> Dict[str, str]:
+    start, end = text.find("{"), text.rfind("}")
+    try:
+        parsed = json.loads(text[start:end + 1]) if start != -1 else None
+    except ValueError:
+        parsed = None
+    if not isinstance(parsed, dict):
+        return {"analysis": text.strip(), "recommendations": ""}
+    return {"analysis": _bullets(parsed.get("analysis")), "recommendations": _bullets(parsed.get("recommendations"))}
+
+# Function for a fresh checkpoint thread id, one per analysis
+def _new_thread_id() -> str:
+    return f"analysis-{uuid.uuid4().hex}"
+
 # Define the EcommerceAgents class: Blueprint for creating the agents and tools
 class EcommerceAgents:
     # Define the constructor that runs automatically when an object is instantiated from this class
-    def __init__(self):
-        self.llm = ChatAnthropic(
+    def __init__(self, tools: SnowflakeTools = None, llm=None, analysis_cache: AnalysisCache = None, checkpointer=None, analysis_mode: Optional[str] = None):
+        self.llm = llm or ChatAnthropic(
             model="claude-3-sonnet-20240229", # Define a model. Claude Sonnet is my fave!
-            api_key=os.getenv('ANTHROPIC_API_KEY')
+            api_key=os.getenv('ANTHROPIC_API_KEY'),
+            cache=llm_cache_from_env(), # Identical prompts to the same model are answered from cache
         )
         # Instantiate supporting objects used by these classes
-        self.tools = SnowflakeTools()
-        self.memory = MemorySaver()
+        self.tools = tools or SnowflakeTools() # Shares the pooled Snowflake connections
+        self.analysis_cache = analysis_cache if analysis_cache is not None else AnalysisCache.from_env() # None when disabled
+        self.memory = checkpointer if checkpointer is not None else checkpointer_from_env() # Bounded: old threads are evicted
+        self.analysis_mode = (analysis_mode or os.getenv('ANALYSIS_MODE', 'two_stage')).lower()
+        if self.analysis_mode not in ANALYSIS_MODES:
+            raise ValueError(f"ANALYSIS_MODE must be one of {ANALYSIS_MODES}, got {self.analysis_mode!r}")
         self.graph = self._build_graph()
     
     # Define class methods: Extractor Agent
-    def data_extractor_agent(self, state: AnalysisState) -> AnalysisState:
-        query_lower = state['query'].lower()
+    # Nodes are coroutines so the whole graph runs on the event loop via graph.ainvoke
+    # The extractor plans the whole run in one step (query_planner.plan_query): every dataset
+    # the query needs with its parameters, and whether the LLM stages are needed at all.
+    # The router then fans out to all of those tool nodes at once
+    async def data_extractor_agent(self, state: AnalysisState) -> AnalysisState:
+        plan = plan_query(state['query'])
         
-        if not state['data']:
-            if 'sales' in query_lower or 'revenue' in query_lower:
-                state["next_action"] = "get_sales_metrics"
-            elif 'product' in query_lower:
-                state["next_action"] = "get_top_products"
-            else:
-                state["next_action"] = "get_sales_metrics"
-        elif len(state['data']) == 1:
-            if 'product' in query_lower and 'top_products' not in state['data']:
-                state["next_action"] = "get_top_products"
-            elif 'customer' in query_lower and 'customer_segments' not in state['data']:
-                state["next_action"] = "get_customer_segments"
-            else:
-                state["next_action"] = "analyst_agent"
+        state["plan"] = plan
+        state["datasets"] = [tool for tool in plan["datasets"] if DATASET_TOOLS[tool] not in state['data']]
+        if state["datasets"]:
+            state["next_action"] = "fetch_data"
         else:
-            state["next_action"] = "analyst_agent"
-        
+            state["next_action"] = "analyst_agent" if plan["needs_llm"] else "direct_answer"
+        state["step_count"] += 1
+        return state
+    
+    # Define class methods: Direct Answer
+    # Lookup questions ("what was revenue last 7 days", "top 5 products") are answered from the
+    # fetched data with a template, no analyst or consultant LLM calls
+    async def direct_answer_agent(self, state: AnalysisState) -> AnalysisState:
+        state["analysis"] = direct_answer(state["data"])
+        state["recommendations"] = ""
+        state["finished"] = True
         state["step_count"] += 1
         return state
     
     # Define class methods: Analyst Agent
-    def analyst_agent(self, state: AnalysisState) -> AnalysisState:
+    async def analyst_agent(self, state: AnalysisState) -> AnalysisState:
+        cached = self._cached_analysis(state)
         if not state['data']:
             state["next_action"] = "data_extractor_agent"
+        elif cached is not None:
+            # Same question over unchanged data was answered recently: skip both LLM calls
+            state["analysis"] = cached["analysis"]
+            state["recommendations"] = cached["recommendations"]
+            state["finished"] = True
+        elif self.analysis_mode == "fused":
+            await self._fused_analysis(state)
         else:
-            data_str = json.dumps(state["data"], indent=2)
+            data_str = encode_prompt_data(state["data"]) # Compact CSV tables instead of indented JSON
             analyze_prompt = f"""
             Analyze this data for: {state['query']}\nData: {data_str}\n
             Provide 3 clear analysis in bullet points focusing on:
@@ -75,7 +156,9 @@ class EcommerceAgents:
             Make your responses short and concise.
             """
             
-            response = self.llm.invoke(analyze_prompt)
+            with span(LLM_CALL_SECONDS, "llm", "analyst_agent"):
+                response = await self.llm.ainvoke(analyze_prompt)
+            record_llm_usage("analyst_agent", analyze_prompt, response)
             state["analysis"] = response.content
             state["next_action"] = "consultant_agent"
         
@@ -83,7 +166,7 @@ class EcommerceAgents:
         return state
     
     # Define class methods: Consultant Agent
-    def consultant_agent(self, state: AnalysisState) -> AnalysisState:
+    async def consultant_agent(self, state: AnalysisState) -> AnalysisState:
         prompt = f"""
         Based on analysis: {state['analysis']}\n
         
@@ -96,49 +179,104 @@ class EcommerceAgents:
         
         Be specific and practical. Make your responses short and concise."""
         
-        response = self.llm.invoke(prompt)
+        with span(LLM_CALL_SECONDS, "llm", "consultant_agent"):
+            response = await self.llm.ainvoke(prompt)
+        record_llm_usage("consultant_agent", prompt, response)
         state["recommendations"] = response.content
         state["finished"] = True
         state["step_count"] += 1
+        self._store_analysis(state)
         return state
     
+    # Private method: fused mode, analysis and recommendations from one structured LLM call
+    # Half the round trips of two_stage, and the analysis is not sent back in as input
+    async def _fused_analysis(self, state: AnalysisState):
+        data_str = encode_prompt_data(state["data"])
+        prompt = f"""
+            Analyze this data for: {state['query']}\nData: {data_str}\n
+            Reply with only a JSON object matching this schema:
+            {json.dumps(FUSED_SCHEMA)}
+            
+            analysis: 3 bullet points on key metrics and trends, notable patterns or outliers,
+            and data-driven observations. Keep them factual and specific.
+            recommendations: 3 specific, practical business recommendations based on that analysis,
+            aimed at revenue growth, customer retention and operational efficiency.
+            Make your responses short and concise.
+            """
+        
+        with span(LLM_CALL_SECONDS, "llm", "analyst_agent"):
+            response = await self.llm.ainvoke(prompt)
+        record_llm_usage("analyst_agent", prompt, response)
+        state.update(parse_fused_reply(_chunk_text(response)))
+        state["finished"] = True
+        self._store_analysis(state)
+    
+    # Private method: remember a finished analysis for this query and data payload
+    def _store_analysis(self, state: AnalysisState):
+        if self.analysis_cache is not None:
+            self.analysis_cache.set(
+                analysis_cache_key(state["query"], state["data"], state.get("plan")),
+                {"analysis": state["analysis"], "recommendations": state["recommendations"]},
+            )
+
+    # Private method: look up a finished analysis for this query and data payload
+    def _cached_analysis(self, state: AnalysisState):
+        if self.analysis_cache is None or not state['data']:
+            return None
+        return self.analysis_cache.get(analysis_cache_key(state["query"], state["data"], state.get("plan")))
+    
+    # Tool nodes run as parallel branches, so each returns only its own dataset
+    # (merged into state["data"] by merge_data) instead of the whole state
+
     # Define class methods: Get sales metrics tool from SnowflakeTools class
-    def get_sales_metrics_tool(self, state: AnalysisState) -> AnalysisState:
-        result = self.tools.get_sales_metrics()
-        state["data"]["sales_metrics"] = result
-        return state
+    async def get_sales_metrics_tool(self, state: AnalysisState) -> Dict[str, Any]:
+        result = await self.tools.aget_sales_metrics(self._param(state, "days", DEFAULT_DAYS))
+        return {"data": {"sales_metrics": result}}
     
     # Define class methods: Get top products tool from SnowflakeTools class
-    def get_top_products_tool(self, state: AnalysisState) -> AnalysisState:
-        result = self.tools.get_top_products()
-        state["data"]["top_products"] = result
-        return state
+    async def get_top_products_tool(self, state: AnalysisState) -> Dict[str, Any]:
+        result = await self.tools.aget_top_products(self._param(state, "no_products", DEFAULT_NO_PRODUCTS))
+        return {"data": {"top_products": result}}
     
     # Define class methods: Get customer segments tool from SnowflakeTools class
-    def get_customer_segments_tool(self, state: AnalysisState) -> AnalysisState:
-        result = self.tools.get_customer_segments()
-        state["data"]["customer_segments"] = result
-        return state
+    async def get_customer_segments_tool(self, state: AnalysisState) -> Dict[str, Any]:
+        result = await self.tools.aget_customer_segments()
+        return {"data": {"customer_segments": result}}
+    
+    # Define class methods: Get sales trends tool (7/30/90-day windows vs previous periods, anomalies)
+    async def get_sales_trends_tool(self, state: AnalysisState) -> Dict[str, Any]:
+        result = await self.tools.aget_sales_trends()
+        return {"data": {"sales_trends": result}}
+    
+    # Private method: a planned parameter for a tool node, or the tool default
+    @staticmethod
+    def _param(state: AnalysisState, name: str, default: int) -> int:
+        return (state.get("plan") or {}).get("params", {}).get(name, default)
+    
+    # Define class methods: after a tool node, go to the LLM stages or straight to the templated answer
+    def after_fetch(self, state: AnalysisState) -> str:
+        return "analyst_agent" if (state.get("plan") or {}).get("needs_llm", True) else "direct_answer"
     
     # Define class methods: router, for directing the flow of the agent system based on the current state object
-    # This method returns the name of the next method (or node) to invoke
+    # This method returns the name of the next method (or node) to invoke,
+    # or one Send per planned tool node so the Snowflake queries run in parallel
     # It behaves like a decision controller for the AI agents
-    def router(self, state: AnalysisState) -> str:
+    def router(self, state: AnalysisState):
         if state["finished"] or state["step_count"] >= 10:
             return "end"
         
         action = state.get("next_action", "")
         
-        if action == "analyst_agent":
+        if action == "fetch_data":
+            return [Send(tool, state) for tool in state["datasets"]]
+        elif action == "analyst_agent":
             return "analyst_agent"
+        elif action == "direct_answer":
+            return "direct_answer"
         elif action == "consultant_agent":
             return "consultant_agent"
-        elif action == "get_sales_metrics":
-            return "get_sales_metrics"
-        elif action == "get_top_products":
-            return "get_top_products"
-        elif action == "get_customer_segments":
-            return "get_customer_segments"
+        elif action in DATASET_TOOLS:
+            return action
         else:
             return "data_extractor_agent"
     
@@ -149,12 +287,19 @@ class EcommerceAgents:
     def _build_graph(self):
         workflow = StateGraph(AnalysisState)
         
-        workflow.add_node("data_extractor_agent", self.data_extractor_agent)
-        workflow.add_node("analyst_agent", self.analyst_agent)
-        workflow.add_node("consultant_agent", self.consultant_agent)
-        workflow.add_node("get_sales_metrics", self.get_sales_metrics_tool)
-        workflow.add_node("get_top_products", self.get_top_products_tool)
-        workflow.add_node("get_customer_segments", self.get_customer_segments_tool)
+        # Every node is wrapped in a timing span (graph_node_duration_seconds on /metrics)
+        nodes = {
+            "data_extractor_agent": self.data_extractor_agent,
+            "analyst_agent": self.analyst_agent,
+            "consultant_agent": self.consultant_agent,
+            "direct_answer": self.direct_answer_agent,
+            "get_sales_metrics": self.get_sales_metrics_tool,
+            "get_top_products": self.get_top_products_tool,
+            "get_customer_segments": self.get_customer_segments_tool,
+            "get_sales_trends": self.get_sales_trends_tool,
+        }
+        for name, node in nodes.items():
+            workflow.add_node(name, timed(GRAPH_NODE_SECONDS, "node", name)(node))
         
         # Define the entry point, the first agent to run when the graph is invoked
         workflow.set_entry_point("data_extractor_agent")
@@ -167,7 +312,9 @@ class EcommerceAgents:
                 "get_sales_metrics": "get_sales_metrics",
                 "get_top_products": "get_top_products",
                 "get_customer_segments": "get_customer_segments",
+                "get_sales_trends": "get_sales_trends",
                 "analyst_agent": "analyst_agent",
+                "direct_answer": "direct_answer",
                 "data_extractor_agent": "data_extractor_agent",
                 "end": END
             }
@@ -191,41 +338,101 @@ class EcommerceAgents:
             }
         )
         
-        # Add fixed transitions back to the extractor after tool use, loop-like behavior
-        workflow.add_edge("get_sales_metrics", "data_extractor_agent")
-        workflow.add_edge("get_top_products", "data_extractor_agent")
-        workflow.add_edge("get_customer_segments", "data_extractor_agent")
+        # Fan-in: the parallel tool branches join at the analyst (or the direct answer for lookup
+        # plans) once all of them have finished
+        for tool in DATASET_TOOLS:
+            workflow.add_conditional_edges(tool, self.after_fetch, {"analyst_agent": "analyst_agent", "direct_answer": "direct_answer"})
+        workflow.add_edge("direct_answer", END)
         
         return workflow.compile(checkpointer=self.memory)
     
-    # Define the analyze method: this is the public interface (exposed behavior)
-    # that users interact with when they want to run a query through the agent system
-    def analyze(self, query: str, thread_id: str = "default") -> Dict[str, Any]:
-        config = {"configurable": {"thread_id": thread_id}}
-        
-        # Instantiate the initial state object, includes query and default values
-        initial_state = AnalysisState(
+    # Private method: initial state object for a query, includes query and default values
+    def _initial_state(self, query: str) -> AnalysisState:
+        return AnalysisState(
             query=query,
             data={},
+            datasets=[],
+            plan={},
             analysis="",
             recommendations="",
             next_action="",
             step_count=0,
             finished=False
         )
-        
-        # Invoke the graph (object behavior) using the configured settings and state
-        result = self.graph.invoke(initial_state, config=config)
-        
-        # Return a dictionary of output, a structured response from the AI agents
+
+    # Private method: shape the final graph state into the structured response
+    @staticmethod
+    def _format_result(result: Dict[str, Any]) -> Dict[str, Any]:
         return {
             "query": result["query"],
             "total_steps": result["step_count"],
+            "plan": result.get("plan"),
             "data": result["data"],
             "analysis": result["analysis"],
             "recommendations": result["recommendations"]
         }
 
+    # Define the aanalyze method: this is the public interface (exposed behavior)
+    # that users interact with when they want to run a query through the agent system.
+    # It only waits on I/O (LLM calls, pooled Snowflake queries), so many analyses can run
+    # concurrently on one event loop without holding a thread each
+    # Each call gets its own checkpoint thread unless thread_id is given (e.g. the job id), so
+    # concurrent analyses never share or inherit state
+    async def aanalyze(self, query: str, thread_id: Optional[str] = None) -> Dict[str, Any]:
+        config = {"configurable": {"thread_id": thread_id or _new_thread_id()}}
+        
+        # Invoke the graph (object behavior) using the configured settings and state
+        result = await self.graph.ainvoke(self._initial_state(query), config=config)
+        
+        # Return a dictionary of output, a structured response from the AI agents
+        return self._format_result(result)
+
+    # Define the astream_analysis method: same pipeline as aanalyze, but yields progress events
+    # as they happen instead of waiting for the whole run:
+    #   node_start / node_end - every node transition in the graph
+    #   data                  - each dataset as soon as its tool node has fetched it
+    #   token                 - analyst and consultant LLM tokens as they arrive
+    #   result                - the final structured response (same shape as aanalyze)
+    async def astream_analysis(self, query: str, thread_id: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        config = {"configurable": {"thread_id": thread_id or _new_thread_id()}}
+        sent_datasets = set()
+        streamed_runs = set()
+        final = None
+
+        async for event in self.graph.astream_events(self._initial_state(query), config=config, version="v2"):
+            kind = event["event"]
+            node = event.get("metadata", {}).get("langgraph_node")
+
+            if kind == "on_chat_model_stream":
+                content = _chunk_text(event["data"]["chunk"])
+                if content:
+                    streamed_runs.add(event["run_id"])
+                    yield {"event": "token", "node": node, "content": content}
+            elif kind == "on_chat_model_end" and event["run_id"] not in streamed_runs:
+                # Answered from the LLM cache: no chunks were streamed, send the whole text at once
+                content = _chunk_text(event["data"]["output"])
+                if content:
+                    yield {"event": "token", "node": node, "content": content}
+            elif kind == "on_chain_start" and event["name"] == node:
+                yield {"event": "node_start", "node": node}
+            elif kind == "on_chain_end" and event["name"] == node:
+                output = event["data"].get("output") or {}
+                yield {"event": "node_end", "node": node, "step_count": output.get("step_count")}
+                for dataset, value in (output.get("data") or {}).items():
+                    if dataset not in sent_datasets:
+                        sent_datasets.add(dataset)
+                        yield {"event": "data", "dataset": dataset, "data": value}
+            elif kind == "on_chain_end" and not event.get("parent_ids"):
+                final = event["data"]["output"]
+
+        if final is not None:
+            yield {"event": "result", **self._format_result(final)}
+
+    # Define the analyze method: blocking wrapper around aanalyze for scripts and threads
+    # (call aanalyze directly from async code, asyncio.run cannot nest inside a running loop)
+    def analyze(self, query: str, thread_id: Optional[str] = None) -> Dict[str, Any]:
+        return asyncio.run(self.aanalyze(query, thread_id=thread_id))
+
 def test_agents_and_tools():
     # Instantitate agents object from Ecommerce Agent class
     agents = EcommerceAgents()
@@ -0,0 +1,182 @@
+# Import libraries
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence
+
+from langchain_core.caches import BaseCache
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, Generation
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# Function for canonicalizing a prompt: the agent prompts are indented f-strings, so collapse
+# whitespace inside every string of the serialized messages and sort the JSON keys
+def canonical_prompt(prompt: str) -> str:
+    def canonical(value):
+        if isinstance(value, str):
+            return _WHITESPACE_RE.sub(" ", value).strip()
+        if isinstance(value, list):
+            return [canonical(item) for item in value]
+        if isinstance(value, dict):
+            return {key: canonical(item) for key, item in value.items()}
+        return value
+
+    try:
+        return json.dumps(canonical(json.loads(prompt)), sort_keys=True, separators=(",", ":"))
+    except ValueError:
+        return canonical(prompt)
+
+# Function for building the deterministic cache key
+# llm_string carries the model name and its parameters, so changing the model string
+# never hits entries written by the previous model
+def llm_cache_key(prompt: str, llm_string: str) -> str:
+    digest = hashlib.sha256()
+    digest.update(llm_string.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(canonical_prompt(prompt).encode("utf-8"))
+    return digest.hexdigest()
+
+# Functions for turning generations into JSON and back (content and metadata only)
+def _encode_generations(generations: Sequence[Generation]) -> str:
+    encoded = []
+    for generation in generations:
+        message = getattr(generation, "message", None)
+        if message is not None:
+            encoded.append({"content": message.content, "response_metadata": message.response_metadata})
+        else:
+            encoded.append({"text": generation.text})
+    return json.dumps(encoded, default=str)
+
+def _decode_generations(payload: str) -> List[Generation]:
+    generations = []
+    for item in json.loads(payload):
+        if "content" in item:
+            generations.append(ChatGeneration(message=AIMessage(content=item["content"], response_metadata=item.get("response_metadata") or {})))
+        else:
+            generations.append(Generation(text=item["text"]))
+    return generations
+
+# Define InMemoryLLMCache: LRU + TTL cache of LLM responses for one process
+# Plugged into the chat model through its `cache` field, so invoke, ainvoke and the
+# streamed calls made under astream_events all go through it
+class InMemoryLLMCache(BaseCache):
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict() # key -> (stored_at, encoded generations)
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[List[Generation]]:
+        key = llm_cache_key(prompt, llm_string)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (self.ttl is None or time.time() - entry[0] < self.ttl):
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return _decode_generations(entry[1])
+            self._stats["misses"] += 1
+            return None
+
+    def update(self, prompt: str, llm_string: str, return_val: Sequence[Generation]) -> None:
+        key = llm_cache_key(prompt, llm_string)
+        with self._lock:
+            self._entries[key] = (time.time(), _encode_generations(return_val))
+            self._entries.move_to_end(key)
+            self._stats["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    # Lookups are in-memory, no need for the default thread hop
+    async def alookup(self, prompt: str, llm_string: str) -> Optional[List[Generation]]:
+        return self.lookup(prompt, llm_string)
+
+    async def aupdate(self, prompt: str, llm_string: str, return_val: Sequence[Generation]) -> None:
+        self.update(prompt, llm_string, return_val)
+
+    async def aclear(self, **kwargs: Any) -> None:
+        self.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"backend": "memory", "entries": len(self._entries), "max_entries": self.max_entries, **self._stats}
+
+# Define SQLiteLLMCache: same cache persisted to a SQLite file, survives restarts and is
+# shared by every process that points at the same path
+class SQLiteLLMCache(BaseCache):
+    def __init__(self, path: str = "llm_cache.sqlite", max_entries: int = 10000, ttl: Optional[float] = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0}
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, llm_string_hash TEXT NOT NULL, "
+            "generations TEXT NOT NULL, stored_at REAL NOT NULL)"
+        )
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[List[Generation]]:
+        key = llm_cache_key(prompt, llm_string)
+        with self._lock:
+            row = self._db.execute("SELECT generations, stored_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and (self.ttl is None or time.time() - row[1] < self.ttl):
+                self._stats["hits"] += 1
+                return _decode_generations(row[0])
+            self._stats["misses"] += 1
+            return None
+
+    def update(self, prompt: str, llm_string: str, return_val: Sequence[Generation]) -> None:
+        key = llm_cache_key(prompt, llm_string)
+        model_hash = hashlib.sha256(llm_string.encode("utf-8")).hexdigest()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, llm_string_hash, generations, stored_at) VALUES (?, ?, ?, ?)",
+                (key, model_hash, _encode_generations(return_val), time.time()),
+            )
+            self._db.execute(
+                "DELETE FROM llm_cache WHERE key NOT IN (SELECT key FROM llm_cache ORDER BY stored_at DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+            self._stats["stores"] += 1
+
+    # Drop everything, or only entries written under one llm_string (e.g. a retired model)
+    def clear(self, llm_string: Optional[str] = None, **kwargs: Any) -> None:
+        with self._lock:
+            if llm_string is None:
+                self._db.execute("DELETE FROM llm_cache")
+            else:
+                model_hash = hashlib.sha256(llm_string.encode("utf-8")).hexdigest()
+                self._db.execute("DELETE FROM llm_cache WHERE llm_string_hash = ?", (model_hash,))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+            return {"backend": "sqlite", "path": self.path, "entries": entries, "max_entries": self.max_entries, **self._stats}
+
+# Function for building the LLM cache from LLM_CACHE_* environment variables
+# LLM_CACHE=memory (default) | sqlite | off
+def llm_cache_from_env() -> Optional[BaseCache]:
+    backend = os.getenv('LLM_CACHE', 'memory').lower()
+    ttl = float(os.getenv('LLM_CACHE_TTL')) if os.getenv('LLM_CACHE_TTL') else None
+    if backend == 'sqlite':
+        return SQLiteLLMCache(
+            path=os.getenv('LLM_CACHE_PATH', 'llm_cache.sqlite'),
+            max_entries=int(os.getenv('LLM_CACHE_MAX_ENTRIES', '10000')),
+            ttl=ttl,
+        )
+    if backend == 'memory':
+        return InMemoryLLMCache(max_entries=int(os.getenv('LLM_CACHE_MAX_ENTRIES', '1024')), ttl=ttl)
+    return None
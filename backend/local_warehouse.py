@@ -0,0 +1,202 @@
+# Import libraries
+import argparse
+import functools
+import os
+import re
+import sqlite3
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Optional, Sequence
+
+# Schema of the local warehouse: the columns SnowflakeTools and RollupStore query, plus a few
+# descriptive ones so the data looks like the real tables
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS customers (
+    customer_id INTEGER PRIMARY KEY, customer_name TEXT NOT NULL, annual_income REAL NOT NULL,
+    is_active INTEGER NOT NULL, created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS products (
+    product_id INTEGER PRIMARY KEY, product_name TEXT NOT NULL, category TEXT NOT NULL, price REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS orders (
+    order_id INTEGER PRIMARY KEY, customer_id INTEGER NOT NULL, order_date TEXT NOT NULL,
+    total_amount REAL NOT NULL, status TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS order_items (
+    order_item_id INTEGER PRIMARY KEY, order_id INTEGER NOT NULL, product_id INTEGER NOT NULL,
+    quantity INTEGER NOT NULL, unit_price REAL NOT NULL, total_price REAL NOT NULL
+);
+"""
+
+# Indexes are created after the bulk load, inserting into indexed tables is several times slower
+INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_orders_order_date ON orders (order_date);
+CREATE INDEX IF NOT EXISTS idx_order_items_order_id ON order_items (order_id);
+CREATE INDEX IF NOT EXISTS idx_order_items_product_id ON order_items (product_id, total_price, quantity);
+CREATE INDEX IF NOT EXISTS idx_customers_active ON customers (is_active, annual_income);
+"""
+
+CATEGORIES = ["Electronics", "Home", "Kitchen", "Outdoors", "Beauty", "Toys", "Books", "Apparel", "Sports", "Office"]
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S" # order_date is stored as text in this format, so it sorts and compares as a date
+
+_PLACEHOLDER_RE = re.compile(r"%s")
+
+# Function for translating the Snowflake SQL used by the tools into SQLite SQL
+# Only pyformat placeholders differ; TO_DATE is registered as a function and TRUE is a SQLite keyword
+@functools.lru_cache(maxsize=256)
+def translate_query(query: str) -> str:
+    return _PLACEHOLDER_RE.sub("?", query)
+
+# Function for binding a parameter the way Snowflake would compare it against order_date
+def _param(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.strftime(TIMESTAMP_FORMAT)
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+# Function backing TO_DATE(): the date part of a stored timestamp
+def _to_date(value: Any) -> Optional[str]:
+    return None if value is None else str(value)[:10]
+
+# Define LocalCursor: the subset of the snowflake.connector cursor API the tools use
+class LocalCursor:
+    def __init__(self, cursor: sqlite3.Cursor):
+        self._cursor = cursor
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def execute(self, query: str, params: Optional[Sequence[Any]] = None):
+        self._cursor.execute(translate_query(query), tuple(_param(value) for value in params or ()))
+        return self
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def fetchmany(self, size: int):
+        return self._cursor.fetchmany(size)
+
+    def close(self):
+        self._cursor.close()
+
+# Define LocalConnection: a SQLite connection that looks like a Snowflake connection to the pool
+class LocalConnection:
+    def __init__(self, path: str):
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False) # Pool connections move between worker threads
+        self._db.create_function("TO_DATE", 1, _to_date, deterministic=True)
+        self._db.execute("PRAGMA query_only = ON")
+        self._closed = False
+
+    def cursor(self) -> LocalCursor:
+        return LocalCursor(self._db.cursor())
+
+    def is_closed(self) -> bool:
+        return self._closed
+
+    def close(self):
+        self._closed = True
+        self._db.close()
+
+# Function for opening a connection to the local warehouse file (LOCAL_WAREHOUSE_PATH)
+def connect_local(path: Optional[str] = None) -> LocalConnection:
+    path = path or os.getenv('LOCAL_WAREHOUSE_PATH', 'warehouse.sqlite')
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Local warehouse {path} does not exist, create it with: python backend/local_warehouse.py --path {path}")
+    return LocalConnection(path)
+
+# Function for generating a synthetic e-commerce dataset into a SQLite file
+# Rows are generated with numpy in chunks of chunk_size orders, so memory stays flat and
+# tens of millions of orders fit on a laptop. Product popularity is Zipf-like, so "top
+# products" has a clear head, and customer incomes are log-normal around ~60k.
+def generate_synthetic_data(
+    path: str,
+    orders: int = 100_000,
+    customers: Optional[int] = None,
+    products: int = 500,
+    days: int = 365,
+    items_per_order: float = 2.5,
+    seed: int = 42,
+    chunk_size: int = 200_000,
+    end: Optional[datetime] = None,
+) -> Dict[str, int]:
+    import numpy as np # Only the generator needs numpy
+    rng = np.random.default_rng(seed)
+    customers = customers or max(100, orders // 10)
+    end = (end or datetime.now()).replace(microsecond=0)
+
+    db = sqlite3.connect(path, isolation_level=None)
+    db.executescript("PRAGMA journal_mode=OFF; PRAGMA synchronous=OFF;" + SCHEMA)
+    db.execute("BEGIN")
+
+    incomes = np.round(rng.lognormal(np.log(60000), 0.45, customers), 2)
+    active = rng.random(customers) < 0.9
+    signup_offsets = rng.integers(days * 86400, (days + 730) * 86400, customers)
+    db.executemany(
+        "INSERT INTO customers VALUES (?, ?, ?, ?, ?)",
+        ((int(i) + 1, f"Customer {int(i) + 1}", float(incomes[i]), int(active[i]), (end - timedelta(seconds=int(signup_offsets[i]))).strftime(TIMESTAMP_FORMAT)) for i in range(customers)),
+    )
+
+    prices = np.round(rng.lognormal(np.log(35), 0.8, products), 2)
+    db.executemany(
+        "INSERT INTO products VALUES (?, ?, ?, ?)",
+        ((i + 1, f"{CATEGORIES[i % len(CATEGORIES)]} Item {i + 1:05d}", CATEGORIES[i % len(CATEGORIES)], float(prices[i])) for i in range(products)),
+    )
+    popularity = 1.0 / np.arange(1, products + 1) ** 0.8
+    popularity = rng.permutation(popularity / popularity.sum())
+
+    end64 = np.datetime64(end, "s")
+    order_item_id = 0
+    for start in range(0, orders, chunk_size):
+        count = min(chunk_size, orders - start)
+        order_ids = np.arange(start + 1, start + count + 1)
+        customer_ids = rng.integers(1, customers + 1, count)
+        stamps = end64 - rng.integers(0, days * 86400, count).astype("timedelta64[s]")
+        order_dates = np.char.replace(np.datetime_as_string(stamps, unit="s"), "T", " ")
+
+        item_counts = rng.poisson(max(items_per_order - 1, 0), count) + 1
+        item_orders = np.repeat(np.arange(count), item_counts)
+        product_index = rng.choice(products, size=len(item_orders), p=popularity)
+        quantities = rng.integers(1, 4, len(item_orders))
+        unit_prices = prices[product_index]
+        totals = np.round(quantities * unit_prices, 2)
+        amounts = np.round(np.bincount(item_orders, weights=totals, minlength=count), 2)
+        statuses = np.where(rng.random(count) < 0.95, "completed", "returned")
+
+        db.executemany(
+            "INSERT INTO orders VALUES (?, ?, ?, ?, ?)",
+            zip(order_ids.tolist(), customer_ids.tolist(), order_dates.tolist(), amounts.tolist(), statuses.tolist()),
+        )
+        item_ids = range(order_item_id + 1, order_item_id + len(item_orders) + 1)
+        order_item_id += len(item_orders)
+        db.executemany(
+            "INSERT INTO order_items VALUES (?, ?, ?, ?, ?, ?)",
+            zip(item_ids, (order_ids[item_orders]).tolist(), (product_index + 1).tolist(), quantities.tolist(), unit_prices.tolist(), totals.tolist()),
+        )
+
+    db.execute("COMMIT")
+    db.executescript(INDEXES + "ANALYZE; PRAGMA journal_mode=WAL;")
+    db.close()
+    return {"customers": customers, "products": products, "orders": orders, "order_items": order_item_id}
+
+if __name__ == "__main__":
+    # Usage: python backend/local_warehouse.py --path warehouse.sqlite --orders 10000000
+    parser = argparse.ArgumentParser(description="Generate a synthetic local warehouse for offline runs")
+    parser.add_argument("--path", default=os.getenv('LOCAL_WAREHOUSE_PATH', 'warehouse.sqlite'))
+    parser.add_argument("--orders", type=int, default=100_000)
+    parser.add_argument("--customers", type=int, default=None)
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if os.path.exists(args.path):
+        parser.error(f"{args.path} already exists, remove it first")
+    started = time.perf_counter()
+    counts = generate_synthetic_data(args.path, orders=args.orders, customers=args.customers, products=args.products, days=args.days, seed=args.seed)
+    print(f"Wrote {args.path} in {time.perf_counter() - started:.1f}s: " + ", ".join(f"{count:,} {table}" for table, count in counts.items()))
@@ -1,15 +1,56 @@
 # Import libraries
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel # BaseModel is a superclass for defining data models
-from langgraph_agents import EcommerceAgents # Self-defined / custom class from langgraph_agents.py
 from tool_snowflake import SnowflakeTools # Self-defined / custom class from tool_snowflake.py
-import uvicorn
+from jobs import AnalysisJobQueue, QueueFullError # Job queue behind /analyze, in memory or shared through SQLite
+from query_planner import request_key
+from single_flight import SingleFlight # Concurrent identical requests share one computation
+from insights_refresher import InsightsRefresher # Background-materialized /quick-insights snapshot
+from telemetry import RequestTimingMiddleware, queued, render_metrics, start_trace # Latency histograms and per-request traces
 import asyncio
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
 from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+# langgraph_agents (langchain, langgraph, Anthropic client) is imported on first use in get_agents()
+
+# Multi-worker mode: WEB_CONCURRENCY > 1 (read by uvicorn and gunicorn as the worker count) runs one
+# process per worker. The job queue and the caches each process would otherwise keep to itself
+# default to SQLite files every worker opens; an explicit setting always wins
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', '1'))
+if WEB_CONCURRENCY > 1:
+    os.environ.setdefault('ANALYSIS_JOB_DB', 'jobs.sqlite') # Any worker can answer GET /analyze/{id}
+    os.environ.setdefault('METRIC_CACHE_SHARED_PATH', 'shared_cache.sqlite') # Warehouse results, one load per key across workers
+    os.environ.setdefault('ANALYSIS_CACHE_PATH', 'analysis_cache.sqlite')
+    os.environ.setdefault('LLM_CACHE', 'sqlite')
+    os.environ.setdefault('INSIGHTS_SNAPSHOT_PATH', 'insights_snapshot.json') # New workers serve the last snapshot at once
+
+# Lifespan hook: start the analysis job workers with the app and stop them on shutdown.
+# Clients are not built here; with WARMUP_ON_STARTUP (default on) they are built in the
+# background so the app starts serving /health immediately and /ready flips once warm
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await jobs.start()
+    if os.getenv('WARMUP_ON_STARTUP', 'true').lower() not in ('0', 'false', 'no'):
+        start_warm_up()
+    if refresher is not None:
+        await refresher.start()
+    yield
+    if refresher is not None:
+        await refresher.stop()
+    await jobs.stop()
+    if _agents is not None and hasattr(_agents.memory, "close"):
+        _agents.memory.close() # Flush queued checkpoint writes (CHECKPOINTER=sqlite)
+    if _tools is not None:
+        _tools.pool.close()
 
 # Instantiate the FastAPI application class to create FastAPI object app
-app = FastAPI(title="E-Commerce AI Agents Analyzer API")
+app = FastAPI(title="E-Commerce AI Agents Analyzer API", lifespan=lifespan)
 
 # Add middleware to the app using a method of the app instance
 app.add_middleware(
@@ -19,12 +60,77 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(RequestTimingMiddleware) # http_request_duration_seconds by route template
 
-# Instantiate classes to create objects
-agents = EcommerceAgents() # Constructor of EcommerceAgents is invoked
-tools = SnowflakeTools() # Constructor of SnowflakeTools is invoked
+# Clients are created lazily: importing this module opens no connections and builds no LLM client
+_tools = None
+_agents = None
+_clients_lock = threading.RLock()
 executor = ThreadPoolExecutor(max_workers=4) # ThreadPoolExecutor object instantiated
 
+# Function for getting the shared SnowflakeTools (cheap, the connection pool connects on first query)
+def get_tools() -> SnowflakeTools:
+    global _tools
+    with _clients_lock:
+        if _tools is None:
+            _tools = SnowflakeTools() # Constructor of SnowflakeTools is invoked, queries run on the shared connection pool
+        return _tools
+
+# Function for getting the shared EcommerceAgents, building it (and importing langchain) on first use
+def get_agents():
+    global _agents
+    with _clients_lock:
+        if _agents is None:
+            from langgraph_agents import EcommerceAgents # Self-defined / custom class from langgraph_agents.py
+            _agents = EcommerceAgents(tools=get_tools()) # Constructor of EcommerceAgents is invoked, reusing the same tools object
+        return _agents
+
+# Async variant for endpoints: the first build imports langchain, keep that off the event loop
+async def load_agents():
+    if _agents is not None:
+        return _agents
+    return await asyncio.get_running_loop().run_in_executor(None, get_agents)
+
+# Readiness state, filled in by the warm-up
+readiness = {"ready": False, "warming_up": False, "clients_ready": False, "snowflake_ready": False, "warm_up_seconds": None, "error": None}
+_readiness_lock = threading.Lock()
+
+# Function for warming up: build the clients and open one pooled Snowflake connection
+def warm_up():
+    started = time.perf_counter()
+    try:
+        get_agents()
+        readiness["clients_ready"] = True
+        with get_tools().pool.connection():
+            pass
+        readiness["snowflake_ready"] = True
+        readiness["ready"] = True
+        readiness["error"] = None
+    except Exception as exc:
+        readiness["error"] = str(exc)
+    finally:
+        readiness["warm_up_seconds"] = round(time.perf_counter() - started, 3)
+        readiness["warming_up"] = False
+
+# Function for starting the warm-up in a background thread (no-op if it is running or done)
+def start_warm_up():
+    with _readiness_lock:
+        if readiness["ready"] or readiness["warming_up"]:
+            return
+        readiness["warming_up"] = True
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+
+# Job runner: each job gets its own LangGraph thread id, and a trace of its node, tool,
+# query and LLM timings (returned by /analyze with ?timings=true)
+async def run_analysis_job(query: str, job_id: str):
+    agents = await load_agents()
+    with start_trace() as trace:
+        result = await agents.aanalyze(query, thread_id=job_id)
+    return {**result, "timings": trace.to_dict()}
+
+jobs = AnalysisJobQueue(run_analysis_job) # Concurrency, queue size and durable mode come from ANALYSIS_* env vars
+flights = SingleFlight() # Keyed by endpoint + normalized request, e.g. ("quick-insights",) or ("analyze", "top products")
+
 # Define a data model using class which inherits from Pydantic's BaseModel
 class AnalysisRequest(BaseModel):
     query: str # Attribute (parameter) of the class
@@ -35,71 +141,224 @@ class QuickInsight(BaseModel):
     value: str
     trend: str
 
+# Function for shaping a job record into the /analyze response
+def job_response(job, timings: bool = False):
+    response = {
+        "analysis_id": job["id"],
+        "query": job["query"],
+        "status": job["status"], # queued | running | completed | failed
+    }
+    if job["status"] == "completed":
+        result = job["result"]
+        response["results"] = {
+            "total_steps": result["total_steps"],
+            "plan": result.get("plan"),
+            "data": result["data"],
+            "analysis": result["analysis"],
+            "recommendations": result["recommendations"]
+        }
+        if timings and result.get("timings"):
+            response["timings"] = {"queue_wait_seconds": round(job["started_at"] - job["created_at"], 6), **result["timings"]}
+    elif job["status"] == "failed":
+        response["error"] = job["error"]
+    return response
+
 # Define a method which is an asynchronous function to check API health
 # Decorator: @app.get registers this method to respond to HTTP GET requests at "/health"
+# Liveness only: answers as soon as the process is up, without touching Snowflake or the LLM
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "service": "ecommerce-ai-agents-analyzer"}
+    return {"status": "healthy", "service": "ecommerce-ai-agents-analyzer", "worker": os.getpid()}
+
+# Readiness: 200 once the clients are built and Snowflake answered, 503 (and a warm-up kick) before that
+@app.get("/ready")
+async def readiness_check(response: Response):
+    if not readiness["ready"]:
+        start_warm_up()
+        response.status_code = 503
+    return {"status": "ready" if readiness["ready"] else "starting", **readiness}
+
+# Expose the Snowflake connection pool counters (in use, waits, reconnects, ...)
+@app.get("/pool-stats")
+async def pool_stats():
+    return {"pool": get_tools().pool.stats()}
+
+# Expose the metric and analysis cache counters (hits, misses, refreshes, ...)
+@app.get("/cache-stats")
+async def cache_stats():
+    tools = get_tools()
+    return {
+        "metric_cache": tools.cache.stats() if tools.cache is not None else None,
+        "rollups": tools.rollups.stats() if tools.rollups is not None else None,
+        "analysis_cache": _agents.analysis_cache.stats() if _agents is not None and _agents.analysis_cache is not None else None,
+        "llm_cache": _agents.llm.cache.stats() if _agents is not None and hasattr(_agents.llm.cache, "stats") else None,
+        "checkpointer": _agents.memory.stats() if _agents is not None and hasattr(_agents.memory, "stats") else None,
+    }
+
+# Explicit invalidation hook, e.g. call after a warehouse load; metric is optional
+@app.post("/cache/invalidate")
+async def invalidate_cache(metric: str = None):
+    return {"invalidated": get_tools().invalidate_cache(metric)}
+
+# Function for computing the dashboard insights (blocking, runs in the executor)
+def get_insights():
+    # One batched call on the 'tools' object, the four queries run concurrently
+    batch = get_tools().get_quick_insights_data(days=30, no_products=3)
+    sales = batch['sales_metrics']
+    products = batch['top_products']
+    segments = batch['customer_segments']
+    trends = batch['sales_trends'] # 7/30/90-day windows vs their previous periods, from one daily series
+    
+    # Return list of instantiated QuickInsight objects which are passing arguments to constructor
+    return [
+        QuickInsight(
+            metric="Total Revenue (30 days)",
+            value=f"${sales['total_revenue']:,.2f}",
+            trend=f"{sales['total_orders']} orders, {period_change(trends, 30)}"
+        ),
+        QuickInsight(
+            metric="Revenue (7 days)",
+            value=f"${trend_window(trends, 7)['revenue']:,.2f}",
+            trend=period_change(trends, 7) + (f", {len(trends['anomalies'])} unusual day(s)" if trends['anomalies'] else "")
+        ),
+        QuickInsight(
+            metric="Top Product",
+            value=products['top_products'][0]['product_name'] if products['top_products'] else "N/A",
+            trend=f"${products['top_products'][0]['total_revenue']:,.2f}" if products['top_products'] else "N/A"
+        ),
+        QuickInsight(
+            metric="Active Customers",
+            value=str(sum(seg['customer_count'] for seg in segments['customer_segments'])),
+            trend="Across all segments"
+        )
+    ]
+
+# Function for one window of a get_sales_trends result
+def trend_window(trends, days: int):
+    return next(row for row in trends['windows'] if row['window_days'] == days)
+
+# Function for the revenue change of a window vs its previous period, e.g. "+4.2% vs previous 30 days"
+def period_change(trends, days: int) -> str:
+    pct = trend_window(trends, days)['revenue_pct']
+    return f"{pct:+.1%} vs previous {days} days" if pct is not None else f"no revenue in the previous {days} days"
+
+# Use asyncio to run the blocking function in a separate thread using event loop
+# Returns plain dicts so the snapshot can be persisted as JSON
+async def compute_quick_insights():
+    loop = asyncio.get_event_loop()
+    insights = await loop.run_in_executor(executor, queued("api", get_insights)) # Records the wait for a free executor thread
+    return [insight.model_dump() for insight in insights]
+
+# Recomputed in the background every INSIGHTS_REFRESH_INTERVAL seconds (None when set to 0)
+refresher = InsightsRefresher.from_env(compute_quick_insights)
 
 # Define another method for the /quick-insights endpoint
 # Decorator: @app.get binds this method to a route for GET requests
+# Served from the background snapshot (with its as_of time) without touching the warehouse.
+# Before the first snapshot, or with the refresher disabled, the insights are computed here;
+# a dashboard refresh from many users at once runs the queries once, every request gets the result
 @app.get("/quick-insights")
 async def get_quick_insights():
-    def get_insights(): # Inner function, used in executor thread
-        # Method invocations on the 'tools' object
-        sales = tools.get_sales_metrics(30)
-        products = tools.get_top_products(3)
-        segments = tools.get_customer_segments()
-        
-        # Return list of instantiated QuickInsight objects which are passing arguments to constructor
-        return [
-            QuickInsight(
-                metric="Total Revenue (30 days)",
-                value=f"${sales['total_revenue']:,.2f}",
-                trend=f"{sales['total_orders']} orders"
-            ),
-            QuickInsight(
-                metric="Top Product",
-                value=products['top_products'][0]['product_name'] if products['top_products'] else "N/A",
-                trend=f"${products['top_products'][0]['total_revenue']:,.2f}" if products['top_products'] else "N/A"
-            ),
-            QuickInsight(
-                metric="Active Customers",
-                value=str(sum(seg['customer_count'] for seg in segments['customer_segments'])),
-                trend="Across all segments"
-            )
-        ]
-    
-    # Use asyncio to run blocking function in a separate thread using event loop
-    loop = asyncio.get_event_loop()
-    insights = await loop.run_in_executor(executor, get_insights)
-    return {"insights": insights}
+    if refresher is None:
+        insights = await flights.do(("quick-insights",), compute_quick_insights)
+        return {"insights": insights, "as_of": datetime.now(timezone.utc).isoformat(timespec="seconds")}
+    snapshot = refresher.snapshot or await flights.do(("quick-insights",), lambda: refresher.refresh(on_demand=False))
+    return {"insights": snapshot["insights"], "as_of": snapshot["as_of"]}
+
+# Recompute the quick insights now, e.g. after a warehouse load (503 when the warehouse query fails)
+@app.post("/quick-insights/refresh")
+async def refresh_quick_insights():
+    if refresher is None:
+        raise HTTPException(status_code=404, detail="Background refresh is disabled (INSIGHTS_REFRESH_INTERVAL=0)")
+    try:
+        snapshot = await refresher.refresh()
+    except Exception as exc:
+        raise HTTPException(status_code=503, detail=f"Refresh failed, serving the previous snapshot: {exc}")
+    return {"insights": snapshot["insights"], "as_of": snapshot["as_of"], "refresh_seconds": snapshot["refresh_seconds"]}
+
+# Expose the refresher counters (refreshes, failures, snapshot age, ...)
+@app.get("/quick-insights/stats")
+async def quick_insights_stats():
+    return {"refresher": refresher.stats() if refresher is not None else None}
 
 # Define a method that handles POST requests and accepts a class instance as a parameter
 # Decorator: @app.post binds this method to HTTP POST requests at the "/analyze" route
-@app.post("/analyze")
-async def analyze_data(request: AnalysisRequest): # Method takes in a parameter of type AnalysisRequest
-    def run_analysis(): # Inner function (non-async) to run in thread
-        return agents.analyze(request.query) # Method call on the 'agents' class instance
+# The analysis is queued and the job id returned right away (202); poll GET /analyze/{analysis_id}.
+# Pass ?wait=true to hold the request open until the job has finished, ?timings=true for a timing breakdown.
+@app.post("/analyze", status_code=202)
+async def analyze_data(request: AnalysisRequest, response: Response, wait: bool = False, timings: bool = False): # Method takes in a parameter of type AnalysisRequest
+    async def submit_and_wait():
+        job, created = await jobs.submit(request.query)
+        return await jobs.wait(job["id"])
     
-    loop = asyncio.get_event_loop()
-    result = await loop.run_in_executor(executor, run_analysis)
+    try:
+        if wait:
+            # Identical waiting requests attach to one submit-and-wait instead of each polling the job
+            key = ("analyze", request_key(request.query))
+            job = await flights.do(key, submit_and_wait)
+        else:
+            job, created = await jobs.submit(request.query) # Identical in-flight queries share one job
+    except QueueFullError as exc:
+        raise HTTPException(status_code=429, detail=str(exc), headers={"Retry-After": "5"})
     
-    # Structured response, includes data returned from the analyze method
-    return {
-        "analysis_id": "temp_id",
-        "query": result["query"],
-        "status": "completed",
-        "results": {
-            "total_steps": result["total_steps"],
-            "data": result["data"],
-            "analysis": result["analysis"],
-            "recommendations": result["recommendations"]
-        }
-    }
+    if job["status"] in ("completed", "failed"):
+        response.status_code = 200
+    
+    # Structured response, includes the results once the job has completed
+    return job_response(job, timings=timings)
+
+# Poll the status (and results) of a queued analysis
+@app.get("/analyze/{analysis_id}")
+async def get_analysis(analysis_id: str, timings: bool = False):
+    job = await jobs.get(analysis_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown analysis_id")
+    return job_response(job, timings=timings)
+
+# Expose the job queue counters (queued, running, deduplicated, rejected, ...)
+@app.get("/job-stats")
+async def job_stats():
+    return {"jobs": await jobs.stats()}
+
+# Expose the request coalescing counters per endpoint (executions, coalesced, abandoned, failed)
+@app.get("/coalescing-stats")
+async def coalescing_stats():
+    return {"single_flight": flights.stats()}
+
+# Prometheus scrape endpoint: latency histograms (HTTP, graph nodes, tools, warehouse queries,
+# pool and executor waits, LLM calls), LLM token counters and pool/queue gauges
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    gauges = {"analysis_jobs": await jobs.stats(), "single_flight": {"in_flight": flights.in_flight()}}
+    if _tools is not None:
+        gauges["warehouse_pool"] = _tools.pool.stats()
+    return PlainTextResponse(render_metrics(gauges), media_type="text/plain; version=0.0.4")
+
+# Streaming variant of /analyze: Server-Sent Events with node-by-node progress,
+# each fetched dataset and the analyst/consultant tokens as they are generated
+@app.post("/analyze/stream")
+async def analyze_data_stream(request: AnalysisRequest):
+    async def event_stream():
+        try:
+            agents = await load_agents()
+            async for event in agents.astream_analysis(request.query):
+                yield f"event: {event['event']}\ndata: {json.dumps(event, default=str)}\n\n"
+        except Exception as exc:
+            yield f"event: error\ndata: {json.dumps({'event': 'error', 'detail': str(exc)})}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}, # Stop proxies from buffering the stream
+    )
 
 # Main entry point of the script when executed directly
 if __name__ == "__main__":
+    import uvicorn
     print("Starting E-Commerce AI Agents Analyzer API...")
     # Start the web server: method call that runs the FastAPI app
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # Several workers need the app as an import string so each process imports it itself
+    if WEB_CONCURRENCY > 1:
+        uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=WEB_CONCURRENCY)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,263 @@
+# Import libraries
+import copy
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from shared_cache import SharedCache
+
+# Default freshness per metric in seconds; the warehouse numbers change at most a few times per hour
+DEFAULT_TTLS = {
+    "get_sales_metrics": 300,
+    "get_top_products": 600,
+    "get_customer_segments": 1800,
+    "get_sales_trends": 300,
+}
+
+# Define the structure of one cached result
+class _Entry:
+    __slots__ = ("value", "fetched_at", "ttl", "refreshing")
+
+    def __init__(self, value: Any, ttl: float, age: float = 0.0):
+        self.value = value
+        self.fetched_at = time.monotonic() - age # age > 0 for values another worker loaded earlier
+        self.ttl = ttl
+        self.refreshing = False
+
+# Define MetricCache: TTL + LRU + stale-while-revalidate cache for SnowflakeTools results
+# - fresh entries are returned straight away (hit)
+# - stale entries (past TTL but inside the stale window) are returned straight away and
+#   refreshed once in the background, so readers never block on the warehouse
+# - missing or fully expired entries are loaded once, concurrent callers for the same key
+#   wait on that single load instead of issuing their own query
+# - with a SharedCache (METRIC_CACHE_SHARED_PATH), values are also shared between worker
+#   processes: a miss first checks the shared file, and only the worker holding the key's lease
+#   queries the warehouse while the others wait for its result
+# - invalidate() bumps a generation counter (per metric, or for the whole cache), and a load or
+#   refresh that started before it is returned to its callers but never stored
+class MetricCache:
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        default_ttl: Optional[float] = None,
+        ttls: Optional[Dict[str, float]] = None,
+        stale_ttl: Optional[float] = None, # Extra seconds a value may be served while it is refreshed
+        refresh_workers: int = 2,
+        shared: Optional[SharedCache] = None,
+    ):
+        self.max_entries = max_entries or int(os.getenv('METRIC_CACHE_MAX_ENTRIES', '256'))
+        self.default_ttl = default_ttl if default_ttl is not None else float(os.getenv('METRIC_CACHE_TTL', '300'))
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.stale_ttl = stale_ttl if stale_ttl is not None else float(os.getenv('METRIC_CACHE_STALE_TTL', '3600'))
+        self.shared = shared if shared is not None else SharedCache.from_env() # None unless METRIC_CACHE_SHARED_PATH is set
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple, _Entry]" = OrderedDict()
+        self._inflight: Dict[Tuple, Future] = {}
+        self._generation = 0 # Bumped by invalidate()
+        self._metric_generations: Dict[str, int] = {} # Bumped by invalidate(metric)
+        self._refresher = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix="metric-cache")
+        self._stats = {"hits": 0, "stale_hits": 0, "misses": 0, "coalesced": 0, "refreshes": 0, "refresh_errors": 0, "evictions": 0, "invalidations": 0, "shared_hits": 0, "discarded_loads": 0}
+
+    # Build the cache key from the metric name and its (normalized) arguments
+    @staticmethod
+    def make_key(metric: str, args: Tuple = (), kwargs: Optional[Dict[str, Any]] = None) -> Tuple:
+        return (metric, tuple(args), tuple(sorted((kwargs or {}).items())))
+
+    # Return the cached value for key, calling loader() on a miss
+    def get_or_load(self, key: Tuple, loader: Callable[[], Any]) -> Any:
+        metric = key[0]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = time.monotonic() - entry.fetched_at
+                if age < entry.ttl:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return copy.deepcopy(entry.value)
+                if age < entry.ttl + self.stale_ttl:
+                    self._entries.move_to_end(key)
+                    self._stats["stale_hits"] += 1
+                    if not entry.refreshing and key not in self._inflight:
+                        entry.refreshing = True
+                        self._refresher.submit(self._refresh, key, loader, self._generation_locked(metric))
+                    return copy.deepcopy(entry.value)
+
+            future = self._inflight.get(key)
+            if future is not None:
+                self._stats["coalesced"] += 1
+                owner = False
+            else:
+                self._stats["misses"] += 1
+                future = Future()
+                self._inflight[key] = future
+                generation = self._generation_locked(metric)
+                owner = True
+
+        if not owner:
+            return copy.deepcopy(future.result())
+
+        try:
+            value, age = self._load(key, loader, generation)
+        except BaseException as exc:
+            with self._lock:
+                self._release_inflight_locked(key, future)
+            future.set_exception(exc)
+            raise
+        with self._lock:
+            self._store_if_current_locked(key, value, age, generation)
+            self._release_inflight_locked(key, future)
+        future.set_result(value)
+        return copy.deepcopy(value)
+
+    # Return the TTL configured for a metric
+    def ttl_for(self, metric: str) -> float:
+        return self.ttls.get(metric, self.default_ttl)
+
+    # Drop cached results, for one metric or everything
+    # Loads already in flight are detached: their callers still get the result, later callers load again
+    def invalidate(self, metric: Optional[str] = None) -> int:
+        with self._lock:
+            if metric is None:
+                self._generation += 1
+            else:
+                self._metric_generations[metric] = self._metric_generations.get(metric, 0) + 1
+            keys = [key for key in self._entries if metric is None or key[0] == metric]
+            for key in keys:
+                del self._entries[key]
+            for key in [key for key in self._inflight if metric is None or key[0] == metric]:
+                del self._inflight[key]
+            self._stats["invalidations"] += len(keys)
+        if self.shared is not None:
+            # Other workers drop their in-memory copies when their TTL runs out
+            self.shared.invalidate(None if metric is None else json.dumps([metric])[:-1] + ",")
+        return len(keys)
+
+    # Return cache counters, safe to serialize as JSON
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {"entries": len(self._entries), "max_entries": self.max_entries, **self._stats}
+        stats["shared"] = self.shared.stats() if self.shared is not None else None
+        return stats
+
+    # Private method: background refresh of a stale entry, generation as of when it was scheduled
+    def _refresh(self, key: Tuple, loader: Callable[[], Any], generation: Tuple[int, int]):
+        try:
+            loaded = self._load(key, loader, generation, refreshing=True)
+        except Exception:
+            loaded = None
+            with self._lock:
+                self._stats["refresh_errors"] += 1
+        if loaded is None:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry.refreshing = False
+            return
+        with self._lock:
+            if self._store_if_current_locked(key, loaded[0], loaded[1], generation):
+                self._stats["refreshes"] += 1
+
+    # Private method: load a value, returns (value, age in seconds)
+    # Through the shared store when there is one: reuse another worker's value, otherwise only the
+    # lease holder runs loader() and the rest wait for it. A background refresh (refreshing=True)
+    # only accepts fresh shared values and gives up (None) when another worker is already refreshing
+    def _load(self, key: Tuple, loader: Callable[[], Any], generation: Tuple[int, int], refreshing: bool = False) -> Optional[Tuple[Any, float]]:
+        if self.shared is None:
+            return loader(), 0.0
+        shared_key = SharedCache.encode_key(key)
+        ttl = self.ttl_for(key[0])
+
+        found = self.shared.get(shared_key)
+        if found is not None and (found[1] < ttl or not refreshing):
+            return self._shared_hit(found)
+        token = self.shared.acquire(shared_key)
+        if token is not None:
+            try:
+                value = loader()
+            except BaseException:
+                self.shared.release(shared_key, token)
+                raise
+            with self._lock:
+                current = self._generation_locked(key[0]) == generation
+            if current:
+                self.shared.set(shared_key, value, ttl + self.stale_ttl, token)
+            else:
+                self.shared.release(shared_key, token) # Invalidated while loading: keep the old value out of the shared store
+            return value, 0.0
+        if refreshing:
+            return None
+        found = self.shared.wait(shared_key)
+        if found is not None:
+            return self._shared_hit(found)
+        return loader(), 0.0 # The lease holder failed or died: load here
+
+    # Private method: count a value taken from the shared store
+    def _shared_hit(self, found: Tuple[Any, float]) -> Tuple[Any, float]:
+        with self._lock:
+            self._stats["shared_hits"] += 1
+        return found
+
+    # Private method: the generation a load of this metric has to match to be stored, caller holds the lock
+    def _generation_locked(self, metric: str) -> Tuple[int, int]:
+        return (self._generation, self._metric_generations.get(metric, 0))
+
+    # Private method: store a loaded value unless invalidate() ran since the load started, caller holds the lock
+    def _store_if_current_locked(self, key: Tuple, value: Any, age: float, generation: Tuple[int, int]) -> bool:
+        if self._generation_locked(key[0]) != generation:
+            self._stats["discarded_loads"] += 1
+            return False
+        self._store_locked(key, value, self.ttl_for(key[0]), age)
+        return True
+
+    # Private method: forget the in-flight load of key unless invalidate() already replaced it, caller holds the lock
+    def _release_inflight_locked(self, key: Tuple, future: Future):
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+
+    # Private method: insert or replace an entry and evict least recently used ones, caller holds the lock
+    def _store_locked(self, key: Tuple, value: Any, ttl: float, age: float = 0.0):
+        self._entries[key] = _Entry(value, ttl, age)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+# Decorator for SnowflakeTools methods: route the call through self.cache when one is set
+# Arguments are bound against the signature so get_top_products() and get_top_products(10) share a key
+def cached_metric(method: Callable) -> Callable:
+    signature = inspect.signature(method)
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        cache = getattr(self, "cache", None)
+        if cache is None:
+            return method(self, *args, **kwargs)
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        arguments = dict(bound.arguments)
+        arguments.pop("self")
+        key = MetricCache.make_key(method.__name__, kwargs=arguments)
+        return cache.get_or_load(key, lambda: method(self, *args, **kwargs))
+
+    return wrapper
+
+# Shared cache used by every SnowflakeTools instance unless one is passed in
+_shared_cache: Optional[MetricCache] = None
+_shared_cache_lock = threading.Lock()
+
+# Function for getting (and lazily creating) the process-wide metric cache
+def get_shared_cache() -> Optional[MetricCache]:
+    global _shared_cache
+    if os.getenv('METRIC_CACHE_ENABLED', 'true').lower() in ('0', 'false', 'no'):
+        return None
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = MetricCache()
+        return _shared_cache
@@ -0,0 +1,86 @@
+# Import libraries
+import csv
+import io
+import os
+from typing import Any, Dict, List, Optional
+
+# Function for estimating how many tokens a text costs
+# Claude's tokenizer averages roughly 4 characters per token on English and CSV-like text,
+# which is close enough for budgeting without calling the API
+def estimate_tokens(text: str) -> int:
+    return (len(text) + 3) // 4
+
+# Function for rounding a value for the prompt (floats only)
+def _compact_value(value: Any, float_digits: int) -> Any:
+    if isinstance(value, float):
+        rounded = round(value, float_digits)
+        return int(rounded) if rounded.is_integer() else rounded
+    return value
+
+# Function for rendering rows (list of dicts) as CSV with a single header line
+def _render_table(rows: List[Dict[str, Any]], float_digits: int) -> str:
+    columns = list(rows[0].keys())
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow([_compact_value(row.get(column), float_digits) for column in columns])
+    return buffer.getvalue()
+
+# Function for summarizing rows cut from a table: count plus totals of the numeric columns
+def _summarize_rest(rest: List[Dict[str, Any]], float_digits: int) -> str:
+    totals = {}
+    for row in rest:
+        for column, value in row.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                totals[column] = totals.get(column, 0) + value
+    summary = ", ".join(f"{column}={_compact_value(float(total), float_digits)}" for column, total in totals.items())
+    return f"... {len(rest)} more rows" + (f" (totals: {summary})" if summary else "") + "\n"
+
+# Function for rendering one dataset (as returned by SnowflakeTools) compactly
+def _render_dataset(name: str, dataset: Any, max_rows: int, float_digits: int) -> str:
+    lines = [f"## {name}\n"]
+    if not isinstance(dataset, dict):
+        dataset = {name: dataset}
+
+    scalars = {key: value for key, value in dataset.items() if not isinstance(value, (list, dict))}
+    if scalars:
+        lines.append(_render_table([scalars], float_digits))
+
+    for key, value in dataset.items():
+        if isinstance(value, list) and value and all(isinstance(row, dict) for row in value):
+            if key != name:
+                lines.append(f"# {key}\n")
+            lines.append(_render_table(value[:max_rows], float_digits))
+            if len(value) > max_rows:
+                lines.append(_summarize_rest(value[max_rows:], float_digits))
+        elif isinstance(value, list):
+            lines.append(f"{key}: {', '.join(str(_compact_value(item, float_digits)) for item in value[:max_rows])}\n")
+        elif isinstance(value, dict):
+            lines.append(_render_dataset(key, value, max_rows, float_digits))
+    return "".join(lines)
+
+# Function for encoding AnalysisState.data for an LLM prompt
+# Each dataset becomes a compact CSV table (one header line, rounded floats); long lists are
+# cut to max_rows with a totals line, and max_rows is halved until the text fits token_budget
+def encode_prompt_data(
+    data: Dict[str, Any],
+    max_rows: Optional[int] = None,
+    token_budget: Optional[int] = None,
+    float_digits: Optional[int] = None,
+) -> str:
+    max_rows = max_rows or int(os.getenv('PROMPT_MAX_ROWS', '25'))
+    token_budget = token_budget or int(os.getenv('PROMPT_TOKEN_BUDGET', '2000'))
+    float_digits = float_digits if float_digits is not None else int(os.getenv('PROMPT_FLOAT_DIGITS', '2'))
+
+    while True:
+        text = "".join(_render_dataset(name, dataset, max_rows, float_digits) for name, dataset in data.items())
+        if estimate_tokens(text) <= token_budget or max_rows <= 1:
+            break
+        max_rows //= 2
+
+    # Last resort: hard cut at the budget so one huge dataset can never blow up the prompt
+    max_chars = token_budget * 4
+    if len(text) > max_chars:
+        text = text[:max_chars].rsplit("\n", 1)[0] + "\n... truncated to fit the prompt budget\n"
+    return text
@@ -0,0 +1,117 @@
+# Import libraries
+import json
+import re
+from typing import Any, Dict, List, TypedDict
+
+from analysis_cache import normalize_query
+
+# Default parameters, same as the SnowflakeTools method defaults
+DEFAULT_DAYS = 30
+DEFAULT_NO_PRODUCTS = 10
+MAX_DAYS = 3650
+MAX_PRODUCTS = 100
+
+# Intent patterns, compiled once at import: tool node -> words that ask for its dataset
+INTENTS = {
+    "get_sales_metrics": re.compile(r"\b(sales?|revenue|orders?|aov|average order|turnover|earn\w*)\b"),
+    "get_top_products": re.compile(r"\b(products?|items?|best[- ]?sell\w*|top sell\w*|skus?|catalog)\b"),
+    "get_customer_segments": re.compile(r"\b(customers?|segments?|buyers?|shoppers?|clients?|audience|income)\b"),
+    "get_sales_trends": re.compile(
+        r"\b(trends?|trending|grow\w*|declin\w*|change\w*|compar\w*|vs|versus|previous|prior|"
+        r"week over week|month over month|wow|mom|anomal\w*|spikes?|dips?|unusual)\b"
+    ),
+}
+
+# Questions that ask for a number or a list ("what was revenue", "how many orders", "top 5 products")
+_LOOKUP_RE = re.compile(r"^\s*(what(?:'s| is| are| was| were)?|how (?:much|many)|which|list|show(?: me)?|give me|total|top\b)")
+# Words that ask for interpretation; any of them sends the query through the LLM stages
+_ANALYTIC_RE = re.compile(
+    r"\b(why|trends?|trending|analy\w*|insights?|recommend\w*|improve\w*|should|strateg\w*|explain\w*|compar\w*|"
+    r"patterns?|forecast\w*|predict\w*|opportunit\w*|risks?|grow\w*|advice|advise|suggest\w*|doing|perform\w*|"
+    r"optimi\w*|increase|decrease|drop\w*|declin\w*|change\w*|better|worse)\b"
+)
+
+_DAYS_RE = re.compile(r"\b(?:last|past|previous|over)\s+(\d+)\s*(day|week|month|quarter|year)s?\b")
+_PERIOD_RE = re.compile(r"\b(?:last|past|this|previous)\s+(day|week|month|quarter|year)\b|\b(today|yesterday|ytd)\b")
+_TOP_N_RE = re.compile(r"\b(?:top|best|first)\s+(\d+)\b|\b(\d+)\s+(?:best|top|most)\b")
+
+_PERIOD_DAYS = {"day": 1, "today": 1, "yesterday": 1, "week": 7, "month": 30, "quarter": 90, "year": 365, "ytd": 365}
+
+# Define QueryPlan: the planner's output, stored in AnalysisState["plan"]
+class QueryPlan(TypedDict):
+    datasets: List[str] # Tool nodes to run, in parallel
+    params: Dict[str, int] # days, no_products
+    needs_llm: bool # False: answer straight from the data, no analyst/consultant calls
+    intent: str # "lookup" or "analysis"
+
+# Function for turning a query into an execution plan in one pass
+def plan_query(query: str) -> QueryPlan:
+    text = query.lower()
+
+    datasets = [tool for tool, pattern in INTENTS.items() if pattern.search(text)]
+    matched = bool(datasets)
+    if not datasets:
+        datasets = ["get_sales_metrics"]
+
+    days = DEFAULT_DAYS
+    match = _DAYS_RE.search(text)
+    if match:
+        days = int(match.group(1)) * _PERIOD_DAYS[match.group(2)]
+    else:
+        match = _PERIOD_RE.search(text)
+        if match:
+            days = _PERIOD_DAYS[match.group(1) or match.group(2)]
+
+    no_products = DEFAULT_NO_PRODUCTS
+    match = _TOP_N_RE.search(text)
+    if match:
+        no_products = int(match.group(1) or match.group(2))
+
+    lookup = matched and bool(_LOOKUP_RE.search(text)) and not _ANALYTIC_RE.search(text)
+    return QueryPlan(
+        datasets=datasets,
+        params={"days": min(max(days, 1), MAX_DAYS), "no_products": min(max(no_products, 1), MAX_PRODUCTS)},
+        needs_llm=not lookup,
+        intent="lookup" if lookup else "analysis",
+    )
+
+# Function for the key identical requests share (job dedup, single-flight): the plan plus the
+# normalized text. Normalizing drops "what", "show" and "should", which decide the intent, so
+# "Show top products" and "What should we do about top products?" only differ in their plans
+def request_key(query: str) -> str:
+    plan = plan_query(query)
+    text = normalize_query(query) or query.strip().lower()
+    return json.dumps([plan["intent"], plan["needs_llm"], sorted(plan["datasets"]), plan["params"], text], sort_keys=True)
+
+# Function for answering a lookup plan straight from the fetched datasets
+def direct_answer(data: Dict[str, Any]) -> str:
+    lines = []
+    sales = data.get("sales_metrics")
+    if sales:
+        lines.append(
+            f"Last {sales['period_days']} day{'s' if sales['period_days'] != 1 else ''}: ${sales['total_revenue']:,.2f} revenue from {sales['total_orders']:,} orders "
+            f"({sales['unique_customers']:,} customers, average order ${sales['avg_order_value']:,.2f})."
+        )
+    products = (data.get("top_products") or {}).get("top_products")
+    if products is not None:
+        lines.append(f"Top {len(products)} products by revenue:")
+        lines.extend(
+            f"{rank}. {product['product_name']}: ${product['total_revenue']:,.2f} ({product['total_sold']:,} sold, {product['orders_count']:,} orders)"
+            for rank, product in enumerate(products, start=1)
+        )
+    trends = data.get("sales_trends")
+    if trends:
+        lines.append(f"Revenue vs the previous period (as of {trends['as_of_date']}):")
+        lines.extend(
+            f"- {row['window_days']} days: ${row['revenue']:,.2f}"
+            + (f" ({row['revenue_pct']:+.1%})" if row["revenue_pct"] is not None else "")
+            for row in trends["windows"]
+        )
+    segments = (data.get("customer_segments") or {}).get("customer_segments")
+    if segments is not None:
+        lines.append("Customer segments:")
+        lines.extend(
+            f"- {segment['segment']}: {segment['customer_count']:,} customers, average income ${segment['avg_income']:,.2f}"
+            for segment in segments
+        )
+    return "\n".join(lines) or "No data found for this question."
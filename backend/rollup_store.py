@@ -0,0 +1,291 @@
+# Import libraries
+import hashlib
+import math
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+# Define HyperLogLog: fixed-size sketch for counting distinct customers
+# Daily sketches are merged (register-wise max) to answer "unique customers over N days"
+# without keeping customer ids; precision 12 = 4096 one-byte registers, ~1.6% standard error
+class HyperLogLog:
+    def __init__(self, precision: int = 12, registers: Optional[bytes] = None):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.size)
+
+    def add(self, value: Any):
+        hashed = int.from_bytes(hashlib.blake2b(str(value).encode("utf-8"), digest_size=8).digest(), "big")
+        index = hashed >> (64 - self.precision)
+        rest = (hashed << self.precision) & ((1 << 64) - 1)
+        rank = (64 - self.precision + 1) if rest == 0 else (65 - rest.bit_length())
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+        return self
+
+    def count(self) -> int:
+        alpha = 0.7213 / (1 + 1.079 / self.size)
+        estimate = alpha * self.size * self.size / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.size and zeros:
+            estimate = self.size * math.log(self.size / zeros) # Small-range correction
+        return int(round(estimate))
+
+    def to_bytes(self) -> bytes:
+        return bytes(self.registers)
+
+# Warehouse queries for the incremental refresh: only rows newer than the watermark are read,
+# pre-aggregated per day (and per customer / product) in the warehouse
+NEW_ORDERS_QUERY = """
+SELECT
+    TO_DATE(order_date) as day,
+    customer_id,
+    COUNT(*) as orders,
+    SUM(total_amount) as revenue,
+    MAX(order_date) as last_order_date
+FROM orders
+WHERE order_date > %s
+GROUP BY TO_DATE(order_date), customer_id
+"""
+
+NEW_PRODUCT_SALES_QUERY = """
+SELECT
+    TO_DATE(o.order_date) as day,
+    p.product_id,
+    p.product_name,
+    SUM(oi.quantity) as total_sold,
+    SUM(oi.total_price) as total_revenue,
+    COUNT(DISTINCT oi.order_id) as orders_count
+FROM order_items oi
+JOIN orders o ON oi.order_id = o.order_id
+JOIN products p ON oi.product_id = p.product_id
+WHERE o.order_date > %s AND o.order_date <= %s
+GROUP BY TO_DATE(o.order_date), p.product_id, p.product_name
+"""
+
+# Watermark before the first refresh: every order is newer
+EPOCH_WATERMARK = "1970-01-01 00:00:00"
+
+# Function for turning whatever the driver returns for a day into an ISO date string
+def _day(value: Any) -> str:
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)[:10]
+
+# Define RollupStore: local SQLite store of daily sales and per-product aggregates
+# refresh() pulls only orders after the stored watermark and adds them to the daily rows;
+# sales_metrics(days) and top_products(n) are then answered from the rollups, so their cost
+# depends on the number of days (and products), not on the size of the orders table.
+# Orders loaded late with an order_date at or before the watermark are only picked up by rebuild().
+# Several processes may share one file: refresh() writes under BEGIN IMMEDIATE and re-checks the
+# watermark there, and reads use their own connection so they only ever see committed refreshes.
+class RollupStore:
+    def __init__(
+        self,
+        fetch: Callable[[str, Any], Iterable], # fetch(query, params) -> rows, e.g. SnowflakeTools._fetch
+        path: str = "rollups.sqlite",
+        refresh_interval: float = 60, # Seconds between watermark refreshes triggered by reads
+        precision: int = 12,
+    ):
+        self.fetch = fetch
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self.precision = precision
+        self._lock = threading.RLock()
+        self._last_refresh = 0.0
+        self._stats = {"refreshes": 0, "rows_loaded": 0, "reads": 0}
+        self._read_lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30) # Writer, used by refresh()
+        self._db.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS daily_sales (
+                day TEXT PRIMARY KEY, orders INTEGER NOT NULL, revenue REAL NOT NULL, customers BLOB NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS daily_product_sales (
+                day TEXT NOT NULL, product_id TEXT NOT NULL, product_name TEXT NOT NULL,
+                total_sold INTEGER NOT NULL, total_revenue REAL NOT NULL, orders_count INTEGER NOT NULL,
+                PRIMARY KEY (day, product_id)
+            );
+            CREATE TABLE IF NOT EXISTS watermark (name TEXT PRIMARY KEY, value TEXT NOT NULL);
+        """)
+        if path == ":memory:":
+            # A second connection would open a different, empty database: read through the writer under its lock
+            self._reader, self._read_lock = self._db, self._lock
+        else:
+            self._reader = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+
+    # Build a store from ROLLUP_* environment variables, None unless ROLLUPS_ENABLED is set
+    @classmethod
+    def from_env(cls, fetch) -> Optional["RollupStore"]:
+        if os.getenv('ROLLUPS_ENABLED', 'false').lower() not in ('1', 'true', 'yes'):
+            return None
+        return cls(
+            fetch,
+            path=os.getenv('ROLLUP_DB', 'rollups.sqlite'),
+            refresh_interval=float(os.getenv('ROLLUP_REFRESH_INTERVAL', '60')),
+        )
+
+    # Return the last order_date loaded, or None before the first refresh
+    def watermark(self) -> Optional[str]:
+        row = self._read("SELECT value FROM watermark WHERE name = 'orders'")
+        return row[0][0] if row else None
+
+    # Load orders newer than the watermark into the daily rollups, returns the number of rows read
+    def refresh(self) -> int:
+        with self._lock:
+            since = self._watermark(self._db)
+            days, product_rows, until, loaded = self._fetch_since(since)
+            if until is None:
+                self._last_refresh = time.monotonic()
+                return 0
+
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                # Another process sharing the file loaded these rows while we were fetching:
+                # adding them again would double count, the next refresh continues from its watermark
+                if self._watermark(self._db) != since:
+                    self._db.execute("ROLLBACK")
+                    self._last_refresh = time.monotonic()
+                    return 0
+                self._apply(days, product_rows, until)
+                self._db.execute("COMMIT")
+            except BaseException:
+                if self._db.in_transaction:
+                    self._db.execute("ROLLBACK")
+                raise
+
+            self._last_refresh = time.monotonic()
+            self._stats["refreshes"] += 1
+            self._stats["rows_loaded"] += loaded
+            return loaded
+
+    # Refresh only if the last one is older than refresh_interval
+    def refresh_if_due(self):
+        if time.monotonic() - self._last_refresh >= self.refresh_interval:
+            self.refresh()
+
+    # Reload everything from scratch (picks up late-arriving or corrected orders)
+    # The full history is fetched first, then swapped in with one transaction: readers see either
+    # the old rollups or the new ones, never an empty store
+    def rebuild(self) -> int:
+        with self._lock:
+            days, product_rows, until, loaded = self._fetch_since(EPOCH_WATERMARK)
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute("DELETE FROM daily_sales")
+                self._db.execute("DELETE FROM daily_product_sales")
+                self._db.execute("DELETE FROM watermark")
+                if until is not None:
+                    self._apply(days, product_rows, until)
+                self._db.execute("COMMIT")
+            except BaseException:
+                if self._db.in_transaction:
+                    self._db.execute("ROLLBACK")
+                raise
+
+            self._last_refresh = time.monotonic()
+            self._stats["refreshes"] += 1
+            self._stats["rows_loaded"] += loaded
+            return loaded
+
+    # Same shape as SnowflakeTools.get_sales_metrics, computed from the daily rollups
+    # (day granularity: the first day of the window counts in full)
+    def sales_metrics(self, days: int = 30) -> Dict[str, Any]:
+        self._stats["reads"] += 1
+        start = (datetime.now() - timedelta(days=days)).date().isoformat()
+        rows = self._read("SELECT orders, revenue, customers FROM daily_sales WHERE day >= ?", (start,))
+        total_orders = sum(row[0] for row in rows)
+        total_revenue = sum(row[1] for row in rows)
+        customers = HyperLogLog(self.precision)
+        for row in rows:
+            customers.merge(HyperLogLog(self.precision, row[2]))
+        return {
+            "period_days": days,
+            "total_orders": total_orders,
+            "total_revenue": float(total_revenue),
+            "avg_order_value": float(total_revenue / total_orders) if total_orders else 0.0,
+            "unique_customers": customers.count() if rows else 0,
+        }
+
+    # Same shape as SnowflakeTools.get_top_products; days=None covers all history like the warehouse query
+    def top_products(self, no_products: int = 10, days: Optional[int] = None) -> Dict[str, Any]:
+        self._stats["reads"] += 1
+        start = (datetime.now() - timedelta(days=days)).date().isoformat() if days else "0000-00-00"
+        rows = self._read(
+            "SELECT product_name, SUM(total_sold), SUM(total_revenue), SUM(orders_count) FROM daily_product_sales "
+            "WHERE day >= ? GROUP BY product_id, product_name ORDER BY SUM(total_revenue) DESC LIMIT ?",
+            (start, no_products),
+        )
+        return {"top_products": [
+            {"product_name": row[0], "total_sold": row[1], "total_revenue": float(row[2]), "orders_count": row[3]}
+            for row in rows
+        ]}
+
+    # Daily (day, orders, revenue) rows from start to end (YYYY-MM-DD, inclusive), the input of trend_engine
+    def daily_sales(self, start: str, end: str = "9999-12-31") -> List[tuple]:
+        self._stats["reads"] += 1
+        return self._read("SELECT day, orders, revenue FROM daily_sales WHERE day >= ? AND day <= ? ORDER BY day", (start, end))
+
+    # Return store counters, safe to serialize as JSON
+    def stats(self) -> Dict[str, Any]:
+        days = self._read("SELECT COUNT(*) FROM daily_sales")[0][0]
+        return {"path": self.path, "days": days, "watermark": self.watermark(), **self._stats}
+
+    # Private method: run a read-only query on the reader connection (committed data only)
+    def _read(self, query: str, params: tuple = ()) -> List[tuple]:
+        with self._read_lock:
+            return self._reader.execute(query, params).fetchall()
+
+    # Private method: fetch the orders after since and aggregate them per day
+    # Returns (days, product_rows, until, rows read); until is the new watermark, None when nothing is new
+    def _fetch_since(self, since: str):
+        order_rows = list(self.fetch(NEW_ORDERS_QUERY, (since,)))
+        if not order_rows:
+            return {}, [], None, 0
+        # Product rows are bounded by the same high-water mark so both tables stay consistent
+        until = max(str(row[4]) for row in order_rows)
+        product_rows = list(self.fetch(NEW_PRODUCT_SALES_QUERY, (since, until)))
+
+        days: Dict[str, list] = {}
+        for day, customer_id, orders, revenue, _ in order_rows:
+            totals = days.setdefault(_day(day), [0, 0.0, HyperLogLog(self.precision)])
+            totals[0] += orders or 0
+            totals[1] += float(revenue or 0)
+            totals[2].add(customer_id)
+        return days, product_rows, until, len(order_rows) + len(product_rows)
+
+    # Private method: add aggregated rows to the rollups and move the watermark to until,
+    # caller holds the lock and an open BEGIN IMMEDIATE transaction
+    def _apply(self, days: Dict[str, list], product_rows: List[tuple], until: str):
+        for day, (orders, revenue, sketch) in days.items():
+            existing = self._db.execute("SELECT customers FROM daily_sales WHERE day = ?", (day,)).fetchone()
+            if existing is not None:
+                sketch.merge(HyperLogLog(self.precision, existing[0]))
+            self._db.execute(
+                "INSERT INTO daily_sales (day, orders, revenue, customers) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(day) DO UPDATE SET orders = orders + excluded.orders, "
+                "revenue = revenue + excluded.revenue, customers = excluded.customers",
+                (day, orders, revenue, sketch.to_bytes()),
+            )
+        self._db.executemany(
+            "INSERT INTO daily_product_sales (day, product_id, product_name, total_sold, total_revenue, orders_count) "
+            "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(day, product_id) DO UPDATE SET "
+            "total_sold = total_sold + excluded.total_sold, total_revenue = total_revenue + excluded.total_revenue, "
+            "orders_count = orders_count + excluded.orders_count, product_name = excluded.product_name",
+            [(_day(row[0]), str(row[1]), row[2], row[3] or 0, float(row[4] or 0), row[5] or 0) for row in product_rows],
+        )
+        self._db.execute("INSERT OR REPLACE INTO watermark (name, value) VALUES ('orders', ?)", (until,))
+
+    # Private method: the watermark as seen by connection, the epoch before the first refresh
+    @staticmethod
+    def _watermark(connection: sqlite3.Connection) -> str:
+        row = connection.execute("SELECT value FROM watermark WHERE name = 'orders'").fetchone()
+        return row[0] if row else EPOCH_WATERMARK
@@ -0,0 +1,149 @@
+# Import libraries
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional, Tuple
+
+# Define SharedCache: key/value store in a local SQLite file shared by every worker process
+# - each write is a single transaction, readers in other processes see the old or the new value, never a mix
+# - WAL mode: readers do not block the writer and vice versa
+# - leases: the first worker to miss a key takes a short lease and loads it, the others wait for
+#   its value instead of sending the same query to the warehouse (no cross-process stampede)
+# - every acquire() gets its own lease token, so two loads in one process (a background refresh and
+#   a miss) exclude each other like loads in different processes do
+# Values must be JSON-serializable (tuples come back as lists)
+class SharedCache:
+    def __init__(self, path: str, lease_seconds: float = 30, poll_interval: float = 0.02):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}" # Prefix of this process's lease tokens
+
+        self._lock = threading.Lock()
+        self._stats = {"reads": 0, "hits": 0, "writes": 0, "leases": 0, "lease_waits": 0, "wait_misses": 0}
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL") # A crash may lose the last writes, never corrupt the file
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL, expires_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS leases (key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL);
+        """)
+
+    # Build a cache from METRIC_CACHE_SHARED_* environment variables, None unless a path is set
+    @classmethod
+    def from_env(cls) -> Optional["SharedCache"]:
+        path = os.getenv('METRIC_CACHE_SHARED_PATH')
+        if not path:
+            return None
+        return cls(path, lease_seconds=float(os.getenv('METRIC_CACHE_LEASE_SECONDS', '30')))
+
+    # Function for turning a metric cache key (nested tuples) into a stable text key
+    @staticmethod
+    def encode_key(key: Tuple) -> str:
+        return json.dumps(key, default=str, separators=(",", ":"))
+
+    # Return (value, age in seconds) for an entry that has not expired, or None
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        now = time.time()
+        with self._lock:
+            self._stats["reads"] += 1
+            row = self._db.execute("SELECT value, stored_at FROM entries WHERE key = ? AND expires_at > ?", (key, now)).fetchone()
+            if row is None:
+                return None
+            self._stats["hits"] += 1
+        return json.loads(row[0]), max(0.0, now - row[1])
+
+    # Store a value for `keep` seconds (the metric TTL plus its stale window) and give up the lease held with token
+    def set(self, key: str, value: Any, keep: float, token: Optional[str] = None):
+        payload = json.dumps(value, default=str)
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO entries (key, value, stored_at, expires_at) VALUES (?, ?, ?, ?)",
+                    (key, payload, now, now + keep),
+                )
+                if token is not None:
+                    self._db.execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, token))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._stats["writes"] += 1
+
+    # Try to become the one loader of key; returns the lease token (for set and release), or None if
+    # someone else, in this process or another, holds an unexpired lease
+    def acquire(self, key: str) -> Optional[str]:
+        now = time.time()
+        token = f"{self.owner}:{uuid.uuid4().hex}"
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE") # Takes the write lock, so check-and-claim is atomic across processes
+            try:
+                row = self._db.execute("SELECT owner, expires_at FROM leases WHERE key = ?", (key,)).fetchone()
+                acquired = row is None or row[1] <= now
+                if acquired:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO leases (key, owner, expires_at) VALUES (?, ?, ?)",
+                        (key, token, now + self.lease_seconds),
+                    )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            if not acquired:
+                return None
+            self._stats["leases"] += 1
+            return token
+
+    # Give up a lease without storing a value (the load failed)
+    def release(self, key: str, token: str):
+        with self._lock:
+            self._db.execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, token))
+
+    # Wait for another process to store key, returns (value, age) or None once its lease has run out
+    def wait(self, key: str) -> Optional[Tuple[Any, float]]:
+        with self._lock:
+            self._stats["lease_waits"] += 1
+        deadline = time.time() + self.lease_seconds
+        while time.time() < deadline:
+            found = self.get(key)
+            if found is not None:
+                return found
+            with self._lock:
+                lease = self._db.execute("SELECT expires_at FROM leases WHERE key = ?", (key,)).fetchone()
+            if lease is None or lease[0] <= time.time():
+                break # Released (the load failed) or expired (the loader died)
+            time.sleep(self.poll_interval)
+        with self._lock:
+            self._stats["wait_misses"] += 1
+        return None
+
+    # Drop entries whose key starts with prefix (all entries without one), returns the number removed
+    def invalidate(self, prefix: Optional[str] = None) -> int:
+        with self._lock:
+            if prefix is None:
+                return self._db.execute("DELETE FROM entries").rowcount
+            return self._db.execute("DELETE FROM entries WHERE substr(key, 1, ?) = ?", (len(prefix), prefix)).rowcount
+
+    # Drop expired entries and leases, keeps the file from growing with one-off keys
+    def prune(self) -> int:
+        now = time.time()
+        with self._lock:
+            self._db.execute("DELETE FROM leases WHERE expires_at <= ?", (now,))
+            return self._db.execute("DELETE FROM entries WHERE expires_at <= ?", (now,)).rowcount
+
+    # Return counters, safe to serialize as JSON
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            return {"path": self.path, "entries": entries, **self._stats}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,70 @@
+# Import libraries
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from telemetry import COALESCED_REQUESTS
+
+# Define _Flight: one in-flight computation and the number of callers awaiting it
+class _Flight:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+# Define SingleFlight: concurrent calls with the same key share one computation
+# - the first caller (the leader) starts fn() as a task, later callers attach to it until it finishes
+# - every caller gets the same result, or the same exception
+# - a caller that is cancelled (e.g. the client disconnected) only detaches; the computation is
+#   cancelled when its last caller goes away, so an abandoned request does not keep running
+# Keys are tuples whose first element is the endpoint, used as the counter label
+class SingleFlight:
+    def __init__(self):
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    async def do(self, key: Tuple[Hashable, ...], fn: Callable[[], Awaitable[Any]]) -> Any:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = _Flight(asyncio.ensure_future(fn()))
+            flight.task.add_done_callback(lambda task: self._finish(key, flight))
+            self._count(key, "executions")
+        else:
+            self._count(key, "coalesced")
+
+        flight.waiters += 1
+        try:
+            # shield: cancelling one caller must not cancel the task the others are waiting on
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and not flight.task.done():
+                flight.task.cancel()
+                self._forget(key, flight) # New callers start a fresh computation
+                self._count(key, "abandoned")
+            raise
+        finally:
+            flight.waiters -= 1
+
+    # Number of computations running right now
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    # Return counters per endpoint, safe to serialize as JSON
+    def stats(self) -> Dict[str, Any]:
+        return {"in_flight": self.in_flight(), "endpoints": {endpoint: dict(counts) for endpoint, counts in self._stats.items()}}
+
+    # Private method: count one outcome for the key's endpoint, here and on /metrics
+    def _count(self, key: Tuple[Hashable, ...], outcome: str):
+        endpoint = str(key[0])
+        counts = self._stats.setdefault(endpoint, {"executions": 0, "coalesced": 0, "abandoned": 0, "failed": 0})
+        counts[outcome] += 1
+        COALESCED_REQUESTS.inc(1, endpoint, outcome)
+
+    # Private method: done callback, the next call with this key starts a new computation
+    def _finish(self, key: Tuple[Hashable, ...], flight: _Flight):
+        self._forget(key, flight)
+        if not flight.task.cancelled() and flight.task.exception() is not None:
+            self._count(key, "failed")
+
+    # Private method: drop the flight unless a newer one already took its key
+    def _forget(self, key: Tuple[Hashable, ...], flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
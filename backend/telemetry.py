@@ -0,0 +1,259 @@
+# Import libraries
+import bisect
+import contextvars
+import functools
+import inspect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from prompt_encoder import estimate_tokens
+
+# Latency buckets in seconds: sub-millisecond cache hits up to minute-long LLM calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# TELEMETRY_ENABLED=false turns every span into a no-op (the /metrics endpoint stays up, empty)
+ENABLED = os.getenv('TELEMETRY_ENABLED', 'true').lower() not in ('0', 'false', 'no')
+
+# Function for rendering a label set in the Prometheus text format
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{str(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+# Define Histogram: fixed buckets per label set, observe() is one bisect and one locked increment
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, ...], list] = {} # label values -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value: float, *labelvalues: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    # Number of observations and their sum for one label set
+    def summary(self, *labelvalues: str) -> Tuple[int, float]:
+        with self._lock:
+            series = self._series.get(labelvalues)
+            return (sum(series[:-1]), series[-1]) if series else (0, 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for labelvalues, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), values[:-1]):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labelvalues, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labelvalues)} {values[-1]}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labelvalues)} {cumulative}")
+        return lines
+
+# Define Counter: monotonically increasing total per label set
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, *labelvalues: str):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def value(self, *labelvalues: str) -> float:
+        with self._lock:
+            return self._values.get(labelvalues, 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for labelvalues, value in sorted(values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, labelvalues)} {value}")
+        return lines
+
+# Define MetricsRegistry: every metric of the process, rendered together by /metrics
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: List[Any] = []
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    # Render all metrics, plus point-in-time gauges (e.g. pool and queue stats) passed in by the caller
+    def render(self, gauges: Optional[Dict[str, Dict[str, Any]]] = None) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for prefix, stats in (gauges or {}).items():
+            for key, value in (stats or {}).items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f"# TYPE {prefix}_{key} gauge")
+                    lines.append(f"{prefix}_{key} {value}")
+        return "\n".join(lines) + "\n"
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram("http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status"))
+GRAPH_NODE_SECONDS = REGISTRY.histogram("graph_node_duration_seconds", "LangGraph node latency", ("node",))
+TOOL_CALL_SECONDS = REGISTRY.histogram("tool_call_duration_seconds", "SnowflakeTools method latency, metric cache hits included", ("method",))
+WAREHOUSE_QUERY_SECONDS = REGISTRY.histogram("warehouse_query_duration_seconds", "Warehouse round trip (execute + fetch)", ("fetch",))
+POOL_WAIT_SECONDS = REGISTRY.histogram("pool_checkout_wait_seconds", "Time to get a pooled warehouse connection")
+EXECUTOR_WAIT_SECONDS = REGISTRY.histogram("executor_queue_wait_seconds", "Time a task waits for a thread", ("executor",))
+JOB_WAIT_SECONDS = REGISTRY.histogram("analysis_job_queue_wait_seconds", "Time an /analyze job waits for a worker")
+LLM_CALL_SECONDS = REGISTRY.histogram("llm_call_duration_seconds", "LLM call latency by node", ("node",))
+LLM_TOKENS = REGISTRY.counter("llm_tokens_total", "LLM tokens by node and direction (input/output)", ("node", "direction"))
+COALESCED_REQUESTS = REGISTRY.counter("single_flight_calls_total", "Single-flight calls by endpoint and outcome (executions/coalesced/abandoned/failed)", ("endpoint", "outcome"))
+
+# Define Trace: per-request timing breakdown, collected while a trace is active in the context
+# Spans are appended from the event loop and from executor threads (list.append is atomic)
+class Trace:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self.llm_tokens = {"input": 0, "output": 0}
+
+    def add(self, kind: str, name: str, started: float, seconds: float):
+        self.spans.append({"kind": kind, "name": name, "start": round(started - self.started, 6), "seconds": round(seconds, 6)})
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "total_seconds": round(time.perf_counter() - self.started, 6),
+            "spans": sorted(self.spans, key=lambda span: span["start"]),
+            "llm_tokens": dict(self.llm_tokens),
+        }
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("telemetry_trace", default=None)
+
+# Collect a Trace for everything run inside the with-block (including graph nodes and executor tasks)
+@contextmanager
+def start_trace():
+    trace = Trace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+# Function for recording one finished span into its histogram and the active trace
+# (labels default to (name,) for labelled histograms)
+def record(histogram: Histogram, kind: str, name: str, started: float, seconds: float, *labelvalues: str):
+    if not ENABLED:
+        return
+    histogram.observe(seconds, *(labelvalues or ((name,) if histogram.labelnames else ())))
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(kind, name, started, seconds)
+
+# Time the with-block into histogram and the active trace
+@contextmanager
+def span(histogram: Histogram, kind: str, name: str, *labelvalues: str):
+    if not ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(histogram, kind, name, started, time.perf_counter() - started, *labelvalues)
+
+# Decorator version of span for sync and async functions, name defaults to the function name
+def timed(histogram: Histogram, kind: str, name: Optional[str] = None):
+    def decorator(fn: Callable):
+        label = name or fn.__name__
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(histogram, kind, label):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(histogram, kind, label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# Function for wrapping a call that is about to be submitted to an executor: records how long it
+# waited for a thread, and runs it in a copy of the caller's context so spans reach the trace
+def queued(executor: str, fn: Callable, *args, **kwargs) -> Callable[[], Any]:
+    enqueued = time.perf_counter()
+    context = contextvars.copy_context()
+
+    def run():
+        context.run(record, EXECUTOR_WAIT_SECONDS, "queue", executor, enqueued, time.perf_counter() - enqueued)
+        return context.run(fn, *args, **kwargs)
+    return run
+
+# Function for counting the tokens of one LLM call
+# Uses the provider's usage numbers when the response carries them, otherwise the chars/4 estimate
+def record_llm_usage(node: str, prompt: str, response: Any):
+    if not ENABLED:
+        return
+    usage = getattr(response, "usage_metadata", None) or (getattr(response, "response_metadata", None) or {}).get("usage") or {}
+    input_tokens = usage.get("input_tokens") or estimate_tokens(prompt)
+    output_tokens = usage.get("output_tokens") or estimate_tokens(str(getattr(response, "content", "")))
+    LLM_TOKENS.inc(input_tokens, node, "input")
+    LLM_TOKENS.inc(output_tokens, node, "output")
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.llm_tokens["input"] += input_tokens
+        trace.llm_tokens["output"] += output_tokens
+
+# Define RequestTimingMiddleware: plain ASGI middleware timing every HTTP request by route template
+# (not BaseHTTPMiddleware, which adds a task and a stream copy per request)
+class RequestTimingMiddleware:
+    def __init__(self, app):
+        self.app = app
+        self._paths: Optional[Dict[Any, str]] = None # endpoint function -> route path template
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ENABLED:
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, scope["method"], self._route(scope), str(status[0]))
+
+    # Private method: route template for the matched endpoint, so /analyze/{analysis_id} is one series
+    def _route(self, scope) -> str:
+        if self._paths is None and "app" in scope:
+            self._paths = {getattr(route, "endpoint", None): route.path for route in scope["app"].routes}
+        return (self._paths or {}).get(scope.get("endpoint"), "unmatched")
+
+# Function for the /metrics payload
+def render_metrics(gauges: Optional[Dict[str, Dict[str, Any]]] = None) -> str:
+    return REGISTRY.render(gauges)
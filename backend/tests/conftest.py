@@ -0,0 +1,5 @@
+# Make the flat backend modules (tool_snowflake, langgraph_agents, main) importable from tests
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,157 @@
+# Offline stand-ins for snowflake.connector connections and the chat model, shared by the unit tests
+import asyncio
+import json
+import threading
+import time
+from datetime import timedelta
+from typing import List
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from analysis_cache import AnalysisCache
+from langgraph_agents import EcommerceAgents
+from metric_cache import MetricCache
+from tool_snowflake import SnowflakeConnectionPool, SnowflakeTools
+
+
+# Define FakeCursor: answers queries through the owning connection's responder
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self._rows = []
+
+    def execute(self, query, params=None):
+        if self.conn.broken:
+            raise self.conn.error("connection dropped")
+        self.conn.queries.append((query, params))
+        if self.conn.latency:
+            time.sleep(self.conn.latency)
+        self._rows = [(1,)] if query.strip() == "SELECT 1" else list(self.conn.responder(query, params))
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def fetchmany(self, size):
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+    def close(self):
+        pass
+
+
+# Define FakeConnection: records every query and can be "dropped" to test reconnects
+class FakeConnection:
+    def __init__(self, responder=None, latency=0.0, error=Exception):
+        self.responder = responder or (lambda query, params: [])
+        self.latency = latency
+        self.error = error
+        self.broken = False
+        self.closed = False
+        self.queries = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def is_closed(self):
+        return self.closed
+
+    def close(self):
+        self.closed = True
+
+
+# Define FakeConnector: factory passed to SnowflakeConnectionPool(connect=...)
+class FakeConnector:
+    def __init__(self, responder=None, latency=0.0):
+        self.responder = responder
+        self.latency = latency
+        self.connections = []
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        conn = FakeConnection(self.responder, self.latency)
+        with self._lock:
+            self.connections.append(conn)
+        return conn
+
+
+# Canned warehouse answers for the three SnowflakeTools queries
+def warehouse_responder(query, params):
+    if "GROUP BY TO_DATE(order_date)\nORDER BY day" in query:
+        # Daily series: 4-6 orders of $125 a day over the requested range
+        start, end = params
+        days = (end.date() - start.date()).days # end is exclusive (midnight)
+        return [((start + timedelta(days=i)).strftime("%Y-%m-%d"), 4 + i % 3, 125.0 * (4 + i % 3)) for i in range(days)]
+    if "FROM orders" in query:
+        return [(120, 15000.5, 125.0, 80)]
+    if "FROM order_items" in query:
+        rows = [("Widget", 40, 4000.0, 30), ("Gadget", 25, 2500.0, 20), ("Doohickey", 10, 900.0, 8)]
+        return rows[:params[0]] if params else rows
+    if "FROM customers" in query:
+        return [("High Value", 10, 95000.0), ("Mid Value", 20, 60000.0), ("Low Value", 30, 30000.0)]
+    return []
+
+
+# Define FakeChatModel: offline chat model with configurable latency, records every prompt
+class FakeChatModel(BaseChatModel):
+    model: str = "fake-model"
+    latency: float = 0.0 # Seconds before the first token
+    token_delay: float = 0.0 # Seconds per generated token (between streamed tokens, summed for ainvoke)
+    output_tokens: int = 0 # Pad replies to this many words, 0 = short canned reply
+    json_reply: bool = False # Answer like a fused-mode model: {"analysis": [...], "recommendations": [...]}
+    prompts: List[str] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    @property
+    def _identifying_params(self):
+        return {"model": self.model}
+
+    def _reply(self, messages: List[BaseMessage]) -> str:
+        prompt = "\n".join(str(message.content) for message in messages)
+        self.prompts.append(prompt)
+        reply = f"- reply {len(self.prompts)} to a {len(prompt)} character prompt"
+        padding = self.output_tokens - len(reply.split(" "))
+        reply = reply + " lorem" * padding if padding > 0 else reply
+        if self.json_reply:
+            return json.dumps({"analysis": [f"analysis {reply}"], "recommendations": [f"recommendation {reply}"]})
+        return reply
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._reply(messages)))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        reply = self._reply(messages)
+        await asyncio.sleep(self.latency + self.token_delay * len(reply.split(" ")))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=reply))])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        for token in self._reply(messages).split(" "):
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token + " "))
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+# EcommerceAgents wired to the fake warehouse and chat model
+def make_agents(llm_latency=0.0, query_latency=0.0, analysis_cache=None, checkpointer=None, analysis_mode="two_stage"):
+    pool = SnowflakeConnectionPool(connect=FakeConnector(warehouse_responder, latency=query_latency), max_size=4)
+    tools = SnowflakeTools(pool=pool, cache=MetricCache())
+    return EcommerceAgents(
+        tools=tools,
+        llm=FakeChatModel(prompts=[], latency=llm_latency, json_reply=analysis_mode == "fused"),
+        analysis_cache=analysis_cache or AnalysisCache(),
+        checkpointer=checkpointer,
+        analysis_mode=analysis_mode,
+    )
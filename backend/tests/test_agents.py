@@ -0,0 +1,84 @@
+import asyncio
+import time
+
+from fakes import make_agents
+from langgraph_agents import parse_fused_reply
+
+
+def test_analyze_runs_the_full_pipeline():
+    agents = make_agents()
+    result = agents.analyze("How are sales and top products doing?")
+    assert set(result["data"]) == {"sales_metrics", "top_products"}
+    assert result["analysis"].startswith("- reply 1")
+    assert result["recommendations"].startswith("- reply 2")
+    assert len(agents.llm.prompts) == 2
+
+
+def test_consecutive_analyses_do_not_inherit_datasets():
+    agents = make_agents()
+    agents.analyze("analyze top products")
+    result = agents.analyze("Analyze customer segments")
+    assert set(result["data"]) == {"customer_segments"}
+
+
+def test_aanalyze_runs_many_analyses_concurrently():
+    agents = make_agents(llm_latency=0.2)
+
+    async def run_all():
+        return await asyncio.gather(*(agents.aanalyze("How are sales?", thread_id=f"t{i}") for i in range(100)))
+
+    start = time.perf_counter()
+    results = asyncio.run(run_all())
+    elapsed = time.perf_counter() - start
+    assert len(results) == 100
+    assert all(result["recommendations"] for result in results)
+    # Two sequential 0.2s LLM calls each; 100 analyses on 4 threads would need ~10s
+    assert elapsed < 3
+
+
+def test_astream_analysis_emits_progress_before_result():
+    agents = make_agents()
+
+    async def collect():
+        return [event async for event in agents.astream_analysis("Analyze sales and customer segments", thread_id="stream")]
+
+    events = asyncio.run(collect())
+    kinds = [event["event"] for event in events]
+    assert kinds[0] == "node_start"
+    assert kinds[-1] == "result"
+    assert {event["dataset"] for event in events if event["event"] == "data"} == {"sales_metrics", "customer_segments"}
+    tokens = [event for event in events if event["event"] == "token"]
+    assert {event["node"] for event in tokens} == {"analyst_agent", "consultant_agent"}
+    final = events[-1]
+    assert "".join(event["content"] for event in tokens if event["node"] == "analyst_agent") == final["analysis"]
+    assert kinds.index("token") < kinds.index("result")
+
+
+def test_multi_dataset_queries_fetch_in_parallel():
+    make_agents().analyze("sales trend") # Warm-up on its own cache: the first trend query pays the pandas import
+    agents = make_agents(query_latency=0.2)
+    start = time.perf_counter()
+    result = agents.analyze("Compare sales, top products and customer segments")
+    elapsed = time.perf_counter() - start
+    assert set(result["data"]) == {"sales_metrics", "top_products", "customer_segments", "sales_trends"}
+    assert result["total_steps"] == 3 # extractor, analyst, consultant
+    assert elapsed < 0.5 # four 0.2s queries in sequence would take 0.8s
+
+
+def test_fused_mode_makes_one_structured_llm_call():
+    agents = make_agents(analysis_mode="fused")
+    result = agents.analyze("How are sales and top products doing?")
+    assert len(agents.llm.prompts) == 1
+    assert '"recommendations"' in agents.llm.prompts[0]
+    assert result["analysis"].startswith("- analysis - reply 1")
+    assert result["recommendations"].startswith("- recommendation - reply 1")
+    assert result["total_steps"] == 2 # extractor, fused analyst
+    # Repeats are served by the analysis cache like the two-stage mode
+    agents.analyze("How are sales and top products doing?")
+    assert len(agents.llm.prompts) == 1
+
+
+def test_parse_fused_reply_tolerates_fences_and_plain_text():
+    fenced = 'Here you go:\n```json\n{"analysis": ["Revenue up"], "recommendations": "- Restock"}\n```'
+    assert parse_fused_reply(fenced) == {"analysis": "- Revenue up", "recommendations": "- Restock"}
+    assert parse_fused_reply("no json here") == {"analysis": "no json here", "recommendations": ""}
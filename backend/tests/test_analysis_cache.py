@@ -0,0 +1,45 @@
+import time
+
+from analysis_cache import AnalysisCache, analysis_cache_key, normalize_query
+from fakes import make_agents
+
+
+def test_normalize_query_ignores_case_punctuation_and_stopwords():
+    assert normalize_query("What are our TOP  products?") == normalize_query("top products")
+    assert normalize_query("sales by region") != normalize_query("sales by product")
+
+
+def test_key_changes_with_data():
+    data = {"sales_metrics": {"total_revenue": 100.0}}
+    changed = {"sales_metrics": {"total_revenue": 101.0}}
+    assert analysis_cache_key("How are sales?", data) == analysis_cache_key("how are SALES", data)
+    assert analysis_cache_key("How are sales?", data) != analysis_cache_key("How are sales?", changed)
+
+
+def test_repeated_question_skips_llm_calls():
+    agents = make_agents()
+    first = agents.analyze("How are our top products doing?")
+    second = agents.analyze("how are top products doing")
+    assert len(agents.llm.prompts) == 2
+    assert second["analysis"] == first["analysis"]
+    assert second["recommendations"] == first["recommendations"]
+    assert agents.analysis_cache.stats()["hits"] == 1
+
+
+def test_ttl_and_size_bound():
+    cache = AnalysisCache(ttl=0.05, max_entries=2)
+    for key in ("a", "b", "c"):
+        cache.set(key, {"analysis": key, "recommendations": key})
+    assert cache.get("a") is None
+    assert cache.get("c")["analysis"] == "c"
+    time.sleep(0.06)
+    assert cache.get("c") is None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_disk_store_survives_a_new_cache(tmp_path):
+    path = str(tmp_path / "analysis.sqlite")
+    AnalysisCache(path=path).set("k", {"analysis": "A", "recommendations": "R"})
+    reopened = AnalysisCache(path=path)
+    assert reopened.get("k") == {"analysis": "A", "recommendations": "R"}
+    assert reopened.stats()["disk_hits"] == 1
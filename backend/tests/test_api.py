@@ -0,0 +1,132 @@
+import asyncio
+import os
+import subprocess
+import sys
+
+import httpx
+
+import main
+from fakes import FakeChatModel, FakeConnector, warehouse_responder
+from insights_refresher import InsightsRefresher
+from langgraph_agents import EcommerceAgents
+from analysis_cache import AnalysisCache
+from metric_cache import MetricCache
+from tool_snowflake import SnowflakeConnectionPool, SnowflakeTools
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def install_fakes():
+    pool = SnowflakeConnectionPool(connect=FakeConnector(warehouse_responder), max_size=4)
+    main._tools = SnowflakeTools(pool=pool, cache=MetricCache())
+    main._agents = EcommerceAgents(tools=main._tools, llm=FakeChatModel(prompts=[]), analysis_cache=AnalysisCache())
+    main.readiness.update(ready=False, warming_up=False, clients_ready=False, snowflake_ready=False, error=None)
+
+
+async def with_client(scenario):
+    async with main.lifespan(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await scenario(client)
+
+
+def test_importing_main_defers_heavy_clients():
+    code = "import sys, main; print('langgraph_agents' in sys.modules, 'snowflake.connector' in sys.modules, 'pandas' in sys.modules)"
+    output = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, capture_output=True, text=True, check=True).stdout
+    assert output.split() == ["False", "False", "False"]
+
+
+def test_health_ready_and_analysis_flow():
+    install_fakes()
+
+    async def scenario(client):
+        assert (await client.get("/health")).status_code == 200
+        for _ in range(100):
+            ready = await client.get("/ready")
+            if ready.status_code == 200:
+                break
+            await asyncio.sleep(0.01)
+        submitted = await client.post("/analyze", json={"query": "What are our top products?"})
+        polled = await client.post("/analyze?wait=true", json={"query": "What are our top products?"})
+        insights = await client.get("/quick-insights")
+        return ready, submitted, polled, insights
+
+    ready, submitted, polled, insights = asyncio.run(with_client(scenario))
+    assert ready.status_code == 200 and ready.json()["snowflake_ready"]
+    assert submitted.status_code == 202
+    assert polled.status_code == 200
+    assert polled.json()["analysis_id"] == submitted.json()["analysis_id"]
+    assert polled.json()["results"]["data"]["top_products"]["top_products"][0]["product_name"] == "Widget"
+    assert [insight["metric"] for insight in insights.json()["insights"]] == ["Total Revenue (30 days)", "Revenue (7 days)", "Top Product", "Active Customers"]
+    assert "vs previous 30 days" in insights.json()["insights"][0]["trend"]
+
+
+def test_timings_breakdown_and_metrics_endpoint():
+    install_fakes()
+
+    async def scenario(client):
+        analyzed = await client.post("/analyze?wait=true&timings=true", json={"query": "How are sales and products doing?"})
+        polled = await client.get(f"/analyze/{analyzed.json()['analysis_id']}")
+        metrics = await client.get("/metrics")
+        return analyzed, polled, metrics
+
+    analyzed, polled, metrics = asyncio.run(with_client(scenario))
+    timings = analyzed.json()["timings"]
+    spans = {(span["kind"], span["name"]) for span in timings["spans"]}
+    assert {("node", "data_extractor_agent"), ("node", "analyst_agent"), ("tool", "get_top_products"), ("query", "rows"), ("llm", "consultant_agent"), ("queue", "snowflake-async")} <= spans
+    assert timings["llm_tokens"]["input"] > 0 and timings["queue_wait_seconds"] >= 0
+    assert "timings" not in polled.json()
+
+    text = metrics.text
+    assert 'graph_node_duration_seconds_count{node="analyst_agent"}' in text
+    assert 'http_request_duration_seconds_count{method="GET",route="/analyze/{analysis_id}",status="200"} ' in text
+    assert 'llm_tokens_total{node="analyst_agent",direction="output"}' in text
+    assert "warehouse_pool_in_use 0" in text
+
+
+def test_concurrent_quick_insights_and_analyses_are_coalesced(monkeypatch):
+    install_fakes()
+    monkeypatch.setattr(main, "refresher", None) # Compute per request instead of serving the snapshot
+    main._tools.cache = None # Every computation reaches the warehouse
+    connector = FakeConnector(warehouse_responder, latency=0.05)
+    main._tools.pool = SnowflakeConnectionPool(connect=connector, max_size=4)
+    before = main.flights.stats()["endpoints"]
+
+    async def scenario(client):
+        insights = await asyncio.gather(*(client.get("/quick-insights") for _ in range(20)))
+        queries = [query for conn in connector.connections for query, _ in conn.queries if query.strip() != "SELECT 1"]
+        analyses = await asyncio.gather(*(client.post("/analyze?wait=true", json={"query": q}) for q in ["How are sales doing?", "how are SALES doing"] * 5))
+        stats = await client.get("/coalescing-stats")
+        return insights, queries, analyses, stats
+
+    insights, queries, analyses, stats = asyncio.run(with_client(scenario))
+    assert all(response.json() == insights[0].json() for response in insights)
+    assert len(queries) == 4 # one batch of four queries
+    assert len({response.json()["analysis_id"] for response in analyses}) == 1
+    assert len(main._agents.llm.prompts) == 2
+    counts = stats.json()["single_flight"]["endpoints"]
+    delta = lambda endpoint, outcome: counts[endpoint][outcome] - before.get(endpoint, {}).get(outcome, 0)
+    assert (delta("quick-insights", "executions"), delta("quick-insights", "coalesced")) == (1, 19)
+    assert (delta("analyze", "executions"), delta("analyze", "coalesced")) == (1, 9)
+
+
+def test_quick_insights_are_served_from_the_background_snapshot(monkeypatch, tmp_path):
+    install_fakes()
+    refresher = InsightsRefresher(main.compute_quick_insights, interval=60, path=str(tmp_path / "insights.json"))
+    monkeypatch.setattr(main, "refresher", refresher)
+
+    async def scenario(client):
+        first = await client.get("/quick-insights") # Waits for the startup refresh at most once
+        queries = sum(len(conn.queries) for conn in main._tools.pool._connect.connections)
+        second = await client.get("/quick-insights")
+        assert sum(len(conn.queries) for conn in main._tools.pool._connect.connections) == queries # no warehouse round trip
+        refreshed = await client.post("/quick-insights/refresh")
+        stats = await client.get("/quick-insights/stats")
+        return first, second, refreshed, stats
+
+    first, second, refreshed, stats = asyncio.run(with_client(scenario))
+    assert first.json() == second.json() and first.json()["as_of"]
+    assert first.json()["insights"][0]["metric"] == "Total Revenue (30 days)"
+    assert refreshed.status_code == 200 and refreshed.json()["insights"] == first.json()["insights"]
+    assert stats.json()["refresher"]["on_demand"] == 1 and stats.json()["refresher"]["persisted"]
+    assert (tmp_path / "insights.json").exists()
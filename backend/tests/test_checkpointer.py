@@ -0,0 +1,110 @@
+import asyncio
+import threading
+import time
+
+from langgraph.checkpoint.base import empty_checkpoint
+
+from checkpointer import BoundedMemorySaver, SQLiteCheckpointSaver
+from fakes import make_agents
+
+CHANNELS = ("query", "data", "datasets", "analysis", "recommendations", "next_action", "step_count", "finished")
+
+
+# Serializer that skips msgpack but still allocates a fresh payload per value, so the test
+# measures what the saver retains rather than serialization speed
+class FixedSizeSerde:
+    def dumps_typed(self, obj):
+        return ("bytes", b"x" * 512)
+
+    def loads_typed(self, data):
+        return None
+
+
+# One analysis worth of checkpointer traffic: a checkpoint carrying every channel and a few task writes
+def write_analysis(saver, thread_id):
+    checkpoint = empty_checkpoint()
+    versions = {channel: f"{1:032}.{0.5:016}" for channel in CHANNELS}
+    checkpoint["channel_versions"] = versions
+    checkpoint["channel_values"] = {channel: channel for channel in CHANNELS}
+    config = saver.put({"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}, checkpoint, {"step": 1}, versions)
+    saver.put_writes(config, [("analysis", "a"), ("recommendations", "r")], task_id="consultant_agent")
+
+
+def test_saver_stays_bounded_over_100k_analyses():
+    saver = BoundedMemorySaver(max_threads=1000, ttl=None, serde=FixedSizeSerde())
+    for index in range(100_000):
+        write_analysis(saver, f"analysis-{index}")
+
+    # An unbounded saver would hold 100k threads (~1 GiB of payload at this size)
+    assert len(saver.storage) == 1000
+    assert len(saver.writes) == 1000
+    assert len(saver.blobs) == 1000 * len(CHANNELS)
+    assert saver.stats()["evicted_threads"] == 99_000
+
+
+def test_threads_expire_after_ttl():
+    saver = BoundedMemorySaver(max_threads=100, ttl=0.05)
+    write_analysis(saver, "old")
+    time.sleep(0.06)
+    write_analysis(saver, "new")
+    assert set(saver.storage) == {"new"}
+    assert saver.get_tuple({"configurable": {"thread_id": "old"}}) is None
+    assert "old" not in saver.storage # the lookup does not recreate the thread
+    assert saver.stats()["expired_threads"] == 1
+
+
+def test_each_analysis_gets_its_own_bounded_thread():
+    saver = BoundedMemorySaver(max_threads=5)
+    agents = make_agents(checkpointer=saver)
+    products = agents.analyze("top products")
+    sales = agents.analyze("sales trend")
+    # With a shared thread the second run would inherit the first run's datasets
+    assert set(products["data"]) == {"top_products"}
+    assert set(sales["data"]) == {"sales_metrics", "sales_trends"}
+
+    async def many():
+        return await asyncio.gather(*(agents.aanalyze(f"customer question {index}") for index in range(20)))
+
+    assert len(asyncio.run(many())) == 20
+    assert saver.stats()["threads"] == 5
+
+
+def test_sqlite_saver_batches_writes_and_resumes_after_restart(tmp_path):
+    path = str(tmp_path / "checkpoints.sqlite")
+    saver = SQLiteCheckpointSaver(path, max_threads=1, batch_size=1000, flush_interval=60)
+    agents = make_agents(checkpointer=saver)
+    agents.analyze("top products", thread_id="first")
+    assert saver.stats()["flushes"] == 0 # still queued: one batch for the whole run
+    agents.analyze("sales trend", thread_id="second")
+
+    # "first" was evicted from memory and is read back from the file
+    config = {"configurable": {"thread_id": "first"}}
+    assert set(agents.graph.get_state(config).values["data"]) == {"top_products"}
+    assert saver.stats()["threads_loaded"] == 1
+    saver.close()
+
+    restarted = SQLiteCheckpointSaver(path, max_threads=10)
+    state = make_agents(checkpointer=restarted).graph.get_state({"configurable": {"thread_id": "second"}})
+    assert state.values["finished"] and set(state.values["data"]) == {"sales_metrics", "sales_trends"}
+    assert restarted.stats()["threads_on_disk"] == 2
+    restarted.delete_thread("second")
+    assert restarted.stats()["threads_on_disk"] == 1
+    restarted.close()
+
+
+def test_sqlite_saver_keeps_disk_access_off_the_event_loop(tmp_path):
+    saver = SQLiteCheckpointSaver(str(tmp_path / "checkpoints.sqlite"), batch_size=1, flush_interval=60)
+    loader_threads = []
+    load = saver._load
+    saver._load = lambda thread_id: loader_threads.append(threading.current_thread()) or load(thread_id)
+
+    async def run():
+        assert await saver.aget_tuple({"configurable": {"thread_id": "new"}}) is None
+        return threading.current_thread()
+
+    loop_thread = asyncio.run(run())
+    agents = make_agents(checkpointer=saver)
+    asyncio.run(agents.aanalyze("analyze top products", thread_id="t1"))
+    assert loader_threads and loop_thread not in loader_threads
+    assert saver.stats()["flushes"] > 0
+    saver.close()
@@ -0,0 +1,106 @@
+import threading
+import time
+
+import pytest
+from snowflake.connector.errors import OperationalError
+
+from fakes import FakeConnector, warehouse_responder
+from metric_cache import MetricCache
+from tool_snowflake import SnowflakeConnectionPool, SnowflakeTools
+
+
+def make_pool(**kwargs):
+    connector = FakeConnector(warehouse_responder)
+    options = dict(max_size=2, idle_timeout=300, health_check_interval=60, checkout_timeout=1)
+    options.update(kwargs)
+    return connector, SnowflakeConnectionPool(connect=connector, **options)
+
+
+def test_connections_are_reused():
+    connector, pool = make_pool()
+    tools = SnowflakeTools(pool=pool, cache=MetricCache())
+    tools.get_sales_metrics(30)
+    tools.get_top_products(2)
+    tools.get_customer_segments()
+    assert len(connector.connections) == 1
+    stats = pool.stats()
+    assert stats["checkouts"] == 3
+    assert stats["in_use"] == 0
+    assert stats["idle"] == 1
+
+
+def test_pool_is_bounded_and_counts_waits():
+    connector, pool = make_pool(max_size=2)
+    release = threading.Event()
+    in_use = []
+
+    def worker():
+        with pool.connection():
+            in_use.append(pool.stats()["in_use"])
+            release.wait(1)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(connector.connections) == 2
+    assert max(in_use) <= 2
+    assert pool.stats()["waits"] >= 2
+
+
+def test_checkout_times_out_when_exhausted():
+    _, pool = make_pool(max_size=1, checkout_timeout=0.05)
+    with pool.connection():
+        with pytest.raises(TimeoutError):
+            with pool.connection():
+                pass
+
+
+def test_dead_connection_is_replaced_on_health_check():
+    connector, pool = make_pool(health_check_interval=0)
+    with pool.connection() as conn:
+        pass
+    conn.broken = True
+    with pool.connection() as fresh:
+        assert fresh is not conn
+    assert conn.closed
+    assert pool.stats()["reconnects"] == 1
+
+
+def test_operational_error_discards_connection():
+    connector, pool = make_pool()
+    with pytest.raises(OperationalError):
+        with pool.connection():
+            raise OperationalError("session expired")
+    assert pool.stats()["size"] == 0
+    assert pool.stats()["discarded"] == 1
+    with pool.connection():
+        pass
+    assert len(connector.connections) == 2
+
+
+def test_idle_connections_are_evicted():
+    connector, pool = make_pool(idle_timeout=0)
+    with pool.connection():
+        pass
+    with pool.connection():
+        pass
+    assert connector.connections[0].closed
+    assert pool.stats()["evictions"] == 1
+
+
+def test_quick_insights_batch_runs_queries_concurrently():
+    connector = FakeConnector(warehouse_responder, latency=0.2)
+    pool = SnowflakeConnectionPool(connect=connector, max_size=4)
+    tools = SnowflakeTools(pool=pool, cache=MetricCache())
+    start = time.perf_counter()
+    batch = tools.get_quick_insights_data(days=30, no_products=2)
+    elapsed = time.perf_counter() - start
+    assert set(batch) == {"sales_metrics", "top_products", "customer_segments", "sales_trends"}
+    assert len(batch["top_products"]["top_products"]) == 2
+    assert elapsed < 0.5
+    assert len(connector.connections) == 4
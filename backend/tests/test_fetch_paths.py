@@ -0,0 +1,68 @@
+from decimal import Decimal
+
+import pandas as pd
+
+from fakes import FakeConnection, FakeConnector, FakeCursor
+from metric_cache import MetricCache
+from tool_snowflake import SnowflakeConnectionPool, SnowflakeTools
+
+PRODUCT_ROWS = [("Widget", 40, Decimal("4000.50"), 30), ("Gadget", 25, Decimal("2500.25"), 20)]
+SEGMENT_ROWS = [("High Value", 10, Decimal("95000.0")), ("Low Value", 30, Decimal("30000.0"))]
+
+
+def responder(query, params):
+    if "FROM order_items" in query:
+        return PRODUCT_ROWS[:params[0]]
+    if "FROM customers" in query:
+        return SEGMENT_ROWS
+    return []
+
+
+# Cursor with the connector's Arrow API: hands back upper-case column names like Snowflake does
+class ArrowCursor(FakeCursor):
+    COLUMNS = {
+        "FROM order_items": ["PRODUCT_NAME", "TOTAL_SOLD", "TOTAL_REVENUE", "ORDERS_COUNT"],
+        "FROM customers": ["SEGMENT", "CUSTOMER_COUNT", "AVG_INCOME"],
+    }
+
+    def execute(self, query, params=None):
+        super().execute(query, params)
+        self._columns = next(columns for marker, columns in self.COLUMNS.items() if marker in query)
+
+    def fetch_pandas_all(self):
+        return pd.DataFrame.from_records(self.fetchall(), columns=self._columns)
+
+    def fetch_pandas_batches(self):
+        while True:
+            rows = self.fetchmany(1)
+            if not rows:
+                return
+            yield pd.DataFrame.from_records(rows, columns=self._columns)
+
+
+class ArrowConnection(FakeConnection):
+    def cursor(self):
+        return ArrowCursor(self)
+
+
+def make_tools(fetch_mode, connect):
+    return SnowflakeTools(pool=SnowflakeConnectionPool(connect=connect), cache=MetricCache(), fetch_mode=fetch_mode)
+
+
+def test_arrow_and_row_paths_return_identical_shapes():
+    rows = make_tools("rows", FakeConnector(responder))
+    arrow = make_tools("arrow", lambda: ArrowConnection(responder))
+    fallback = make_tools("arrow", FakeConnector(responder)) # cursor without fetch_pandas_all
+    for tools in (arrow, fallback):
+        assert tools.get_top_products(2) == rows.get_top_products(2)
+        assert tools.get_customer_segments() == rows.get_customer_segments()
+    product = arrow.get_top_products(1)["top_products"][0]
+    assert type(product["total_revenue"]) is float and type(product["total_sold"]) is int
+
+
+def test_iter_frames_streams_batches():
+    tools = make_tools("arrow", lambda: ArrowConnection(responder))
+    frames = list(tools.iter_frames("SELECT * FROM order_items", (10,)))
+    assert len(frames) == 2
+    assert list(frames[0].columns) == ["product_name", "total_sold", "total_revenue", "orders_count"]
+    assert tools.pool.stats()["in_use"] == 0
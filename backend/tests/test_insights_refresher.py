@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+from insights_refresher import InsightsRefresher
+
+
+def test_refresh_swaps_snapshot_and_concurrent_calls_share_one_run(tmp_path):
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return [{"metric": "Revenue", "value": str(len(calls))}]
+
+    async def scenario():
+        refresher = InsightsRefresher(compute, interval=60, path=str(tmp_path / "snapshot.json"))
+        snapshots = await asyncio.gather(*(refresher.refresh() for _ in range(10)))
+        return refresher, snapshots
+
+    refresher, snapshots = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert all(snapshot is refresher.snapshot for snapshot in snapshots)
+    assert refresher.snapshot["insights"] == [{"metric": "Revenue", "value": "1"}] and refresher.snapshot["as_of"]
+
+    # A new process serves the persisted snapshot and postpones its first refresh
+    async def restart():
+        restarted = InsightsRefresher(compute, interval=60, path=str(tmp_path / "snapshot.json"))
+        await restarted.start()
+        await asyncio.sleep(0.05)
+        await restarted.stop()
+        return restarted
+
+    restarted = asyncio.run(restart())
+    assert restarted.snapshot["insights"] == refresher.snapshot["insights"]
+    assert len(calls) == 1
+
+
+def test_failures_keep_the_old_snapshot_and_back_off():
+    outcomes = ["ok", "fail", "fail", "fail", "ok"]
+    times = []
+
+    async def compute():
+        times.append(asyncio.get_running_loop().time())
+        if len(times) > len(outcomes):
+            await asyncio.Event().wait() # Later runs never finish, the snapshot stays at run 5 until stop()
+        if outcomes[len(times) - 1] == "fail":
+            raise RuntimeError("warehouse timeout")
+        return [{"run": len(times)}]
+
+    async def scenario():
+        refresher = InsightsRefresher(compute, interval=0.01, jitter=0.0, retry_delay=0.02, max_backoff=0.05)
+        await refresher.start()
+        while len(times) < 3:
+            await asyncio.sleep(0.005)
+        during_failures = refresher.snapshot
+        while refresher.stats()["refreshes"] < 2:
+            await asyncio.sleep(0.005)
+        await refresher.stop()
+        return refresher, during_failures
+
+    refresher, during_failures = asyncio.run(scenario())
+    assert during_failures["insights"] == [{"run": 1}]
+    assert refresher.snapshot["insights"] == [{"run": 5}]
+    gaps = [later - earlier for earlier, later in zip(times, times[1:])]
+    assert gaps[2] >= 0.035 and gaps[3] >= 0.045 # 0.02, 0.04, then capped at 0.05
+    stats = refresher.stats()
+    assert stats["failures"] == 3 and stats["consecutive_failures"] == 0 and stats["last_error"] is None
+
+
+def test_on_demand_failure_raises_and_from_env(monkeypatch):
+    async def compute():
+        raise RuntimeError("down")
+
+    refresher = InsightsRefresher(compute)
+    with pytest.raises(RuntimeError):
+        asyncio.run(refresher.refresh())
+    assert refresher.snapshot is None and refresher.stats()["on_demand"] == 1
+
+    monkeypatch.setenv("INSIGHTS_REFRESH_INTERVAL", "0")
+    assert InsightsRefresher.from_env(compute) is None
+    monkeypatch.setenv("INSIGHTS_REFRESH_INTERVAL", "120")
+    assert InsightsRefresher.from_env(compute).interval == 120
+
+
+@pytest.mark.parametrize("content", ['{"insights": [], "as_of": "2024-01-01T00:00:00+00:00"}', '{"insights": [', "[]", '{"insights": [], "as_of": "x", "created_at": "x", "refresh_seconds": 1}'])
+def test_invalid_snapshot_files_are_ignored_and_refreshed(tmp_path, content):
+    path = tmp_path / "snapshot.json"
+    path.write_text(content)
+
+    async def compute():
+        return [{"metric": "Revenue", "value": "1"}]
+
+    async def scenario():
+        refresher = InsightsRefresher(compute, interval=60, path=str(path))
+        await refresher.start()
+        while refresher.stats()["refreshes"] == 0:
+            await asyncio.sleep(0.005)
+        await refresher.stop()
+        return refresher
+
+    refresher = asyncio.run(asyncio.wait_for(scenario(), 5))
+    assert refresher.snapshot["insights"] == [{"metric": "Revenue", "value": "1"}]
+    assert InsightsRefresher(compute, path=str(path))._load()["insights"] == refresher.snapshot["insights"]
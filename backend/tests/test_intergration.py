@@ -1,3 +1,5 @@
+import time
+
 import requests
 
 BASE_URL = "http://localhost:8000"
@@ -14,11 +16,17 @@ def test_quick_insights():
 def test_analyze_endpoint():
     query = "What are our top selling products?"
     response = requests.post(f"{BASE_URL}/analyze", json={"query": query})
-    assert response.status_code == 200
+    assert response.status_code in (200, 202)
     data = response.json()
     assert "analysis_id" in data
-    assert "results" in data
     assert data["query"] == query
+    for _ in range(120):
+        data = requests.get(f"{BASE_URL}/analyze/{data['analysis_id']}").json()
+        if data["status"] in ("completed", "failed"):
+            break
+        time.sleep(1)
+    assert data["status"] == "completed"
+    assert "results" in data
 if __name__ == "__main__":
     # Make sure your API is running before running these tests
     test_health_endpoint()
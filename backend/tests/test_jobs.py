@@ -0,0 +1,194 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+from jobs import AnalysisJobQueue, QueueFullError
+
+
+def make_runner(delay=0.05, calls=None):
+    async def runner(query, job_id):
+        if calls is not None:
+            calls.append(query)
+        await asyncio.sleep(delay)
+        if "fail" in query:
+            raise RuntimeError("boom")
+        return {"query": query, "total_steps": 3, "data": {}, "analysis": "A", "recommendations": "R"}
+
+    return runner
+
+
+def test_jobs_complete_and_can_be_polled():
+    async def scenario():
+        queue = AnalysisJobQueue(make_runner(), concurrency=2, max_queue=10, store_path="")
+        await queue.start()
+        job, created = await queue.submit("How are sales?")
+        assert created and job["status"] == "queued"
+        failed, _ = await queue.submit("please fail")
+        done = await queue.wait(job["id"])
+        failed = await queue.wait(failed["id"])
+        await queue.stop()
+        return done, failed
+
+    done, failed = asyncio.run(scenario())
+    assert done["status"] == "completed"
+    assert done["result"]["analysis"] == "A"
+    assert failed["status"] == "failed" and failed["error"] == "boom"
+
+
+def test_identical_inflight_queries_are_deduplicated():
+    calls = []
+
+    async def scenario():
+        queue = AnalysisJobQueue(make_runner(calls=calls), concurrency=2, max_queue=10, store_path="")
+        await queue.start()
+        first, _ = await queue.submit("What are our top products?")
+        second, created = await queue.submit("top products")
+        # Normalizes to the same text, but asks for an analysis rather than a lookup
+        analytic, analytic_created = await queue.submit("What should we do about top products?")
+        assert analytic_created and analytic["id"] != first["id"]
+        await queue.wait(first["id"])
+        third, _ = await queue.submit("top products") # finished jobs are not reused
+        await queue.wait(third["id"])
+        await queue.stop()
+        return first, second, created, third, await queue.stats()
+
+    first, second, created, third, stats = asyncio.run(scenario())
+    assert second["id"] == first["id"] and not created
+    assert third["id"] != first["id"]
+    assert len(calls) == 3
+    assert stats["deduplicated"] == 1
+
+
+def test_full_queue_rejects_submissions():
+    async def scenario():
+        queue = AnalysisJobQueue(make_runner(delay=1), concurrency=1, max_queue=1, store_path="")
+        await queue.start()
+        await queue.submit("q1")
+        await asyncio.sleep(0.01) # q1 is picked up by the worker
+        await queue.submit("q2")
+        with pytest.raises(QueueFullError):
+            await queue.submit("q3")
+        stats = await queue.stats()
+        await queue.stop()
+        return stats
+
+    assert asyncio.run(scenario())["rejected"] == 1
+
+
+def test_durable_queue_resumes_unfinished_jobs(tmp_path):
+    path = str(tmp_path / "jobs.sqlite")
+
+    async def first_run():
+        queue = AnalysisJobQueue(make_runner(delay=10), concurrency=1, max_queue=10, store_path=path)
+        await queue.start()
+        job, _ = await queue.submit("How are sales?")
+        await asyncio.sleep(0.01)
+        await queue.stop() # simulated shutdown mid-run
+        return job["id"]
+
+    async def second_run(job_id):
+        queue = AnalysisJobQueue(make_runner(delay=0), concurrency=1, max_queue=10, store_path=path)
+        await queue.start()
+        job = await queue.wait(job_id)
+        await queue.stop()
+        return job
+
+    job_id = asyncio.run(first_run())
+    assert asyncio.run(second_run(job_id))["status"] == "completed"
+
+
+def test_shared_store_runs_each_job_once_and_any_process_answers_polls(tmp_path):
+    path = str(tmp_path / "jobs.sqlite")
+    calls = []
+
+    async def scenario():
+        first = AnalysisJobQueue(make_runner(delay=0.05, calls=calls), concurrency=2, max_queue=10, store_path=path)
+        second = AnalysisJobQueue(make_runner(delay=0.05, calls=calls), concurrency=2, max_queue=10, store_path=path)
+        await first.start()
+        await second.start()
+        jobs = [(await first.submit(f"How are sales in region {i}?"))[0] for i in range(6)]
+        duplicate, created = await second.submit("How are sales in region 0?") # in flight in the other process
+        done = [await second.wait(job["id"]) for job in jobs] # polled through the process that did not accept them
+        await first.stop()
+        await second.stop()
+        return jobs, duplicate, created, done
+
+    jobs, duplicate, created, done = asyncio.run(scenario())
+    assert duplicate["id"] == jobs[0]["id"] and not created
+    assert all(job["status"] == "completed" for job in done)
+    assert sorted(calls) == sorted(job["query"] for job in jobs) # every job ran exactly once
+
+
+def test_shared_store_reruns_jobs_of_a_dead_process(tmp_path):
+    path = str(tmp_path / "jobs.sqlite")
+
+    async def never_finishes(query, job_id):
+        await asyncio.Event().wait()
+
+    async def no_renewal():
+        pass
+
+    async def scenario():
+        dead = AnalysisJobQueue(never_finishes, concurrency=1, max_queue=10, store_path=path, lease_seconds=0.1)
+        dead._renew_leases = no_renewal # The process hangs or is killed: its lease is never renewed
+        await dead.start()
+        job, _ = await dead.submit("How are sales?")
+        await asyncio.sleep(0.05)
+        assert (await dead.get(job["id"]))["status"] == "running"
+
+        survivor = AnalysisJobQueue(make_runner(delay=0), concurrency=1, max_queue=10, store_path=path, poll_interval=0.02)
+        await survivor.start()
+        finished = await asyncio.wait_for(survivor.wait(job["id"]), 5)
+        await dead.stop() # The hung process going away later must not overwrite the result
+        await survivor.stop()
+        return finished, AnalysisJobQueue(make_runner(), concurrency=1, store_path=path)
+
+    async def reopen(queue):
+        await queue.start()
+        job = await queue.get(finished["id"])
+        await queue.stop()
+        return job
+
+    finished, reopened = asyncio.run(scenario())
+    assert finished["status"] == "completed"
+    assert asyncio.run(reopen(reopened))["status"] == "completed"
+
+
+def test_a_locked_store_does_not_stall_the_event_loop(tmp_path):
+    path = str(tmp_path / "jobs.sqlite")
+
+    async def scenario():
+        queue = AnalysisJobQueue(make_runner(delay=0), concurrency=2, max_queue=10, store_path=path, poll_interval=0.01)
+        await queue.start()
+        job, _ = await queue.submit("How are sales?")
+        await queue.wait(job["id"])
+
+        other = sqlite3.connect(path, isolation_level=None)
+        other.execute("BEGIN IMMEDIATE") # Another process holds the write lock
+        ticks = []
+
+        async def ticker():
+            while True:
+                ticks.append(time.perf_counter())
+                await asyncio.sleep(0.01)
+
+        ticking = asyncio.create_task(ticker())
+        await asyncio.sleep(0.05) # Several idle polls while the file is locked
+        started = time.perf_counter()
+        polled = await queue.get(job["id"]) # Idle polls only read, so the store thread is not stuck on the lock
+        read_seconds = time.perf_counter() - started
+        submitting = asyncio.create_task(queue.submit("top products")) # Waits for the lock on the store thread
+        await asyncio.sleep(0.3)
+        other.execute("COMMIT")
+        other.close()
+        _, created = await submitting
+        ticking.cancel()
+        await queue.stop()
+        return polled, read_seconds, created, max(later - earlier for earlier, later in zip(ticks, ticks[1:]))
+
+    polled, read_seconds, created, longest_gap = asyncio.run(scenario())
+    assert polled["status"] == "completed" and created
+    assert read_seconds < 0.1
+    assert longest_gap < 0.1 # A blocked loop would not tick for the 0.3s the lock is held
@@ -0,0 +1,57 @@
+import asyncio
+
+from fakes import FakeChatModel, make_agents
+from llm_cache import InMemoryLLMCache, SQLiteLLMCache, canonical_prompt
+
+PROMPT = """
+        Analyze this data:
+            1. Key metrics
+        """
+
+
+def test_canonical_prompt_ignores_indentation():
+    assert canonical_prompt('"a   b\\n   c"') == canonical_prompt('"a b c"')
+
+
+def test_identical_prompts_are_answered_from_memory_cache():
+    cache = InMemoryLLMCache()
+    llm = FakeChatModel(prompts=[], cache=cache)
+    first = llm.invoke(PROMPT)
+    second = llm.invoke(PROMPT.replace("            1.", "  1."))
+    assert first.content == second.content
+    assert len(llm.prompts) == 1
+    assert cache.stats()["hits"] == 1
+
+
+def test_changing_the_model_string_misses(tmp_path):
+    cache = SQLiteLLMCache(path=str(tmp_path / "llm.sqlite"))
+    old = FakeChatModel(prompts=[], cache=cache, model="model-a")
+    new = FakeChatModel(prompts=[], cache=cache, model="model-b")
+    old.invoke(PROMPT)
+    new.invoke(PROMPT)
+    assert len(old.prompts) == 1 and len(new.prompts) == 1
+    assert cache.stats()["misses"] == 2
+
+
+def test_sqlite_cache_is_shared_across_instances(tmp_path):
+    path = str(tmp_path / "llm.sqlite")
+    FakeChatModel(prompts=[], cache=SQLiteLLMCache(path=path)).invoke(PROMPT)
+    llm = FakeChatModel(prompts=[], cache=SQLiteLLMCache(path=path))
+    assert llm.invoke(PROMPT).content.startswith("- reply 1")
+    assert llm.prompts == []
+
+
+def test_streamed_analysis_is_cached_and_replayed():
+    agents = make_agents()
+    agents.llm.cache = InMemoryLLMCache()
+    agents.analysis_cache = None
+
+    async def collect():
+        return [event async for event in agents.astream_analysis("analyze top products", thread_id="s")]
+
+    first = asyncio.run(collect())
+    second = asyncio.run(collect())
+    assert len(agents.llm.prompts) == 2 # only the first run reached the model
+    assert second[-1]["analysis"] == first[-1]["analysis"]
+    replayed = [event for event in second if event["event"] == "token"]
+    assert {event["node"] for event in replayed} == {"analyst_agent", "consultant_agent"}
@@ -0,0 +1,74 @@
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from local_warehouse import connect_local, generate_synthetic_data, translate_query
+from metric_cache import MetricCache
+from rollup_store import RollupStore
+from tool_snowflake import SnowflakeConnectionPool, SnowflakeTools
+
+END = datetime(2024, 6, 30, 12, 0, 0)
+
+
+@pytest.fixture(scope="module")
+def warehouse(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("warehouse") / "warehouse.sqlite")
+    counts = generate_synthetic_data(path, orders=3000, products=40, days=90, chunk_size=1000, end=END)
+    return path, counts
+
+
+def make_tools(path, **kwargs):
+    return SnowflakeTools(pool=SnowflakeConnectionPool(connect=lambda: connect_local(path)), cache=MetricCache(), **kwargs)
+
+
+def test_generator_writes_consistent_tables(warehouse):
+    path, counts = warehouse
+    db = sqlite3.connect(path)
+    assert db.execute("SELECT COUNT(*) FROM orders").fetchone()[0] == 3000
+    assert db.execute("SELECT COUNT(*) FROM order_items").fetchone()[0] == counts["order_items"]
+    # Order totals are the sum of their line items
+    mismatches = db.execute(
+        "SELECT COUNT(*) FROM orders o JOIN (SELECT order_id, SUM(total_price) AS total FROM order_items GROUP BY order_id) i "
+        "ON o.order_id = i.order_id WHERE ABS(o.total_amount - i.total) > 0.01"
+    ).fetchone()[0]
+    assert mismatches == 0
+    assert db.execute("SELECT MAX(order_date) FROM orders").fetchone()[0] <= "2024-06-30 12:00:00"
+
+
+def test_tools_run_unchanged_queries_on_local_warehouse(warehouse):
+    path, _ = warehouse
+    tools = make_tools(path)
+    sales = tools.get_sales_metrics(3650)
+    assert sales["total_orders"] == 3000
+    assert sales["unique_customers"] > 0 and sales["avg_order_value"] > 0
+
+    products = tools.get_top_products(5)["top_products"]
+    assert len(products) == 5
+    assert [p["total_revenue"] for p in products] == sorted((p["total_revenue"] for p in products), reverse=True)
+    assert make_tools(path, fetch_mode="arrow").get_top_products(5)["top_products"] == products
+
+    segments = tools.get_customer_segments()["customer_segments"]
+    assert {s["segment"] for s in segments} <= {"High Value", "Mid Value", "Low Value"}
+    assert [row["window_days"] for row in tools.get_sales_trends()["windows"]] == [7, 30, 90]
+
+
+def test_rollups_refresh_from_local_warehouse(warehouse, tmp_path):
+    path, _ = warehouse
+    tools = make_tools(path)
+    rollups = RollupStore(tools._fetch, path=str(tmp_path / "rollups.sqlite"))
+    rollups.refresh()
+    expected = tools.get_top_products(3)["top_products"]
+    actual = rollups.top_products(3)["top_products"]
+    assert [p["product_name"] for p in actual] == [p["product_name"] for p in expected]
+    assert [p["total_revenue"] for p in actual] == pytest.approx([p["total_revenue"] for p in expected])
+    latest = sqlite3.connect(path).execute("SELECT MAX(order_date) FROM orders").fetchone()[0]
+    assert rollups.watermark() == latest
+
+
+def test_translate_query_and_missing_file(tmp_path):
+    assert translate_query("SELECT * FROM orders WHERE order_date >= %s AND order_date <= %s") == (
+        "SELECT * FROM orders WHERE order_date >= ? AND order_date <= ?"
+    )
+    with pytest.raises(FileNotFoundError):
+        connect_local(str(tmp_path / "missing.sqlite"))
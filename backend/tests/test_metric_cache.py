@@ -0,0 +1,135 @@
+import threading
+import time
+
+import pytest
+
+from fakes import FakeConnector, warehouse_responder
+from metric_cache import MetricCache
+from tool_snowflake import SnowflakeConnectionPool, SnowflakeTools
+
+
+def make_tools(cache, latency=0.0):
+    connector = FakeConnector(warehouse_responder, latency=latency)
+    pool = SnowflakeConnectionPool(connect=connector, max_size=4, checkout_timeout=2)
+    return connector, SnowflakeTools(pool=pool, cache=cache)
+
+
+def query_count(connector):
+    return sum(len(conn.queries) for conn in connector.connections)
+
+
+def test_repeat_calls_hit_the_cache():
+    cache = MetricCache(ttls={}, default_ttl=60)
+    connector, tools = make_tools(cache)
+    first = tools.get_top_products()
+    second = tools.get_top_products(10)
+    assert first == second
+    assert query_count(connector) == 1
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_cached_values_cannot_be_mutated_by_callers():
+    cache = MetricCache(default_ttl=60, ttls={})
+    _, tools = make_tools(cache)
+    tools.get_top_products(2)["top_products"].clear()
+    assert len(tools.get_top_products(2)["top_products"]) == 2
+
+
+def test_stale_entries_are_served_and_refreshed_in_background():
+    cache = MetricCache(default_ttl=0, ttls={}, stale_ttl=60)
+    connector, tools = make_tools(cache)
+    tools.get_sales_metrics(30)
+    tools.get_sales_metrics(30)
+    deadline = time.time() + 2
+    while cache.stats()["refreshes"] == 0 and time.time() < deadline:
+        time.sleep(0.01)
+    assert cache.stats()["stale_hits"] >= 1
+    assert cache.stats()["refreshes"] == 1
+    assert query_count(connector) == 2
+
+
+def test_concurrent_misses_are_coalesced():
+    cache = MetricCache(default_ttl=60, ttls={})
+    connector, tools = make_tools(cache, latency=0.1)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(tools.get_customer_segments())) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(results) == 5
+    assert query_count(connector) == 1
+    assert cache.stats()["coalesced"] == 4
+
+
+def test_lru_eviction_and_invalidation():
+    cache = MetricCache(max_entries=2, default_ttl=60, ttls={})
+    _, tools = make_tools(cache)
+    tools.get_top_products(1)
+    tools.get_top_products(2)
+    tools.get_top_products(3)
+    assert cache.stats()["entries"] == 2
+    assert cache.stats()["evictions"] == 1
+    assert tools.invalidate_cache("get_top_products") == 2
+    assert cache.stats()["entries"] == 0
+
+
+def test_loader_errors_are_not_cached():
+    cache = MetricCache(default_ttl=60, ttls={})
+    calls = []
+
+    def failing():
+        calls.append(1)
+        raise RuntimeError("warehouse down")
+
+    key = MetricCache.make_key("get_sales_metrics", kwargs={"days": 30})
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            cache.get_or_load(key, failing)
+    assert len(calls) == 2
+
+
+def test_loads_started_before_invalidate_are_not_stored():
+    cache = MetricCache(default_ttl=60, ttls={})
+    key = MetricCache.make_key("get_sales_metrics", kwargs={"days": 30})
+    started, finish = threading.Event(), threading.Event()
+
+    def old_load():
+        started.set()
+        finish.wait(2)
+        return "old"
+
+    results = []
+    thread = threading.Thread(target=lambda: results.append(cache.get_or_load(key, old_load)))
+    thread.start()
+    started.wait(2)
+    cache.invalidate("get_sales_metrics")
+    assert cache.get_or_load(key, lambda: "new") == "new" # Does not join the detached load
+    finish.set()
+    thread.join()
+    assert results == ["old"]
+    assert cache.get_or_load(key, lambda: "unused") == "new"
+    assert cache.stats()["discarded_loads"] == 1
+
+
+def test_refreshes_started_before_invalidate_are_not_stored():
+    cache = MetricCache(default_ttl=0, ttls={}, stale_ttl=60)
+    key = MetricCache.make_key("get_top_products", kwargs={"limit": 10})
+    started, finish = threading.Event(), threading.Event()
+
+    def slow_refresh():
+        started.set()
+        finish.wait(2)
+        return "old"
+
+    cache.get_or_load(key, lambda: "first")
+    assert cache.get_or_load(key, slow_refresh) == "first" # Stale: served while slow_refresh runs
+    started.wait(2)
+    cache.invalidate()
+    finish.set()
+    deadline = time.time() + 2
+    while cache.stats()["discarded_loads"] == 0 and time.time() < deadline:
+        time.sleep(0.01)
+    assert cache.stats()["refreshes"] == 0
+    assert cache.stats()["entries"] == 0
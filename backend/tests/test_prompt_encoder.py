@@ -0,0 +1,36 @@
+from prompt_encoder import encode_prompt_data, estimate_tokens
+
+DATA = {
+    "sales_metrics": {"period_days": 30, "total_orders": 120, "total_revenue": 15000.456, "avg_order_value": 125.0},
+    "top_products": {
+        "top_products": [
+            {"product_name": f"Product {i}, large", "total_sold": 10 - i, "total_revenue": 1000.0 / (i + 1), "orders_count": 3}
+            for i in range(10)
+        ]
+    },
+}
+
+
+def test_datasets_render_as_compact_tables():
+    text = encode_prompt_data(DATA, max_rows=10, token_budget=10000)
+    lines = text.splitlines()
+    assert lines[:3] == [
+        "## sales_metrics",
+        "period_days,total_orders,total_revenue,avg_order_value",
+        "30,120,15000.46,125",
+    ]
+    assert lines[4] == "product_name,total_sold,total_revenue,orders_count"
+    assert lines[5] == '"Product 0, large",10,1000,3'
+    assert lines[6] == '"Product 1, large",9,500,3'
+
+
+def test_long_lists_are_cut_with_totals():
+    text = encode_prompt_data(DATA, max_rows=3, token_budget=10000)
+    assert "Product 3" not in text
+    assert "... 7 more rows (totals: total_sold=28, " in text
+
+
+def test_token_budget_is_enforced():
+    text = encode_prompt_data(DATA, max_rows=10, token_budget=60)
+    assert estimate_tokens(text) <= 60 + 10
+    assert "## top_products" in text
@@ -0,0 +1,49 @@
+from fakes import make_agents
+from query_planner import DEFAULT_DAYS, plan_query, request_key
+
+
+def test_plan_extracts_datasets_and_parameters():
+    plan = plan_query("What was revenue over the last 2 weeks?")
+    assert plan["datasets"] == ["get_sales_metrics"]
+    assert plan["params"]["days"] == 14
+    assert plan["needs_llm"] is False
+
+    plan = plan_query("Top 5 best-selling products this quarter")
+    assert plan["datasets"] == ["get_top_products"]
+    assert plan["params"] == {"days": 90, "no_products": 5}
+
+    plan = plan_query("Why are customer segments and sales declining?")
+    assert plan["datasets"] == ["get_sales_metrics", "get_customer_segments", "get_sales_trends"]
+    assert plan["params"]["days"] == DEFAULT_DAYS
+    assert plan["needs_llm"] is True and plan["intent"] == "analysis"
+
+
+def test_unknown_questions_default_to_sales_with_llm():
+    plan = plan_query("Give me a summary")
+    assert plan["datasets"] == ["get_sales_metrics"]
+    assert plan["needs_llm"] is True
+
+
+def test_lookup_is_answered_without_llm_calls():
+    agents = make_agents()
+    result = agents.analyze("How many orders did we get in the last 7 days?")
+    assert agents.llm.prompts == []
+    assert result["plan"]["intent"] == "lookup"
+    assert result["analysis"].startswith("Last 7 days:")
+    assert result["recommendations"] == ""
+    assert result["total_steps"] == 2 # extractor, direct answer
+
+
+def test_planned_top_n_reaches_the_tool_and_analysis_still_uses_llm():
+    agents = make_agents()
+    lookup = agents.analyze("Show me the top 2 products")
+    assert len(lookup["data"]["top_products"]["top_products"]) == 2
+    assert lookup["analysis"].startswith("Top 2 products by revenue:")
+    agents.analyze("How should we improve our top products?")
+    assert len(agents.llm.prompts) == 2
+
+
+def test_request_key_separates_lookups_from_analyses_with_the_same_words():
+    assert request_key("Show top products") == request_key("top products?")
+    assert request_key("Show top products") != request_key("What should we do about top products?")
+    assert request_key("Top 5 products") != request_key("Top 10 products")
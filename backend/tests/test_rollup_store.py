@@ -0,0 +1,129 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from rollup_store import NEW_ORDERS_QUERY, HyperLogLog, RollupStore
+
+NOW = datetime.now().replace(microsecond=0)
+
+
+# In-memory stand-in for the warehouse answering the two refresh queries
+class FakeWarehouse:
+    def __init__(self):
+        self.orders = [] # (order_id, customer_id, order_date, total_amount)
+        self.items = [] # (order_id, product_id, product_name, quantity, total_price)
+        self.queries = 0
+
+    def add_order(self, order_id, customer_id, order_date, items):
+        self.orders.append((order_id, customer_id, order_date, sum(price for _, _, _, price in items)))
+        for product_id, name, quantity, price in items:
+            self.items.append((order_id, product_id, name, quantity, price))
+
+    def fetch(self, query, params):
+        self.queries += 1
+        since = str(params[0])
+        if query == NEW_ORDERS_QUERY:
+            groups = defaultdict(lambda: [0, 0.0, ""])
+            for _, customer, when, amount in self.orders:
+                if str(when) > since:
+                    group = groups[(when.date(), customer)]
+                    group[0] += 1
+                    group[1] += amount
+                    group[2] = max(group[2], str(when))
+            return [(day, customer, *values) for (day, customer), values in groups.items()]
+        until = str(params[1])
+        dates = {order_id: when for order_id, _, when, _ in self.orders}
+        groups = defaultdict(lambda: [0, 0.0, set()])
+        for order_id, product_id, name, quantity, price in self.items:
+            when = dates[order_id]
+            if since < str(when) <= until:
+                group = groups[(when.date(), product_id, name)]
+                group[0] += quantity
+                group[1] += price
+                group[2].add(order_id)
+        return [(*key, sold, revenue, len(orders)) for key, (sold, revenue, orders) in groups.items()]
+
+
+def test_hyperloglog_estimates_and_merges():
+    left, right = HyperLogLog(), HyperLogLog()
+    for i in range(6000):
+        left.add(f"c{i}")
+    for i in range(4000, 10000):
+        right.add(f"c{i}")
+    assert abs(left.merge(right).count() - 10000) < 500
+    assert HyperLogLog(registers=left.to_bytes()).count() == left.count()
+
+
+def test_refresh_is_incremental_and_answers_windows():
+    warehouse = FakeWarehouse()
+    warehouse.add_order(1, "a", NOW - timedelta(days=40), [("p1", "Widget", 1, 100.0)])
+    warehouse.add_order(2, "a", NOW - timedelta(days=2, hours=1), [("p1", "Widget", 2, 200.0), ("p2", "Gadget", 1, 50.0)])
+    warehouse.add_order(3, "b", NOW - timedelta(days=2), [("p2", "Gadget", 3, 150.0)])
+    store = RollupStore(warehouse.fetch, path=":memory:", refresh_interval=0)
+
+    assert store.refresh() > 0
+    metrics = store.sales_metrics(30)
+    assert metrics == {"period_days": 30, "total_orders": 2, "total_revenue": 400.0, "avg_order_value": 200.0, "unique_customers": 2}
+    assert store.sales_metrics(60)["total_orders"] == 3
+
+    # Same day as an already loaded order: added to the existing daily row
+    warehouse.add_order(4, "c", NOW - timedelta(days=2) + timedelta(minutes=5), [("p2", "Gadget", 1, 50.0)])
+    store.refresh()
+    assert store.refresh() == 0 # nothing newer than the watermark
+    metrics = store.sales_metrics(30)
+    assert metrics["total_orders"] == 3 and metrics["unique_customers"] == 3
+
+    top = store.top_products(2)["top_products"]
+    assert top[0] == {"product_name": "Widget", "total_sold": 3, "total_revenue": 300.0, "orders_count": 2}
+    assert top[1] == {"product_name": "Gadget", "total_sold": 5, "total_revenue": 250.0, "orders_count": 3}
+    assert store.top_products(5, days=30)["top_products"][0]["total_revenue"] == 250.0
+
+
+def test_rebuild_matches_incremental_load():
+    warehouse = FakeWarehouse()
+    for i in range(50):
+        warehouse.add_order(i, f"c{i % 7}", NOW - timedelta(days=i % 20, hours=i), [("p1", "Widget", 1, 10.0 + i)])
+    store = RollupStore(warehouse.fetch, path=":memory:")
+    store.refresh()
+    incremental = store.sales_metrics(30)
+    store.rebuild()
+    assert store.sales_metrics(30) == incremental
+    assert incremental["total_orders"] == 50 and incremental["unique_customers"] == 7
+
+
+def test_stores_sharing_a_file_do_not_load_rows_twice(tmp_path):
+    warehouse = FakeWarehouse()
+    for i in range(10):
+        warehouse.add_order(i, f"c{i}", NOW - timedelta(days=i), [("p1", "Widget", 1, 10.0)])
+    path = str(tmp_path / "rollups.sqlite")
+    first = RollupStore(warehouse.fetch, path=path)
+
+    # The second process fetches from the same watermark, the first commits before it does
+    def fetch_while_first_refreshes(query, params):
+        rows = warehouse.fetch(query, params)
+        if query == NEW_ORDERS_QUERY:
+            first.refresh()
+        return rows
+
+    second = RollupStore(fetch_while_first_refreshes, path=path)
+    assert second.refresh() == 0
+    assert first.sales_metrics(30)["total_orders"] == 10
+    assert second.sales_metrics(30)["total_orders"] == 10
+    assert second.stats()["watermark"] == first.watermark()
+
+
+def test_readers_never_see_an_empty_store_during_rebuild(tmp_path):
+    warehouse = FakeWarehouse()
+    for i in range(10):
+        warehouse.add_order(i, f"c{i}", NOW - timedelta(days=i), [("p1", "Widget", 1, 10.0)])
+    seen = []
+
+    def fetch_and_read(query, params):
+        seen.append(store.sales_metrics(30)["total_orders"]) # A reader while the rebuild is fetching
+        return warehouse.fetch(query, params)
+
+    store = RollupStore(fetch_and_read, path=str(tmp_path / "rollups.sqlite"))
+    store.refresh()
+    seen.clear()
+    assert store.rebuild() > 0
+    assert seen == [10, 10]
+    assert store.sales_metrics(30)["total_orders"] == 10
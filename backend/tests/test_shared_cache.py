@@ -0,0 +1,99 @@
+import threading
+import time
+
+from metric_cache import MetricCache
+from shared_cache import SharedCache
+
+SALES = MetricCache.make_key("get_sales_metrics", (30,))
+TOP = MetricCache.make_key("get_top_products", (10,))
+
+
+def test_values_written_by_one_worker_are_read_by_another(tmp_path):
+    path = str(tmp_path / "shared.sqlite")
+    first, second = SharedCache(path), SharedCache(path)
+    first.set("k", {"rows": [1, 2]}, keep=60)
+    value, age = second.get("k")
+    assert value == {"rows": [1, 2]}
+    assert 0 <= age < 5
+    assert second.get("missing") is None
+
+
+def test_expired_entries_are_not_returned(tmp_path):
+    cache = SharedCache(str(tmp_path / "shared.sqlite"))
+    cache.set("k", 1, keep=0)
+    assert cache.get("k") is None
+    assert cache.prune() == 1
+
+
+def test_only_one_process_holds_a_lease(tmp_path):
+    path = str(tmp_path / "shared.sqlite")
+    first, second = SharedCache(path, lease_seconds=30), SharedCache(path, lease_seconds=30)
+    token = first.acquire("k")
+    assert token
+    assert second.acquire("k") is None
+    assert first.acquire("k") is None # A second load in the same process waits too
+    first.set("k", "v", keep=60, token=token) # Storing the value gives the lease up
+    assert second.acquire("k")
+
+
+def test_waiters_give_up_when_the_lease_is_released(tmp_path):
+    path = str(tmp_path / "shared.sqlite")
+    loader, waiter = SharedCache(path), SharedCache(path, poll_interval=0.01)
+    token = loader.acquire("k")
+    assert token
+    threading.Timer(0.05, loader.release, args=("k", token)).start()
+    started = time.monotonic()
+    assert waiter.wait("k") is None
+    assert time.monotonic() - started < 5
+    assert waiter.stats()["wait_misses"] == 1
+
+
+def test_metric_caches_in_different_workers_load_once(tmp_path):
+    path = str(tmp_path / "shared.sqlite")
+    caches = [MetricCache(default_ttl=60, ttls={}, shared=SharedCache(path, poll_interval=0.01)) for _ in range(4)]
+    calls = []
+
+    def load():
+        calls.append(1)
+        time.sleep(0.1)
+        return {"total_orders": 42}
+
+    results = []
+    threads = [threading.Thread(target=lambda cache=cache: results.append(cache.get_or_load(SALES, load))) for cache in caches]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [{"total_orders": 42}] * 4
+    assert sum(cache.stats()["shared_hits"] for cache in caches) == 3
+
+
+def test_loads_in_one_process_share_the_lease(tmp_path):
+    shared = SharedCache(str(tmp_path / "shared.sqlite"), poll_interval=0.01)
+    caches = [MetricCache(default_ttl=60, ttls={}, shared=shared) for _ in range(2)]
+    calls = []
+
+    def load():
+        calls.append(1)
+        time.sleep(0.1)
+        return 7
+
+    threads = [threading.Thread(target=cache.get_or_load, args=(SALES, load)) for cache in caches]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+
+
+def test_invalidate_clears_the_shared_store(tmp_path):
+    path = str(tmp_path / "shared.sqlite")
+    cache = MetricCache(default_ttl=60, ttls={}, shared=SharedCache(path))
+    cache.get_or_load(SALES, lambda: 1)
+    cache.get_or_load(TOP, lambda: 2)
+    cache.invalidate("get_sales_metrics")
+    other = SharedCache(path)
+    assert other.get(SharedCache.encode_key(SALES)) is None
+    assert other.get(SharedCache.encode_key(TOP))[0] == 2
@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+def test_concurrent_identical_calls_share_one_computation():
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"value": 42}
+
+    async def scenario():
+        flights = SingleFlight()
+        results = await asyncio.gather(*(flights.do(("insights",), compute) for _ in range(50)))
+        other = await flights.do(("insights", "other"), compute)
+        return flights, results, other
+
+    flights, results, other = asyncio.run(scenario())
+    assert len(calls) == 2
+    assert all(result is results[0] for result in results)
+    assert other == {"value": 42}
+    assert flights.stats() == {"in_flight": 0, "endpoints": {"insights": {"executions": 2, "coalesced": 49, "abandoned": 0, "failed": 0}}}
+
+
+def test_errors_reach_every_caller_and_are_not_cached():
+    attempts = []
+
+    async def compute():
+        attempts.append(1)
+        await asyncio.sleep(0.01)
+        if len(attempts) == 1:
+            raise RuntimeError("warehouse down")
+        return "ok"
+
+    async def scenario():
+        flights = SingleFlight()
+        first = await asyncio.gather(*(flights.do(("analyze", "q"), compute) for _ in range(3)), return_exceptions=True)
+        second = await flights.do(("analyze", "q"), compute)
+        return flights, first, second
+
+    flights, first, second = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in first)
+    assert second == "ok"
+    assert flights.stats()["endpoints"]["analyze"]["failed"] == 1
+
+
+def test_cancelled_caller_detaches_and_last_one_cancels_the_computation():
+    async def scenario():
+        flights = SingleFlight()
+        started = asyncio.Event()
+
+        async def compute():
+            started.set()
+            await asyncio.sleep(0.1)
+            return "done"
+
+        # One of two callers goes away: the other still gets the result
+        leaving = asyncio.create_task(flights.do(("q",), compute))
+        staying = asyncio.create_task(flights.do(("q",), compute))
+        await started.wait()
+        leaving.cancel()
+        assert await staying == "done"
+        with pytest.raises(asyncio.CancelledError):
+            await leaving
+
+        # Every caller goes away: the computation is cancelled too
+        started.clear()
+        only = asyncio.create_task(flights.do(("q",), compute))
+        await started.wait()
+        shared = flights._flights[("q",)].task
+        only.cancel()
+        await asyncio.gather(only, return_exceptions=True)
+        await asyncio.sleep(0)
+        return flights, shared
+
+    flights, shared = asyncio.run(scenario())
+    assert shared.cancelled()
+    assert flights.stats() == {"in_flight": 0, "endpoints": {"q": {"executions": 2, "coalesced": 1, "abandoned": 1, "failed": 0}}}
@@ -0,0 +1,64 @@
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pytest
+
+from fakes import FakeConnector, warehouse_responder
+from metric_cache import MetricCache
+from tool_snowflake import SnowflakeConnectionPool, SnowflakeTools
+from trend_engine import compute_trends, daily_frame, history_days, series_range
+
+END = date(2024, 6, 30)
+
+
+def make_series(days=180, seed=3):
+    rng = np.random.default_rng(seed)
+    start = END - timedelta(days=days - 1)
+    rows = [((start + timedelta(days=i)).isoformat(), int(rng.integers(5, 15)), float(rng.uniform(500, 1500))) for i in range(days)]
+    return start, rows
+
+
+def test_windows_match_brute_force_sums():
+    start, rows = make_series()
+    daily = daily_frame(rows, start, END)
+    trends = compute_trends(daily, windows=(7, 14, 30, 90))
+    assert trends["as_of_date"] == "2024-06-30"
+    for row in trends["windows"]:
+        days = row["window_days"]
+        current = daily.iloc[-days:]
+        previous = daily.iloc[-2 * days:-days]
+        assert row["orders"] == int(current["orders"].sum())
+        assert row["revenue"] == pytest.approx(current["revenue"].sum(), abs=0.01)
+        assert row["revenue_prev"] == pytest.approx(previous["revenue"].sum(), abs=0.01)
+        assert row["revenue_pct"] == pytest.approx(current["revenue"].sum() / previous["revenue"].sum() - 1, abs=1e-4)
+        assert row["aov"] == pytest.approx(current["revenue"].sum() / current["orders"].sum(), abs=0.01)
+    assert trends["revenue_rolling_avg"] == pytest.approx(daily["revenue"].iloc[-7:].mean(), abs=0.01)
+    assert trends["anomalies"] == []
+
+
+def test_missing_days_count_as_zero_and_spikes_are_flagged():
+    start, rows = make_series(days=60)
+    rows = [row for row in rows if row[0] < "2024-06-01"] # nothing in the last 30 days ...
+    rows.append(("2024-06-29", 400, 90000.0)) # ... except one spike
+    trends = compute_trends(daily_frame(rows, start, END), windows=(7, 30))
+    week, month = trends["windows"]
+    assert (week["orders"], month["orders"]) == (400, 400)
+    assert week["orders_pct"] is None # no orders in the previous 7 days
+    assert {(anomaly["date"], anomaly["metric"]) for anomaly in trends["anomalies"]} >= {("2024-06-29", "orders"), ("2024-06-29", "revenue")}
+    with pytest.raises(ValueError):
+        compute_trends(daily_frame(rows, start, END), windows=(7, 90))
+
+
+def test_any_number_of_windows_is_one_warehouse_query():
+    connector = FakeConnector(warehouse_responder)
+    tools = SnowflakeTools(pool=SnowflakeConnectionPool(connect=connector), cache=MetricCache())
+    trends = tools.get_sales_trends((7, 14, 30, 60, 90, 180))
+    queries = [(query, params) for conn in connector.connections for query, params in conn.queries if query.strip() != "SELECT 1"]
+    assert len(queries) == 1
+    # Windows end with the last complete day: today's partial orders are not compared to full periods
+    assert queries[0][1][1] == datetime.combine(date.today(), datetime.min.time())
+    assert trends["as_of_date"] == (date.today() - timedelta(days=1)).isoformat()
+    assert [row["window_days"] for row in trends["windows"]] == [7, 14, 30, 60, 90, 180]
+    start, end = series_range((7, 180), today=END)
+    assert end == END - timedelta(days=1)
+    assert (end - start).days + 1 == history_days((7, 180)) == 360
@@ -1,32 +1,318 @@
 # Import libraries
+import asyncio
 import json
-import pandas as pd
-import snowflake.connector
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from typing import Dict, Any
+from typing import Dict, Any, Callable, Iterator, List, Optional, Sequence, Tuple
 import os
+import threading
+import time
 from dotenv import load_dotenv
+from metric_cache import MetricCache, cached_metric, get_shared_cache
+from rollup_store import RollupStore
+from telemetry import POOL_WAIT_SECONDS, TOOL_CALL_SECONDS, WAREHOUSE_QUERY_SECONDS, queued, record, span, timed
 
 # Load .env
 load_dotenv(override=True)
 
+# Function for opening a single Snowflake connection from the .env settings
+# snowflake.connector is imported here rather than at module level, it takes ~0.5s to import
+def connect_snowflake():
+    import snowflake.connector
+    return snowflake.connector.connect(
+        user=os.getenv('SNOWFLAKE_USER'),
+        password=os.getenv('SNOWFLAKE_PASSWORD'),
+        account=os.getenv('SNOWFLAKE_ACCOUNT'),
+        warehouse=os.getenv('SNOWFLAKE_WAREHOUSE'),
+        database=os.getenv('SNOWFLAKE_DATABASE'),
+        schema=os.getenv('SNOWFLAKE_RAW_SCHEMA'),
+        role=os.getenv('SNOWFLAKE_ROLE'),
+        insecure_mode=True,
+    )
+
+# Function for opening a connection to the configured warehouse
+# WAREHOUSE_BACKEND=local runs the same queries against a SQLite file built by local_warehouse.py
+def connect_warehouse():
+    if os.getenv('WAREHOUSE_BACKEND', 'snowflake').lower() == 'local':
+        from local_warehouse import connect_local
+        return connect_local()
+    return connect_snowflake()
+
+# Function for telling dropped-session errors apart from ordinary query errors
+def _is_connection_error(exc: BaseException) -> bool:
+    if type(exc).__module__.split(".")[0] != "snowflake":
+        return False
+    from snowflake.connector.errors import InterfaceError, OperationalError
+    return isinstance(exc, (InterfaceError, OperationalError))
+
+# Define SnowflakeConnectionPool: a bounded, thread-safe pool of connections
+# Every request checks a connection out, runs its queries and hands it back, so
+# concurrent requests no longer serialize on one shared session
+class SnowflakeConnectionPool:
+    def __init__(
+        self,
+        connect: Optional[Callable[[], Any]] = None, # Factory for new connections, swap in a fake for tests
+        max_size: Optional[int] = None,
+        idle_timeout: Optional[float] = None, # Seconds an idle connection is kept before it is closed
+        health_check_interval: Optional[float] = None, # Seconds idle before a connection is pinged on checkout
+        checkout_timeout: Optional[float] = None, # Seconds to wait for a free connection before giving up
+    ):
+        self._connect = connect or connect_warehouse
+        self.max_size = max_size or int(os.getenv('SNOWFLAKE_POOL_SIZE', '4'))
+        self.idle_timeout = idle_timeout if idle_timeout is not None else float(os.getenv('SNOWFLAKE_POOL_IDLE_TIMEOUT', '300'))
+        self.health_check_interval = health_check_interval if health_check_interval is not None else float(os.getenv('SNOWFLAKE_POOL_HEALTH_CHECK_INTERVAL', '60'))
+        self.checkout_timeout = checkout_timeout if checkout_timeout is not None else float(os.getenv('SNOWFLAKE_POOL_TIMEOUT', '30'))
+
+        self._lock = threading.Condition()
+        self._idle = [] # List of (connection, last_used) tuples, most recently used last
+        self._size = 0 # Open connections, idle and checked out
+        self._closed = False
+        self._stats = {"checkouts": 0, "waits": 0, "reconnects": 0, "evictions": 0, "created": 0, "discarded": 0}
+
+    # Check out a connection for the duration of a with-block
+    @contextmanager
+    def connection(self):
+        conn = self._checkout()
+        try:
+            yield conn
+        except BaseException as exc:
+            if _is_connection_error(exc):
+                # The session is probably gone, drop it so the next caller gets a fresh one
+                self._discard(conn)
+            else:
+                self._checkin(conn)
+            raise
+        else:
+            self._checkin(conn)
+
+    # Return pool counters, safe to serialize as JSON
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                **self._stats,
+            }
+
+    # Close every idle connection and refuse new checkouts
+    def close(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._lock.notify_all()
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+    # Private method: take an idle connection or open a new one, waiting while the pool is full
+    def _checkout(self):
+        started = time.perf_counter()
+        deadline = time.monotonic() + self.checkout_timeout
+        waited = False
+        expired = []
+        with self._lock:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Snowflake connection pool is closed")
+                expired.extend(self._evict_idle_locked())
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    conn, last_used = None, None
+                    break
+                if not waited:
+                    self._stats["waits"] += 1
+                    waited = True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"No Snowflake connection available after {self.checkout_timeout}s")
+                self._lock.wait(remaining)
+            self._stats["checkouts"] += 1
+        record(POOL_WAIT_SECONDS, "pool", "checkout", started, time.perf_counter() - started)
+
+        # Network work happens outside the lock so other threads are not blocked
+        for stale in expired:
+            self._close_quietly(stale)
+        try:
+            if conn is None:
+                return self._open()
+            if time.monotonic() - last_used >= self.health_check_interval and not self._is_healthy(conn):
+                self._close_quietly(conn)
+                with self._lock:
+                    self._stats["reconnects"] += 1
+                return self._open()
+            return conn
+        except BaseException:
+            # Give the slot back if we could not hand out a connection
+            with self._lock:
+                self._size -= 1
+                self._lock.notify()
+            raise
+
+    # Private method: put a connection back on the idle list
+    def _checkin(self, conn):
+        with self._lock:
+            if not self._closed and not self._is_closed(conn):
+                self._idle.append((conn, time.monotonic()))
+                self._lock.notify()
+                return
+            self._size -= 1
+            self._stats["discarded"] += 1
+            self._lock.notify()
+        self._close_quietly(conn)
+
+    # Private method: drop a broken connection and free its slot
+    def _discard(self, conn):
+        with self._lock:
+            self._size -= 1
+            self._stats["discarded"] += 1
+            self._lock.notify()
+        self._close_quietly(conn)
+
+    # Private method: open a new connection, the pool slot is already reserved
+    def _open(self):
+        conn = self._connect()
+        with self._lock:
+            self._stats["created"] += 1
+        return conn
+
+    # Private method: pop idle connections older than idle_timeout, caller holds the lock
+    def _evict_idle_locked(self):
+        now = time.monotonic()
+        keep, expired = [], []
+        for conn, last_used in self._idle:
+            (expired if now - last_used >= self.idle_timeout else keep).append((conn, last_used))
+        if expired:
+            self._idle = keep
+            self._size -= len(expired)
+            self._stats["evictions"] += len(expired)
+        return [conn for conn, _ in expired]
+
+    # Private method: cheap round trip to make sure the session is still alive
+    def _is_healthy(self, conn) -> bool:
+        if self._is_closed(conn):
+            return False
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+            finally:
+                cursor.close()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _is_closed(conn) -> bool:
+        is_closed = getattr(conn, "is_closed", None)
+        return bool(is_closed()) if callable(is_closed) else False
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+# Shared pool used by every SnowflakeTools instance unless one is passed in
+_shared_pool: Optional[SnowflakeConnectionPool] = None
+_shared_pool_lock = threading.Lock()
+
+# Function for getting (and lazily creating) the process-wide pool
+def get_shared_pool() -> SnowflakeConnectionPool:
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = SnowflakeConnectionPool()
+        return _shared_pool
+
 # Define SnowflakeTools
 class SnowflakeTools:
-    def __init__(self):
-        self.conn = snowflake.connector.connect(
-            user=os.getenv('SNOWFLAKE_USER'),
-            password=os.getenv('SNOWFLAKE_PASSWORD'),
-            account=os.getenv('SNOWFLAKE_ACCOUNT'),
-            warehouse=os.getenv('SNOWFLAKE_WAREHOUSE'),
-            database=os.getenv('SNOWFLAKE_DATABASE'),
-            schema=os.getenv('SNOWFLAKE_RAW_SCHEMA'),
-            role=os.getenv('SNOWFLAKE_ROLE'),
-            insecure_mode=True,
-        )
+    def __init__(self, pool: Optional[SnowflakeConnectionPool] = None, cache: Optional[MetricCache] = None, rollups: Optional[RollupStore] = None, fetch_mode: Optional[str] = None):
+        self.pool = pool or get_shared_pool()
+        self.fetch_mode = fetch_mode or os.getenv('SNOWFLAKE_FETCH_MODE', 'rows') # rows (tuples) | arrow (pandas via Arrow)
+        self.cache = cache if cache is not None else get_shared_cache() # None when METRIC_CACHE_ENABLED=false
+        self.rollups = rollups if rollups is not None else RollupStore.from_env(self._fetch) # None unless ROLLUPS_ENABLED=true
+        self._batch_executor = None
+        self._async_executor = None
+        self._batch_lock = threading.Lock()
+
+    # Drop cached metric results (one metric or all), e.g. after a data load
+    def invalidate_cache(self, metric: Optional[str] = None) -> int:
+        return self.cache.invalidate(metric) if self.cache is not None else 0
+
+    # Private method: run a query on a pooled connection and return all rows
+    def _fetch(self, query: str, params=None):
+        with span(WAREHOUSE_QUERY_SECONDS, "query", "rows"), self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(query, params)
+                return cursor.fetchall()
+            finally:
+                cursor.close()
+
+    # Private method: run a query and return a pandas DataFrame with lower-case column names
+    # Uses the connector's Arrow result path (fetch_pandas_all) when available, so no
+    # per-row Python tuples are built; falls back to fetchall for cursors without it
+    def _fetch_frame(self, query: str, params=None, columns: Sequence[str] = ()):
+        import pandas as pd # Deferred, only the arrow fetch mode needs it
+        with span(WAREHOUSE_QUERY_SECONDS, "query", "arrow"), self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(query, params)
+                if hasattr(cursor, "fetch_pandas_all"):
+                    frame = cursor.fetch_pandas_all()
+                else:
+                    frame = pd.DataFrame.from_records(cursor.fetchall(), columns=list(columns) or None)
+            finally:
+                cursor.close()
+        frame.columns = [str(column).lower() for column in frame.columns]
+        return frame
+
+    # Method for streaming large results as DataFrame batches (Arrow batches when available)
+    # The connection stays checked out until the iteration finishes or the generator is closed
+    def iter_frames(self, query: str, params=None, columns: Sequence[str] = (), batch_size: int = 100000) -> Iterator[Any]:
+        import pandas as pd
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(query, params)
+                if hasattr(cursor, "fetch_pandas_batches"):
+                    batches = cursor.fetch_pandas_batches()
+                else:
+                    batches = (pd.DataFrame.from_records(rows, columns=list(columns) or None) for rows in iter(lambda: cursor.fetchmany(batch_size), []))
+                for frame in batches:
+                    frame.columns = [str(column).lower() for column in frame.columns]
+                    yield frame
+            finally:
+                cursor.close()
+
+    # Private method: vectorized type coercion of a result frame, returns one Python list per column
+    # (Series.tolist() builds native ints/floats/strs in C, no per-row float() calls)
+    @staticmethod
+    def _frame_columns(frame, columns: Sequence[str], float_columns: Sequence[str] = (), int_columns: Sequence[str] = ()) -> List[list]:
+        if frame.empty:
+            return [[] for _ in columns]
+        frame = frame.astype({column: "float64" for column in float_columns}) # Decimal/NUMBER -> float in one pass
+        for column in int_columns:
+            frame[column] = frame[column].fillna(0).astype("int64")
+        return [frame[column].tolist() for column in columns]
     
     # Method for getting the sales metrics
+    @timed(TOOL_CALL_SECONDS, "tool")
+    @cached_metric
     def get_sales_metrics(self, days: int = 30) -> Dict[str, Any]:
-        cursor = self.conn.cursor()
+        if self.rollups is not None:
+            # Answer from the local daily rollups, only new orders are read from the warehouse
+            self.rollups.refresh_if_due()
+            return self.rollups.sales_metrics(days)
+
         end_date = datetime.now()
         start_date = end_date - timedelta(days=days)
         
@@ -40,8 +326,7 @@ class SnowflakeTools:
         WHERE order_date >= %s AND order_date <= %s
         """
         
-        cursor.execute(query, (start_date, end_date))
-        result = cursor.fetchone()
+        result = self._fetch(query, (start_date, end_date))[0]
         
         return {
             "period_days": days,
@@ -52,9 +337,13 @@ class SnowflakeTools:
         }
     
     # Methods for getting the top products
+    @timed(TOOL_CALL_SECONDS, "tool")
+    @cached_metric
     def get_top_products(self, no_products: int = 10) -> Dict[str, Any]:
-        cursor = self.conn.cursor()
-        
+        if self.rollups is not None:
+            self.rollups.refresh_if_due()
+            return self.rollups.top_products(no_products)
+
         query = """
         SELECT 
             p.product_name,
@@ -68,8 +357,16 @@ class SnowflakeTools:
         LIMIT %s
         """
         
-        cursor.execute(query, (no_products,))
-        results = cursor.fetchall()
+        if self.fetch_mode == "arrow":
+            columns = ("product_name", "total_sold", "total_revenue", "orders_count")
+            frame = self._fetch_frame(query, (no_products,), columns=columns)
+            names, sold, revenue, orders = self._frame_columns(frame, columns, float_columns=("total_revenue",), int_columns=("total_sold", "orders_count"))
+            return {"top_products": [
+                {"product_name": n, "total_sold": s, "total_revenue": r, "orders_count": o}
+                for n, s, r, o in zip(names, sold, revenue, orders)
+            ]}
+
+        results = self._fetch(query, (no_products,))
         
         products = []
         for row in results:
@@ -83,9 +380,9 @@ class SnowflakeTools:
         return {"top_products": products}
     
     # Method for defining customer segments (simple example based on income)
+    @timed(TOOL_CALL_SECONDS, "tool")
+    @cached_metric
     def get_customer_segments(self) -> Dict[str, Any]:
-        cursor = self.conn.cursor()
-        
         query = """
         SELECT 
             CASE 
@@ -101,8 +398,16 @@ class SnowflakeTools:
         ORDER BY avg_income DESC
         """
         
-        cursor.execute(query)
-        results = cursor.fetchall()
+        if self.fetch_mode == "arrow":
+            columns = ("segment", "customer_count", "avg_income")
+            frame = self._fetch_frame(query, columns=columns)
+            names, counts, incomes = self._frame_columns(frame, columns, float_columns=("avg_income",), int_columns=("customer_count",))
+            return {"customer_segments": [
+                {"segment": n, "customer_count": c, "avg_income": i}
+                for n, c, i in zip(names, counts, incomes)
+            ]}
+
+        results = self._fetch(query)
         
         segments = []
         for row in results:
@@ -114,6 +419,75 @@ class SnowflakeTools:
         
         return {"customer_segments": segments}
 
+    # Method for period-over-period trends: one daily series query answers every window
+    # (7/30/90 days by default) with its previous period, rolling averages and anomaly flags,
+    # so extra windows cost no extra warehouse work (see trend_engine.py)
+    @timed(TOOL_CALL_SECONDS, "tool")
+    @cached_metric
+    def get_sales_trends(self, windows: Optional[Tuple[int, ...]] = None) -> Dict[str, Any]:
+        import trend_engine # Deferred, pulls in pandas/numpy
+        windows = tuple(windows or trend_engine.DEFAULT_WINDOWS)
+        start, end = trend_engine.series_range(windows)
+        params = (datetime.combine(start, datetime.min.time()), datetime.combine(end + timedelta(days=1), datetime.min.time()))
+        
+        if self.rollups is not None:
+            self.rollups.refresh_if_due()
+            rows = self.rollups.daily_sales(start.isoformat(), end.isoformat())
+        elif self.fetch_mode == "arrow":
+            rows = self._fetch_frame(trend_engine.DAILY_SERIES_QUERY, params, columns=("day", "orders", "revenue"))
+        else:
+            rows = self._fetch(trend_engine.DAILY_SERIES_QUERY, params)
+        
+        return trend_engine.compute_trends(trend_engine.daily_frame(rows, start, end), windows)
+
+    # Method for fetching all quick-insight datasets in one go
+    # The four queries run concurrently on pooled connections, so the call takes as long
+    # as the slowest query instead of the sum of all four
+    @timed(TOOL_CALL_SECONDS, "tool")
+    def get_quick_insights_data(self, days: int = 30, no_products: int = 3) -> Dict[str, Any]:
+        executor = self._get_batch_executor()
+        sales = executor.submit(queued("snowflake-batch", self.get_sales_metrics, days))
+        products = executor.submit(queued("snowflake-batch", self.get_top_products, no_products))
+        segments = executor.submit(queued("snowflake-batch", self.get_customer_segments))
+        trends = executor.submit(queued("snowflake-batch", self.get_sales_trends))
+        return {
+            "sales_metrics": sales.result(),
+            "top_products": products.result(),
+            "customer_segments": segments.result(),
+            "sales_trends": trends.result(),
+        }
+
+    # Async adapters for the metric methods, used by the async LangGraph nodes
+    # Queries run on a small executor sized to the connection pool, so threads are only held
+    # while a query is actually on a connection, not for the whole analysis
+    async def aget_sales_metrics(self, days: int = 30) -> Dict[str, Any]:
+        return await self._run_async(self.get_sales_metrics, days)
+
+    async def aget_top_products(self, no_products: int = 10) -> Dict[str, Any]:
+        return await self._run_async(self.get_top_products, no_products)
+
+    async def aget_customer_segments(self) -> Dict[str, Any]:
+        return await self._run_async(self.get_customer_segments)
+
+    async def aget_sales_trends(self, windows: Optional[Tuple[int, ...]] = None) -> Dict[str, Any]:
+        return await self._run_async(self.get_sales_trends, windows)
+
+    # Private method: run a blocking SnowflakeTools method without blocking the event loop
+    async def _run_async(self, method, *args, **kwargs):
+        with self._batch_lock:
+            if self._async_executor is None:
+                self._async_executor = ThreadPoolExecutor(max_workers=self.pool.max_size, thread_name_prefix="snowflake-async")
+            executor = self._async_executor
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, queued("snowflake-async", method, *args, **kwargs))
+
+    # Private method: lazily create the worker threads used for batched fetches
+    def _get_batch_executor(self) -> ThreadPoolExecutor:
+        with self._batch_lock:
+            if self._batch_executor is None:
+                self._batch_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="snowflake-batch")
+            return self._batch_executor
+
 # Function for testing SnowflakeTools class and its functions
 def test_tools():
     tools = SnowflakeTools()
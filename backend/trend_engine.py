@@ -0,0 +1,120 @@
+# Import libraries
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+# Windows reported by default (days); any number of windows is answered from the same daily series
+DEFAULT_WINDOWS = (7, 30, 90)
+ROLLING_DAYS = 7 # Rolling average length
+ANOMALY_BASELINE_DAYS = 28 # Trailing days a day is compared against
+ANOMALY_LOOKBACK_DAYS = 14 # Recent days checked for anomalies
+ANOMALY_Z = 3.0 # |z-score| at or above which a day is flagged
+
+# One row per day: the only warehouse query behind every window, delta and flag
+# The upper bound is exclusive (midnight of the current day), see series_range
+DAILY_SERIES_QUERY = """
+SELECT
+    TO_DATE(order_date) as day,
+    COUNT(*) as orders,
+    SUM(total_amount) as revenue
+FROM orders
+WHERE order_date >= %s AND order_date < %s
+GROUP BY TO_DATE(order_date)
+ORDER BY day
+"""
+
+# Function for the number of days of history needed: every window and its previous period,
+# plus the anomaly baseline
+def history_days(windows: Sequence[int]) -> int:
+    return max(2 * max(windows), ANOMALY_BASELINE_DAYS + ANOMALY_LOOKBACK_DAYS)
+
+# Function for turning (day, orders, revenue) rows or a frame into a gap-free daily frame from start to end
+# Days without orders become zeros, so window sums are plain differences of a cumulative sum
+def daily_frame(rows: Any, start: date, end: date) -> pd.DataFrame:
+    frame = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame.from_records(list(rows), columns=["day", "orders", "revenue"])
+    frame = frame.rename(columns=str.lower)
+    index = pd.date_range(start, end, freq="D")
+    if frame.empty:
+        return pd.DataFrame({"orders": 0.0, "revenue": 0.0}, index=index)
+    frame = frame.astype({"orders": "float64", "revenue": "float64"}) # Decimal/NUMBER -> float in one pass
+    frame.index = pd.to_datetime(frame["day"].astype(str).str[:10])
+    return frame.groupby(level=0)[["orders", "revenue"]].sum().reindex(index, fill_value=0.0)
+
+# Function for percentage change per window, None where the previous period is zero
+def _pct_change(current: np.ndarray, previous: np.ndarray) -> list:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        change = np.where(previous != 0, (current - previous) / previous, np.nan)
+    return [None if np.isnan(value) else round(float(value), 4) for value in change]
+
+# Function for dividing two arrays elementwise, 0 where the divisor is zero
+def _ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominator != 0, numerator / denominator, 0.0)
+
+# Function for computing every window from one daily frame (ending with the last complete day)
+# - window and previous-period totals are differences of one cumulative sum: O(1) per window
+# - rolling averages and anomaly z-scores are vectorized over the whole series
+def compute_trends(daily: pd.DataFrame, windows: Iterable[int] = DEFAULT_WINDOWS) -> Dict[str, Any]:
+    windows = np.array(sorted(set(windows)), dtype=np.int64)
+    days = len(daily)
+    if windows.size == 0 or 2 * windows[-1] > days:
+        raise ValueError(f"windows {windows.tolist()} need {2 * int(windows[-1]) if windows.size else 0} days of history, got {days}")
+
+    totals = {}
+    for metric in ("orders", "revenue"):
+        cumulative = np.concatenate(([0.0], daily[metric].to_numpy().cumsum()))
+        totals[metric] = (cumulative[days] - cumulative[days - windows], cumulative[days - windows] - cumulative[days - 2 * windows])
+    orders, orders_prev = totals["orders"]
+    revenue, revenue_prev = totals["revenue"]
+    aov, aov_prev = _ratio(revenue, orders), _ratio(revenue_prev, orders_prev)
+
+    columns = {
+        "window_days": windows.tolist(),
+        "orders": orders.astype(np.int64).tolist(),
+        "orders_prev": orders_prev.astype(np.int64).tolist(),
+        "orders_pct": _pct_change(orders, orders_prev),
+        "revenue": revenue.round(2).tolist(),
+        "revenue_prev": revenue_prev.round(2).tolist(),
+        "revenue_pct": _pct_change(revenue, revenue_prev),
+        "aov": aov.round(2).tolist(),
+        "aov_prev": aov_prev.round(2).tolist(),
+        "aov_pct": _pct_change(aov, aov_prev),
+    }
+    rows = [dict(zip(columns, values)) for values in zip(*columns.values())]
+    rolling = daily.rolling(ROLLING_DAYS, min_periods=1).mean().iloc[-1]
+
+    return {
+        "as_of_date": daily.index[-1].date().isoformat(),
+        "revenue_rolling_avg": round(float(rolling["revenue"]), 2), # per day over the last ROLLING_DAYS days
+        "orders_rolling_avg": round(float(rolling["orders"]), 2),
+        "windows": rows,
+        "anomalies": find_anomalies(daily),
+    }
+
+# Function for flagging recent days far from their trailing baseline (z-score against the
+# previous ANOMALY_BASELINE_DAYS days), e.g. an outage or a promotion spike
+# The standard deviation is floored at 1 (order, dollar) so a jump after a flat stretch is still flagged
+def find_anomalies(daily: pd.DataFrame, threshold: float = ANOMALY_Z) -> list:
+    baseline = daily.shift(1).rolling(ANOMALY_BASELINE_DAYS, min_periods=ANOMALY_BASELINE_DAYS // 2)
+    mean, std = baseline.mean(), baseline.std()
+    z = ((daily - mean) / std.clip(lower=1.0)).iloc[-ANOMALY_LOOKBACK_DAYS:]
+    flagged = z.stack()
+    flagged = flagged[flagged.abs() >= threshold]
+    return [
+        {
+            "date": day.date().isoformat(),
+            "metric": metric,
+            "value": round(float(daily.at[day, metric]), 2),
+            "expected": round(float(mean.at[day, metric]), 2),
+            "z": round(float(score), 2),
+        }
+        for (day, metric), score in flagged.items()
+    ]
+
+# Function for the date range of the daily series, ending yesterday: the current day is still in
+# progress, and a window ending with it would be compared against complete previous periods
+def series_range(windows: Sequence[int], today: Optional[date] = None) -> tuple:
+    end = (today or date.today()) - timedelta(days=1)
+    return end - timedelta(days=history_days(windows) - 1), end
@@ -14,6 +14,7 @@ interface AnalysisResult {
   analysis_id: string;
   query: string;
   status: string;
+  error?: string;
   results?: {
     data: any;
     analysis: string;
@@ -79,9 +80,17 @@ function AnalysisChat() {
 
     try {
       console.log('Sending query:', query);
-      const response = await axios.post(`${API_BASE}/analyze`, { query });
-      setResult(response.data);
-      console.log('Analysis complete:', response.data);
+      // The API queues the analysis and returns a job id, poll until it finishes
+      let { data } = await axios.post<AnalysisResult>(`${API_BASE}/analyze`, { query });
+      while (data.status === 'queued' || data.status === 'running') {
+        await new Promise((resolve) => setTimeout(resolve, 1000));
+        ({ data } = await axios.get<AnalysisResult>(`${API_BASE}/analyze/${data.analysis_id}`));
+      }
+      if (data.status === 'failed') {
+        throw new Error(data.error);
+      }
+      setResult(data);
+      console.log('Analysis complete:', data);
     } catch (err) {
       console.error('Analysis failed:', err);
       setError('Something went wrong. Try again?');